@@ -0,0 +1,79 @@
+"""Time scanning imports inside archives against unpacking them first
+
+Packs a synthetic project of --files files into a wheel-style zip and a
+.tar.gz, then times midna scanning each archive directly against
+unpacking it to a temporary directory and scanning that.
+
+Usage:
+    python benchmarks/bench_archives.py [--files N] [--engine ast|fast]
+"""
+
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from argparse import ArgumentParser
+from typing import Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from midna.discovery import analyze_project_imports  # noqa: E402
+from synthetic import generate_project  # noqa: E402
+
+
+def pack(project: str, directory: str) -> Tuple[str, str]:
+    """Write project as a .whl and a .tar.gz, returning both paths"""
+    wheel = os.path.join(directory, "project-1.0-py3-none-any.whl")
+    sdist = os.path.join(directory, "project-1.0.tar.gz")
+    with zipfile.ZipFile(wheel, "w", zipfile.ZIP_DEFLATED) as z:
+        with tarfile.open(sdist, "w:gz") as t:
+            for current, _, files in os.walk(project):
+                for name in files:
+                    path = os.path.join(current, name)
+                    rel = os.path.relpath(path, project)
+                    z.write(path, rel)
+                    t.add(path, f"project-1.0/{rel}")
+    return wheel, sdist
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--engine", default="fast")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work:
+        project = os.path.join(work, "project")
+        generate_project(project, args.files, error_rate=0.0)
+        wheel, sdist = pack(project, work)
+
+        print(f"{args.files} files, engine {args.engine}")
+        for label, archive in (("wheel", wheel), ("tar.gz", sdist)):
+            start = time.perf_counter()
+            found = analyze_project_imports(archive, engine=args.engine)
+            direct = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with tempfile.TemporaryDirectory() as unpacked:
+                if archive.endswith(".whl"):
+                    with zipfile.ZipFile(archive) as z:
+                        z.extractall(unpacked)
+                else:
+                    with tarfile.open(archive) as t:
+                        t.extractall(unpacked)
+                analyze_project_imports(unpacked, engine=args.engine)
+            unpack = time.perf_counter() - start
+
+            print(
+                f"  {label:7s} direct {direct:7.3f} s  "
+                f"unpack + scan {unpack:7.3f} s  "
+                f"({len(found)} imports)"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Time checking one requirement set against many environments
+
+Generates --envs fake virtualenvs with --dists distributions each and
+times midna.environments.check_environments over all of them. With
+--pip, also times one `pip list --path` per environment for comparison.
+
+Usage:
+    python benchmarks/bench_environments.py [--envs N] [--dists N] [--pip]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from midna.environments import check_environments  # noqa: E402
+from synthetic import generate_site_packages  # noqa: E402
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--envs", type=int, default=50)
+    parser.add_argument("--dists", type=int, default=300)
+    parser.add_argument("--packages", type=int, default=100)
+    parser.add_argument("--pip", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        envs = []
+        for index in range(args.envs):
+            env = os.path.join(tmp, f"service{index}", ".venv")
+            site = os.path.join(env, "lib", "python3.11", "site-packages")
+            # Every environment lacks a different slice of the packages
+            generate_site_packages(site, args.dists - index % 10)
+            envs.append(env)
+
+        packages = [f"Fake-Dist{i}" for i in range(args.packages)]
+        packages += [f"Fake-Dist{args.dists - 1 - i}" for i in range(10)]
+
+        start = time.perf_counter()
+        results = check_environments(packages, envs)
+        elapsed = time.perf_counter() - start
+        missing = sum(len(missing) for _, missing, _ in results)
+        print(
+            f"check_environments: {len(envs)} envs x {len(packages)} "
+            f"packages in {elapsed:.3f} s ({missing} missing in total)"
+        )
+
+        if args.pip:
+            start = time.perf_counter()
+            for env in envs:
+                site = os.path.join(env, "lib", "python3.11", "site-packages")
+                subprocess.run(
+                    [sys.executable, "-m", "pip", "list", "--path", site],
+                    capture_output=True,
+                    check=True,
+                )
+            pip_time = time.perf_counter() - start
+            print(
+                f"pip list per env:   {pip_time:.3f} s "
+                f"({pip_time / elapsed:.0f}x slower)"
+            )
+
+    errors = [error for _, _, error in results if error]
+    if errors:
+        print(f"ERROR: {errors[0]}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Benchmark Midna's import extraction engines per MB of source
+
+Runs every source engine over a corpus (the standard library by
+default), checks that the fast engine agrees with the AST engine, and
+reports throughput. See bench_pyc.py for the bytecode engine.
+
+Usage:
+    python benchmarks/bench_extract.py [--corpus DIR] [--limit N]
+"""
+
+import os
+import sys
+import sysconfig
+import time
+from argparse import ArgumentParser
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from midna.extractors import ENGINES, extract_imports  # noqa: E402
+
+# "pyc" parses sources exactly like "ast"
+SOURCE_ENGINES = [engine for engine in ENGINES if engine != "pyc"]
+
+
+def load_corpus(directory: str, limit: int) -> List[str]:
+    """Read up to limit parseable Python sources below directory"""
+    sources: List[str] = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d != "site-packages"]
+        for name in sorted(files):
+            if not name.endswith(".py"):
+                continue
+            try:
+                with open(os.path.join(root, name), encoding="utf-8") as f:
+                    source = f.read()
+                extract_imports(source, "ast")
+            except (SyntaxError, UnicodeDecodeError, ValueError):
+                continue
+            sources.append(source)
+            if len(sources) >= limit:
+                return sources
+    return sources
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--corpus", default=sysconfig.get_paths()["stdlib"], metavar="DIR"
+    )
+    parser.add_argument("--limit", type=int, default=5000)
+    args = parser.parse_args()
+
+    sources = load_corpus(args.corpus, args.limit)
+    megabytes = sum(len(s.encode("utf-8")) for s in sources) / 1e6
+    print(f"Corpus: {len(sources)} files, {megabytes:.1f} MB")
+
+    results: Dict[str, list] = {}
+    timings: Dict[str, float] = {}
+    for engine in SOURCE_ENGINES:
+        start = time.perf_counter()
+        results[engine] = [extract_imports(s, engine) for s in sources]
+        timings[engine] = time.perf_counter() - start
+
+    mismatches = sum(
+        1 for a, b in zip(results["ast"], results["fast"]) if a != b
+    )
+
+    print(f"{'engine':>8} {'total (s)':>10} {'ms/MB':>8} {'speedup':>8}")
+    for engine in SOURCE_ENGINES:
+        per_mb = timings[engine] * 1000 / megabytes
+        speedup = timings["ast"] / timings[engine]
+        print(
+            f"{engine:>8} {timings[engine]:>10.3f} {per_mb:>8.1f} "
+            f"{speedup:>7.1f}x"
+        )
+    print(f"Files where engines disagree: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Compare memory and load time of ImportIndex with a dict of sets
+
+Builds a per-file import map for a synthetic large repository both as
+Dict[str, Set[str]] and as midna.import_index.ImportIndex, then times a
+JSON round trip against ImportIndex.save/load.
+
+Usage:
+    python benchmarks/bench_import_index.py [--files N] [--modules N]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from midna.import_index import ImportIndex  # noqa: E402
+
+
+def traced(build: Callable[[], Any]) -> Tuple[Any, float]:
+    """Return build()'s result and the megabytes it keeps allocated"""
+    tracemalloc.start()
+    try:
+        result = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size / 1e6
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=200000)
+    parser.add_argument("--modules", type=int, default=5000)
+    parser.add_argument("--imports", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    modules = [f"package_{i}" for i in range(args.modules)]
+    items: List[Tuple[str, List[str]]] = [
+        (
+            f"src/pkg{i % 500}/sub{i % 7}/module_{i}.py",
+            rng.sample(modules, args.imports),
+        )
+        for i in range(args.files)
+    ]
+
+    sets: Dict[str, Set[str]]
+    sets, sets_mb = traced(lambda: {path: set(im) for path, im in items})
+    index, index_mb = traced(lambda: ImportIndex.from_items(items))
+    print(f"dict of sets: {sets_mb:8.1f} MB")
+    print(f"ImportIndex:  {index_mb:8.1f} MB ({sets_mb / index_mb:.1f}x less)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "imports.json")
+        index_path = os.path.join(tmp, "imports.idx")
+
+        with open(json_path, "w") as f:
+            json.dump({path: sorted(im) for path, im in sets.items()}, f)
+        index.save(index_path)
+
+        start = time.perf_counter()
+        with open(json_path) as f:
+            loaded_sets = {p: set(im) for p, im in json.load(f).items()}
+        json_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded = ImportIndex.load(index_path)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        importers = loaded.files_importing(modules[0])
+        query_time = time.perf_counter() - start
+        expected = sorted(
+            p for p, im in loaded_sets.items() if modules[0] in im
+        )
+        loaded.close()
+
+        print(
+            f"load: json {json_time * 1e3:.1f} ms "
+            f"({os.path.getsize(json_path) / 1e6:.1f} MB), "
+            f"mmap {load_time * 1e3:.1f} ms "
+            f"({os.path.getsize(index_path) / 1e6:.1f} MB)"
+        )
+        print(f"reverse lookup after load: {query_time * 1e3:.2f} ms")
+
+    if sorted(importers) != expected:
+        print("ERROR: reverse index disagrees with the dict of sets")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Time --since/--staged scans of a few changed files in a large repo
+
+Commits a synthetic project of --files files to a new git repository,
+changes --changed of them and times midna.incremental.diff_dependencies
+without a blob store (first run) and with one (every later run),
+against a full discovery scan of the same tree.
+
+Usage:
+    python benchmarks/bench_incremental.py [--files N] [--changed N]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from midna.discovery import analyze_project_imports  # noqa: E402
+from midna.incremental import diff_dependencies  # noqa: E402
+from synthetic import generate_project  # noqa: E402
+
+
+def git(project: str, *args: str) -> None:
+    subprocess.run(
+        ["git", "-C", project, *args], check=True, capture_output=True
+    )
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--changed", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as project:
+        generate_project(project, args.files, error_rate=0.0)
+        git(project, "init", "-q")
+        git(project, "add", ".")
+        git(
+            project,
+            "-c",
+            "user.name=bench",
+            "-c",
+            "user.email=bench@example.invalid",
+            "commit",
+            "-q",
+            "-m",
+            "baseline",
+        )
+
+        changed = 0
+        for directory, _, files in os.walk(project):
+            for name in files:
+                if name.endswith(".py") and changed < args.changed:
+                    path = os.path.join(directory, name)
+                    with open(path, "a") as f:
+                        f.write(f"\nimport brand_new_dependency{changed}\n")
+                    changed += 1
+
+        start = time.perf_counter()
+        analyze_project_imports(project)
+        full = time.perf_counter() - start
+
+        timings = []
+        for _ in range(2):
+            start = time.perf_counter()
+            changes = diff_dependencies(project, "HEAD")
+            timings.append(time.perf_counter() - start)
+
+    print(f"{args.files} files, {changed} changed")
+    print(f"  full scan:             {full:8.3f} s")
+    print(f"  --since, no store yet: {timings[0]:8.3f} s")
+    print(f"  --since, with store:   {timings[1]:8.3f} s")
+    print(f"  new imports reported:  {len(changes.added):8d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
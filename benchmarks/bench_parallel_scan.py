@@ -0,0 +1,81 @@
+"""Benchmark serial vs parallel import scanning in Midna
+
+Usage:
+    python benchmarks/bench_parallel_scan.py [--files N] [--repeat R]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from typing import List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from midna.discovery import analyze_project_imports  # noqa: E402
+
+THIRD_PARTY = ["requests", "numpy", "pandas", "flask", "yaml", "click"]
+STDLIB = ["os", "sys", "json", "re", "logging", "pathlib", "typing"]
+
+
+def generate_project(root: str, file_count: int) -> None:
+    """Write a synthetic project with realistic-looking modules"""
+    rng = random.Random(42)
+    for i in range(file_count):
+        package_dir = os.path.join(root, f"pkg{i % 20}", f"sub{i % 7}")
+        os.makedirs(package_dir, exist_ok=True)
+        lines = [f"import {rng.choice(STDLIB)}" for _ in range(5)]
+        lines += [
+            f"from {rng.choice(THIRD_PARTY)} import x" for _ in range(3)
+        ]
+        for j in range(40):
+            lines.append(f"def func_{j}(a, b):")
+            lines.append(f"    return [a * k + b for k in range({j})]")
+        with open(os.path.join(package_dir, f"mod{i}.py"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def job_counts() -> List[int]:
+    """Job counts to measure: powers of two up to the CPU count"""
+    counts = [1]
+    cpus = os.cpu_count() or 1
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        generate_project(root, args.files)
+        baseline = analyze_project_imports(root, jobs=1)
+
+        print(f"{'jobs':>6} {'best (s)':>10} {'speedup':>8}")
+        serial_time = 0.0
+        for jobs in job_counts():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = analyze_project_imports(root, jobs=jobs)
+                timings.append(time.perf_counter() - start)
+                if result != baseline:
+                    print(f"ERROR: jobs={jobs} result differs from serial")
+                    return 1
+            best = min(timings)
+            serial_time = serial_time or best
+            print(f"{jobs:>6} {best:>10.3f} {serial_time / best:>7.2f}x")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Benchmark the bytecode ("pyc") import engine against parsing sources
+
+Scans a tree with every engine and checks that the pyc engine reports
+the same imports, with the same lines, as the AST engine. By default a
+synthetic project of --files files is generated and compiled first, as
+a test run would leave it; --corpus scans an existing tree instead
+(the standard library ships with fresh .pyc files).
+
+Usage:
+    python benchmarks/bench_pyc.py [--files N] [--corpus DIR]
+"""
+
+import compileall
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from typing import Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from midna import profiling  # noqa: E402
+from midna.discovery import iter_file_import_lines  # noqa: E402
+from midna.extractors import ENGINES  # noqa: E402
+from synthetic import generate_project  # noqa: E402
+
+Results = Dict[str, Dict[str, int]]
+
+
+def scan(directory: str, engine: str) -> Results:
+    return dict(iter_file_import_lines(directory, engine=engine))
+
+
+def run(directory: str) -> int:
+    results: Dict[str, Results] = {}
+    timings: Dict[str, float] = {}
+    for engine in ENGINES:
+        profiling.reset()
+        profiling.enable()
+        start = time.perf_counter()
+        results[engine] = scan(directory, engine)
+        timings[engine] = time.perf_counter() - start
+    counters = profiling.snapshot().get("counters", {})
+    profiling.disable()
+
+    files = len(results["ast"])
+    print(f"{files} files, {counters.get('pyc hits', 0)} with a fresh .pyc")
+    print(f"{'engine':>8} {'total (s)':>10} {'speedup':>8}")
+    for engine in ENGINES:
+        speedup = timings["ast"] / timings[engine]
+        print(f"{engine:>8} {timings[engine]:>10.3f} {speedup:>7.1f}x")
+
+    mismatches = [
+        path
+        for path, imports in results["ast"].items()
+        if results["pyc"].get(path) != imports
+    ]
+    print(f"Files where pyc and ast disagree: {len(mismatches)}")
+    for path in mismatches[:10]:
+        print(f"  {path}")
+    return 1 if mismatches else 0
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--corpus", metavar="DIR")
+    args = parser.parse_args()
+
+    if args.corpus:
+        return run(args.corpus)
+    with tempfile.TemporaryDirectory() as project:
+        generate_project(project, args.files, error_rate=0.0)
+        compileall.compile_dir(project, quiet=1)
+        return run(project)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Microbenchmark for parsing requirement specifiers
+
+Parses --specs spec strings drawn from --unique distinct ones with
+midna.pep508.parse_requirement, cold (every string parsed once) and
+warm (memoized), and compares it with the regex parse_package_name used
+before and, if installed, packaging.requirements.Requirement.
+
+Usage:
+    python benchmarks/bench_requirements.py [--specs N] [--unique N]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from typing import Any, Callable, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from midna import pep508  # noqa: E402
+from synthetic import generate_specs  # noqa: E402
+
+
+def regex_package_name(package_spec: str) -> str:
+    """The name-only parse_package_name this parser replaced"""
+    import re
+
+    if "#" in package_spec:
+        package_spec = package_spec.split("#")[0].strip()
+    pattern = r"^([a-zA-Z0-9_-]+(?:\[[a-zA-Z0-9_,-]+\])?)"
+    match = re.match(pattern, package_spec)
+    if match:
+        return match.group(1).split("[")[0]
+    return package_spec.strip()
+
+
+def measure(parse: Callable[[str], Any], specs: List[str]) -> float:
+    start = time.perf_counter()
+    for spec in specs:
+        parse(spec)
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--specs", type=int, default=100000)
+    parser.add_argument("--unique", type=int, default=5000)
+    args = parser.parse_args()
+
+    specs = generate_specs(args.specs, args.unique)
+    distinct = list(dict.fromkeys(specs))
+
+    # Cold: only strings not seen before, so nothing is memoized
+    pep508.clear_cache()
+    cold = measure(pep508.parse_requirement, distinct)
+    pep508.clear_cache()
+    mixed = measure(pep508.parse_requirement, specs)
+    warm = measure(pep508.parse_requirement, specs)
+    regex = measure(regex_package_name, specs)
+
+    print(f"Parsing {len(specs)} specs ({len(distinct)} distinct)")
+    per_spec = cold * 1e6 / max(1, len(distinct))
+    print(f"  pep508 cold:     {cold * 1000:10.2f} ms ({per_spec:.1f} us)")
+    print(f"  pep508 all:      {mixed * 1000:10.2f} ms")
+    print(f"  pep508 memoized: {warm * 1000:10.2f} ms")
+    print(f"  old regex name:  {regex * 1000:10.2f} ms")
+
+    try:
+        from packaging.requirements import Requirement
+    except ImportError:
+        return 0
+    packaging = measure(Requirement, specs)
+    print(
+        f"  packaging:       {packaging * 1000:10.2f} ms "
+        f"({packaging / mixed:.0f}x pep508)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
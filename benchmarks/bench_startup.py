@@ -0,0 +1,87 @@
+"""Measure Midna's import cost per CLI path with `python -X importtime`
+
+Each scenario runs in a fresh interpreter. The report lists the total
+import time, the midna submodules that were loaded and the slowest
+imports, so a regression can be traced to the module that caused it.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat R] [--budget-ms MS]
+"""
+
+import os
+import subprocess
+import sys
+from argparse import ArgumentParser
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS: Dict[str, str] = {
+    "import midna": "import midna",
+    "midna --version": (
+        "import sys; sys.argv = ['midna', '--version']\n"
+        "from midna.core import main\n"
+        "main()"
+    ),
+    "midna --help": (
+        "import sys; sys.argv = ['midna', '--help']\n"
+        "from midna.core import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass"
+    ),
+}
+
+
+def import_times(code: str) -> List[Tuple[str, int, int]]:
+    """Run code with -X importtime; return (module, self_us, cumulative_us)"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=ROOT,
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <module>"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[12:].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=0.0,
+        help="Fail if any scenario's best total exceeds this many ms",
+    )
+    args = parser.parse_args()
+
+    over_budget = False
+    for name, code in SCENARIOS.items():
+        runs = [import_times(code) for _ in range(args.repeat)]
+        best = min(runs, key=lambda rows: sum(r[1] for r in rows))
+        total_ms = sum(r[1] for r in best) / 1000
+        loaded = sorted(r[0] for r in best if r[0].startswith("midna"))
+        slowest = sorted(best, key=lambda r: r[1], reverse=True)[:5]
+
+        print(f"{name}: {total_ms:.1f} ms total import time")
+        print(f"  midna modules: {', '.join(loaded) or '-'}")
+        for module, self_us, _ in slowest:
+            print(f"  {self_us / 1000:6.1f} ms  {module}")
+
+        if args.budget_ms and total_ms > args.budget_ms:
+            print(f"  OVER BUDGET ({args.budget_ms:.1f} ms)")
+            over_budget = True
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Microbenchmark for classifying names as standard library or not
+
+Compares the static table lookup in is_stdlib_package with the previous
+importlib.util.find_spec probe over a mix of stdlib, third-party and
+unknown names.
+
+Usage:
+    python benchmarks/bench_stdlib.py [--names N]
+"""
+
+import importlib.util
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from typing import Callable, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from midna.package_classifier import is_stdlib_package  # noqa: E402
+
+SAMPLE = ["os", "json", "asyncio", "requests", "numpy", "yaml", "flask"]
+
+
+def find_spec_probe(name: str) -> bool:
+    """The find_spec-based check is_stdlib_package used to fall back on"""
+    try:
+        spec = importlib.util.find_spec(name)
+        if spec and spec.origin:
+            return "python" in str(spec.origin).lower()
+    except (ImportError, AttributeError, ValueError):
+        pass
+    return False
+
+
+def make_names(count: int) -> List[str]:
+    """Mix known names with unique unknown ones (a cache cannot help)"""
+    return [
+        SAMPLE[i % len(SAMPLE)] if i % 2 else f"unknown_module_{i}"
+        for i in range(count)
+    ]
+
+
+def measure(check: Callable[[str], bool], names: List[str]) -> float:
+    start = time.perf_counter()
+    for name in names:
+        check(name)
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--names", type=int, default=10000)
+    args = parser.parse_args()
+
+    names = make_names(args.names)
+    table = measure(is_stdlib_package, names)
+    probe = measure(find_spec_probe, names)
+
+    print(f"Classifying {len(names)} names")
+    print(f"  table lookup:   {table * 1000:10.2f} ms")
+    print(f"  find_spec probe:{probe * 1000:10.2f} ms ({probe / table:.0f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
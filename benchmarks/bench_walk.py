@@ -0,0 +1,109 @@
+"""Benchmark Midna's file walker on a tree with large ignored directories
+
+Builds a synthetic project whose .gitignore lists big generated
+directories, then compares the original os.walk-based walker with
+discovery.iter_python_files. Directory listings (one scandir each) stand
+in for the syscalls saved by pruning.
+
+Usage:
+    python benchmarks/bench_walk.py [--dirs N] [--files N] [--repeat N]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from typing import Callable, Iterator, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from midna.discovery import SKIP_DIRS, iter_python_files  # noqa: E402
+
+IGNORED_DIRS = ("generated", "data", "site")
+
+
+def os_walk_files(directory: str) -> Iterator[str]:
+    """The walker Midna used before ignore file support"""
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for file in files:
+            if file.endswith(".py"):
+                yield os.path.join(root, file)
+
+
+def build_tree(directory: str, dirs: int, files: int) -> None:
+    """Create a small project plus large ignored directories"""
+    for package in range(10):
+        package_dir = os.path.join(directory, "src", f"pkg{package}")
+        os.makedirs(package_dir)
+        for module in range(10):
+            path = os.path.join(package_dir, f"mod{module}.py")
+            with open(path, "w") as f:
+                f.write("import os\n")
+
+    for ignored in IGNORED_DIRS:
+        for index in range(dirs):
+            sub_dir = os.path.join(directory, ignored, f"d{index}")
+            os.makedirs(sub_dir)
+            for file_index in range(files):
+                suffix = ".py" if file_index % 2 else ".json"
+                open(os.path.join(sub_dir, f"f{file_index}{suffix}"), "w")
+
+    with open(os.path.join(directory, ".gitignore"), "w") as f:
+        f.write("".join(f"/{name}/\n" for name in IGNORED_DIRS))
+
+
+def measure(
+    walker: Callable[[str], Iterator[str]], directory: str, repeat: int
+) -> Tuple[float, int, int]:
+    """Return (best seconds, files found, directories listed)"""
+    real_scandir = os.scandir
+    listings: List[str] = []
+
+    def counting_scandir(path="."):  # type: ignore[no-untyped-def]
+        listings.append(path)
+        return real_scandir(path)
+
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        listings.clear()
+        os.scandir = counting_scandir
+        try:
+            start = time.perf_counter()
+            count = sum(1 for _ in walker(directory))
+            best = min(best, time.perf_counter() - start)
+        finally:
+            os.scandir = real_scandir
+    return best, count, len(listings)
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--dirs", type=int, default=200)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        build_tree(directory, args.dirs, args.files)
+
+        print(f"{'walker':>10} {'best (s)':>9} {'files':>7} {'listings':>9}")
+        results = {}
+        for name, walker in (
+            ("os.walk", os_walk_files),
+            ("scandir", iter_python_files),
+        ):
+            results[name] = measure(walker, directory, args.repeat)
+            seconds, count, listings = results[name]
+            print(f"{name:>10} {seconds:>9.4f} {count:>7} {listings:>9}")
+
+    speedup = results["os.walk"][0] / results["scandir"][0]
+    print(f"Speedup: {speedup:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""Run Midna's benchmark suite and write comparable JSON results
+
+Generates a synthetic project, site-packages directory and requirements
+tree (see synthetic.py), times each stage of a Midna run on them and
+prints the results as JSON. Save the output on two commits and compare:
+
+    python benchmarks/run_suite.py --output before.json
+    git checkout other-branch
+    python benchmarks/run_suite.py --compare before.json
+
+Usage:
+    python benchmarks/run_suite.py [--files N] [--imports N] [--depth N]
+        [--error-rate F] [--repeat R] [--output FILE] [--compare FILE]
+"""
+
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from typing import Any, Callable, Dict, List, Optional
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic  # noqa: E402
+from midna import installed  # noqa: E402
+from midna.checker import check_installed_packages  # noqa: E402
+from midna.discovery import (  # noqa: E402
+    analyze_project_imports,
+    extract_imports_from_file,
+    find_python_files,
+)
+from midna.package_classifier import classify_packages  # noqa: E402
+from midna.parser import read_requirements  # noqa: E402
+from midna.requirements import clear_cache  # noqa: E402
+
+# Bump when result fields change meaning
+SCHEMA_VERSION = 1
+
+
+def git_commit() -> Optional[str]:
+    """Return the commit being benchmarked, if ROOT is a git checkout"""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def measure(
+    func: Callable[[], Any],
+    repeat: int,
+    items: int,
+    setup: Optional[Callable[[], None]] = None,
+) -> Dict[str, Any]:
+    """Time func repeat times; items is the unit count for per-item cost"""
+    runs: List[float] = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    best = min(runs)
+    return {
+        "best_s": round(best, 6),
+        "median_s": round(statistics.median(runs), 6),
+        "runs": [round(run, 6) for run in runs],
+        "items": items,
+        "per_item_us": round(best * 1e6 / max(1, items), 3),
+    }
+
+
+def run_suite(args: Any, workdir: str) -> Dict[str, Any]:
+    """Generate the inputs below workdir and time every stage"""
+    project = os.path.join(workdir, "project")
+    site_packages = os.path.join(workdir, "site-packages")
+    requirements_dir = os.path.join(workdir, "requirements")
+
+    stats = synthetic.generate_project(
+        project,
+        files=args.files,
+        imports_per_file=args.imports,
+        depth=args.depth,
+        error_rate=args.error_rate,
+        third_party=args.dists,
+    )
+    dist_names = synthetic.generate_site_packages(site_packages, args.dists)
+    requirements = synthetic.generate_requirements(
+        requirements_dir, args.requirements, args.nesting
+    )
+
+    results: Dict[str, Any] = {}
+    files = find_python_files(project)
+    results["find_python_files"] = measure(
+        lambda: find_python_files(project), args.repeat, len(files)
+    )
+
+    for engine in ("ast", "fast"):
+        results[f"extract_imports_from_file[{engine}]"] = measure(
+            lambda: [extract_imports_from_file(f, engine) for f in files],
+            args.repeat,
+            len(files),
+        )
+        results[f"analyze_project_imports[{engine}]"] = measure(
+            lambda: analyze_project_imports(project, engine=engine),
+            args.repeat,
+            len(files),
+        )
+
+    imports = analyze_project_imports(project)
+    packages = read_requirements(requirements)
+    results["read_requirements[cold]"] = measure(
+        lambda: read_requirements(requirements),
+        args.repeat,
+        len(packages),
+        setup=clear_cache,
+    )
+    results["read_requirements[warm]"] = measure(
+        lambda: read_requirements(requirements), args.repeat, len(packages)
+    )
+
+    # Point the installed index at the fake site-packages only
+    with mock.patch.object(
+        installed, "default_search_paths", return_value=[site_packages]
+    ):
+        checked = dist_names + [f"missing-{i}" for i in range(len(packages))]
+        results["check_installed_packages[cold]"] = measure(
+            lambda: check_installed_packages(checked),
+            args.repeat,
+            len(checked),
+            setup=installed.invalidate_installed_index,
+        )
+        results["check_installed_packages[warm]"] = measure(
+            lambda: check_installed_packages(checked),
+            args.repeat,
+            len(checked),
+        )
+        results["classify_packages"] = measure(
+            lambda: classify_packages(imports, project),
+            args.repeat,
+            len(imports),
+        )
+    installed.invalidate_installed_index()
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": {
+            "files": args.files,
+            "imports": args.imports,
+            "depth": args.depth,
+            "error_rate": args.error_rate,
+            "dists": args.dists,
+            "requirements": args.requirements,
+            "nesting": args.nesting,
+            "repeat": args.repeat,
+        },
+        "inputs": dict(stats, requirements=len(packages)),
+        "results": results,
+    }
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """Print best times of two result sets side by side"""
+    if old.get("params") != new.get("params"):
+        print("WARNING: runs used different parameters", file=sys.stderr)
+    print(
+        f"{'benchmark':<38} {'old (s)':>9} {'new (s)':>9} {'change':>8}",
+        file=sys.stderr,
+    )
+    for name, result in new["results"].items():
+        before = old.get("results", {}).get(name)
+        if before is None:
+            print(
+                f"{name:<38} {'-':>9} {result['best_s']:>9.4f}",
+                file=sys.stderr,
+            )
+            continue
+        change = (result["best_s"] / before["best_s"] - 1) * 100
+        print(
+            f"{name:<38} {before['best_s']:>9.4f} {result['best_s']:>9.4f} "
+            f"{change:>+7.1f}%",
+            file=sys.stderr,
+        )
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--imports", type=int, default=8, metavar="N")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--dists", type=int, default=500, metavar="N")
+    parser.add_argument("--requirements", type=int, default=5000)
+    parser.add_argument("--nesting", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", metavar="FILE")
+    parser.add_argument("--compare", metavar="FILE")
+    args = parser.parse_args()
+
+    # Midna logs a warning per broken file; keep the output to the JSON
+    logging.getLogger("midna").setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        report = run_suite(args, workdir)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Synthetic inputs for Midna's benchmarks
+
+Generates projects, fake site-packages directories and requirements
+files with known sizes, deterministically for a given seed, so timings
+taken on different commits measure the same work.
+"""
+
+import os
+import random
+from typing import Dict, List
+
+STDLIB = [
+    "os",
+    "sys",
+    "json",
+    "re",
+    "logging",
+    "pathlib",
+    "typing",
+    "collections",
+    "itertools",
+    "functools",
+]
+
+
+def third_party_name(index: int) -> str:
+    """Import name of the index-th fake third-party distribution"""
+    return f"fakedist{index}"
+
+
+def generate_project(
+    root: str,
+    files: int = 1000,
+    imports_per_file: int = 8,
+    depth: int = 3,
+    error_rate: float = 0.02,
+    third_party: int = 200,
+    seed: int = 42,
+) -> Dict[str, int]:
+    """
+    Write a synthetic project below root
+
+    Files are spread over packages nested depth levels deep. Each file
+    has imports_per_file imports drawn from the stdlib, the project's own
+    packages and third_party fake distributions, followed by some code;
+    a fraction error_rate of the files has a syntax error.
+    """
+    rng = random.Random(seed)
+    packages = max(1, files // 50)
+    stats = {"files": 0, "bytes": 0, "broken": 0}
+
+    for index in range(files):
+        parts = [f"pkg{index % packages}"]
+        parts += [
+            f"sub{(index // packages + level) % 4}"
+            for level in range(1, depth)
+        ]
+        directory = os.path.join(root, *parts)
+        os.makedirs(directory, exist_ok=True)
+
+        lines = []
+        for _ in range(imports_per_file):
+            roll = rng.random()
+            if roll < 0.5:
+                lines.append(f"import {rng.choice(STDLIB)}")
+            elif roll < 0.6:
+                lines.append(f"from pkg{rng.randrange(packages)} import x")
+            else:
+                name = third_party_name(rng.randrange(third_party))
+                lines.append(f"from {name}.api import client")
+        for j in range(30):
+            lines.append(f"def func_{j}(a, b):")
+            lines.append(f"    return [a * k + b for k in range({j})]")
+        if rng.random() < error_rate:
+            lines.append("def broken(:")
+            stats["broken"] += 1
+
+        source = "\n".join(lines) + "\n"
+        with open(os.path.join(directory, f"mod{index}.py"), "w") as f:
+            f.write(source)
+        stats["files"] += 1
+        stats["bytes"] += len(source)
+
+    for package in range(packages):
+        init = os.path.join(root, f"pkg{package}", "__init__.py")
+        open(init, "w").close()
+
+    return stats
+
+
+def generate_site_packages(root: str, count: int = 500) -> List[str]:
+    """Write count fake installed distributions; return their names"""
+    os.makedirs(root, exist_ok=True)
+    names = []
+    for index in range(count):
+        name = f"Fake-Dist{index}"
+        dist_info = os.path.join(
+            root, f"Fake_Dist{index}-1.{index}.0.dist-info"
+        )
+        os.makedirs(dist_info)
+        with open(os.path.join(dist_info, "METADATA"), "w") as f:
+            f.write(f"Metadata-Version: 2.1\nName: {name}\n")
+            f.write(f"Version: 1.{index}.0\n")
+        with open(os.path.join(dist_info, "top_level.txt"), "w") as f:
+            f.write(f"{third_party_name(index)}\n")
+        names.append(name)
+    return names
+
+
+def requirement_spec(rng: random.Random, name: str, index: int) -> str:
+    """A requirement line for name: a pin, range, extra, marker or bare"""
+    style = rng.randrange(5)
+    if style == 0:
+        return f"{name}=={rng.randrange(10)}.{index}"
+    if style == 1:
+        return f"{name}>=1.0,<3  # pinned range"
+    if style == 2:
+        return f"{name}[extra]~=2.1"
+    if style == 3:
+        return f'{name}; python_version >= "3.8"'
+    return name
+
+
+def generate_specs(count: int, unique: int, seed: int = 42) -> List[str]:
+    """count requirement specs drawn from unique distinct ones"""
+    rng = random.Random(seed)
+    distinct = [
+        requirement_spec(rng, third_party_name(i), i).split("  #")[0]
+        for i in range(max(1, unique))
+    ]
+    return [distinct[rng.randrange(len(distinct))] for _ in range(count)]
+
+
+def generate_requirements(
+    root: str, lines: int = 5000, nesting: int = 10, seed: int = 42
+) -> str:
+    """
+    Write a requirements file of about lines entries, returning its path
+
+    The entries are split across a chain of nesting files included with
+    -r, and mix pins, ranges, extras, markers and comments.
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    per_file = max(1, lines // max(1, nesting))
+
+    for level in range(nesting):
+        entries = []
+        if level + 1 < nesting:
+            entries.append(f"-r requirements-{level + 1}.txt")
+        for index in range(per_file):
+            name = third_party_name(level * per_file + index)
+            entries.append(requirement_spec(rng, name, index))
+            if index % 50 == 0:
+                entries.append("# section comment")
+        path = os.path.join(root, f"requirements-{level}.txt")
+        with open(path, "w") as f:
+            f.write("\n".join(entries) + "\n")
+
+    return os.path.join(root, "requirements-0.txt")
@@ -4,13 +4,36 @@ __version__ = "1.0.6"
 __author__ = "Jassem Manita"
 __description__ = "Smart pip requirements installer"
 
-from .checker import check_installed_packages
-from .core import main
-from .discovery import auto_discover_requirements
-from .installer import install_packages
-from .logger import setup_logging
-from .parser import parse_package_name, read_requirements
-from .uninstaller import check_packages_to_uninstall, uninstall_packages
+import importlib
+
+# Avoid importing typing at startup; type checkers treat this name as True
+TYPE_CHECKING = False
+
+if TYPE_CHECKING:
+    from typing import List
+
+    from .checker import check_installed_packages
+    from .core import main
+    from .discovery import auto_discover_requirements
+    from .installer import install_packages
+    from .logger import setup_logging
+    from .parser import parse_package_name, read_requirements
+    from .uninstaller import check_packages_to_uninstall, uninstall_packages
+
+# Public name -> submodule that defines it. Submodules are only imported
+# on first attribute access, so `import midna` (and every CLI path that
+# does not need discovery or pip) stays cheap.
+_LAZY_ATTRIBUTES = {
+    "main": "core",
+    "install_packages": "installer",
+    "uninstall_packages": "uninstaller",
+    "check_packages_to_uninstall": "uninstaller",
+    "read_requirements": "parser",
+    "parse_package_name": "parser",
+    "check_installed_packages": "checker",
+    "setup_logging": "logger",
+    "auto_discover_requirements": "discovery",
+}
 
 __all__ = [
     "main",
@@ -23,3 +46,18 @@ __all__ = [
     "setup_logging",
     "auto_discover_requirements",
 ]
+
+
+def __getattr__(name: str) -> object:
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(f".{module_name}", __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> "List[str]":
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
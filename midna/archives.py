@@ -0,0 +1,242 @@
+"""Import scanning of archives for Midna
+
+Wheels, zip files, sdists and other tarballs (such as exported container
+file systems) are scanned without being unpacked: their Python members
+are read one at a time straight from zipfile/tarfile and handed to the
+import extractor. Nothing is written to disk, and apart from the member
+headers tarfile keeps, memory is bounded by the largest member
+(notebooks are streamed, see midna.notebooks).
+"""
+
+import logging
+import os
+import tarfile
+import zipfile
+from functools import partial
+from typing import (
+    IO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from . import profiling
+from .discovery import extract_import_lines_from_stream, python_path_test
+from .ignore import IgnoreMatcher, PathFilter
+from .notebooks import NOTEBOOK_SUFFIX
+from .package_classifier import ProjectModules
+
+ZIP_SUFFIXES = (".whl", ".zip", ".egg")
+TAR_SUFFIXES = (
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+)
+ARCHIVE_SUFFIXES = ZIP_SUFFIXES + TAR_SUFFIXES
+
+# Members whose directories make up importable packages
+MODULE_SUFFIXES = (".py", ".pyi")
+
+# Modules bigger than this are skipped instead of being read into memory
+MAX_MEMBER_SIZE = 32 << 20
+
+# What reading a damaged or truncated archive can raise
+ARCHIVE_ERRORS = (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile)
+
+# (name, size, open) for a regular file of an archive
+Member = Tuple[str, int, Callable[[], IO[bytes]]]
+
+# Leading path components of a member, enough to find top-level modules
+Prefix = Tuple[str, ...]
+
+
+def is_archive(path: str) -> bool:
+    """Whether path is an archive file that can be scanned for imports"""
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+def _member_name(name: str) -> str:
+    """Make a member name relative ("./usr/lib" -> "usr/lib")"""
+    name = name.lstrip("/")
+    while name.startswith("./"):
+        name = name[2:].lstrip("/")
+    return name
+
+
+def _tar_member(archive: tarfile.TarFile, info: tarfile.TarInfo) -> IO[bytes]:
+    member = archive.extractfile(info)
+    if member is None:
+        raise OSError(f"Cannot read {info.name}")
+    return member
+
+
+def iter_members(path: str) -> Iterator[Member]:
+    """
+    Yield (name, size, open) for the regular files of an archive
+
+    Members come in archive order; open returns a binary file object
+    reading the member, valid until the next member is asked for.
+    Tarballs are read as a stream, in a single pass, and compressed
+    ones are decompressed on the fly. TarFile keeps the header of every
+    member it has read until the archive is closed, so memory grows
+    with the member count (a few hundred bytes each), not their size.
+    """
+    if path.lower().endswith(ZIP_SUFFIXES):
+        with zipfile.ZipFile(path) as zip_archive:
+            zip_info: zipfile.ZipInfo
+            for zip_info in zip_archive.infolist():
+                if not zip_info.is_dir():
+                    yield (
+                        _member_name(zip_info.filename),
+                        zip_info.file_size,
+                        partial(zip_archive.open, zip_info),
+                    )
+        return
+
+    with tarfile.open(path, "r|*") as tar_archive:
+        tar_info: Optional[tarfile.TarInfo] = tar_archive.next()
+        while tar_info is not None:
+            if tar_info.isfile():
+                yield (
+                    _member_name(tar_info.name),
+                    tar_info.size,
+                    partial(_tar_member, tar_archive, tar_info),
+                )
+            tar_info = tar_archive.next()
+
+
+def _prefix(name: str) -> Prefix:
+    """Keep the first three components of a member name"""
+    return tuple(name.split("/", 3)[:3])
+
+
+def _add_archive_modules(
+    modules: ProjectModules, prefixes: Set[Prefix]
+) -> None:
+    """
+    Add the top-level modules and packages of an archive to modules
+
+    The single top directory of an sdist ("name-1.0/") and a src/
+    layout below it are looked through.
+    """
+    roots = {prefix[0] for prefix in prefixes}
+    if (
+        len(roots) == 1
+        and all(len(prefix) > 1 for prefix in prefixes)
+        and (next(iter(roots)), "__init__.py") not in prefixes
+    ):
+        prefixes = {prefix[1:] for prefix in prefixes}
+
+    src_package = ("src", "__init__.py") in prefixes
+    for prefix in prefixes:
+        if prefix[0] == "src" and len(prefix) > 1 and not src_package:
+            modules.add(prefix[1])
+        else:
+            modules.add(prefix[0])
+
+
+def _scan_prefixes(path: str, accepts: Callable[[str], bool]) -> Set[Prefix]:
+    """Collect the prefixes of the accepted modules, reading no data"""
+    return {
+        _prefix(name)
+        for name, _, _ in iter_members(path)
+        if name.endswith(MODULE_SUFFIXES) and accepts(name)
+    }
+
+
+def archive_project_modules(
+    path: str, path_filter: Optional[PathFilter] = None
+) -> ProjectModules:
+    """List the top-level modules and packages inside an archive"""
+    if path_filter is None:
+        path_filter = PathFilter()
+    accepts = python_path_test(path_filter, IgnoreMatcher())
+    modules = ProjectModules()
+    try:
+        prefixes = _scan_prefixes(path, accepts)
+    except ARCHIVE_ERRORS as e:
+        logging.getLogger("midna").warning(f"Error reading {path}: {e}")
+        return modules
+    _add_archive_modules(modules, prefixes)
+    return modules
+
+
+def iter_archive_import_lines(
+    path: str,
+    engine: str = "ast",
+    path_filter: Optional[PathFilter] = None,
+    project_modules: Optional[ProjectModules] = None,
+) -> Iterator[Tuple[str, Dict[str, int]]]:
+    """
+    Yield ("archive/member", {import: first line}) for an archive
+
+    Members are chosen like files of a directory walk (SKIP_DIRS and
+    path_filter's globs; ignore files do not apply) and parsed one at a
+    time in this process. If project_modules is given, the archive's
+    top-level modules are added to it before the first result is
+    yielded; for tarballs, which can only be read once, that means
+    results are held until the whole archive has been read.
+    """
+    logger = logging.getLogger("midna")
+    logger.info(f"Analyzing Python files in archive: {path}")
+    if path_filter is None:
+        path_filter = PathFilter()
+    accepts = python_path_test(path_filter, IgnoreMatcher())
+    is_zip = path.lower().endswith(ZIP_SUFFIXES)
+
+    # Held back until every member name is known (tarballs only)
+    pending: Optional[List[Tuple[str, Dict[str, int]]]] = None
+    prefixes: Set[Prefix] = set()
+    file_count = 0
+
+    try:
+        if project_modules is not None:
+            if is_zip:
+                # The central directory lists every name up front
+                with profiling.timer("walk"):
+                    _add_archive_modules(
+                        project_modules, _scan_prefixes(path, accepts)
+                    )
+            else:
+                pending = []
+
+        members = profiling.timed_iter("walk", iter_members(path))
+        for name, size, open_member in members:
+            if not accepts(name):
+                continue
+            file_count += 1
+            if name.endswith(MODULE_SUFFIXES):
+                prefixes.add(_prefix(name))
+            label = f"{path}/{name}"
+            if size > MAX_MEMBER_SIZE and not name.endswith(NOTEBOOK_SUFFIX):
+                logger.warning(f"Skipping {label}: {size} bytes")
+                imports: Dict[str, int] = {}
+            else:
+                with open_member() as member:
+                    imports = extract_import_lines_from_stream(
+                        member, label, engine
+                    )
+            if imports:
+                logger.debug(f"Imports from {label}: {sorted(imports)}")
+            if pending is None:
+                yield label, imports
+            else:
+                pending.append((label, imports))
+    except ARCHIVE_ERRORS as e:
+        logger.warning(f"Error reading {path}: {e}")
+
+    if pending is not None:
+        assert project_modules is not None
+        _add_archive_modules(project_modules, prefixes)
+        yield from pending
+
+    logger.info(f"Analyzed {file_count} Python files")
+    profiling.count("files scanned", file_count)
@@ -0,0 +1,148 @@
+"""Import extraction from cached bytecode for Midna
+
+The "pyc" engine reads a module's imports from its __pycache__ .pyc
+file when that file is fresh, checked the way the import system does:
+the header must carry this interpreter's magic number and either the
+source's mtime and size or, for hash-based pycs, the hash of its
+contents. Imports are then the IMPORT_NAME instructions of the
+unmarshalled code objects, so nothing is tokenized or parsed.
+
+Code the compiler drops as unreachable (`if 0:` blocks, statements after
+a return) has no bytecode, so imports in it are not reported.
+"""
+
+import dis
+import importlib.util
+import marshal
+import os
+from bisect import bisect_right
+from types import CodeType
+from typing import Dict, List, Optional, Tuple
+
+from . import profiling
+
+_IMPORT_NAME = dis.opmap["IMPORT_NAME"]
+_IMPORT_NAME_BYTE = bytes([_IMPORT_NAME])
+_EXTENDED_ARG = dis.EXTENDED_ARG
+
+# magic, flags, then mtime and size or the source hash
+_HEADER_SIZE = 16
+_FLAG_HASH_BASED = 0b01
+
+
+def read_fresh_code(source_path: str) -> Optional[CodeType]:
+    """
+    Load the code object cached for a source file, if it is fresh
+
+    Returns None when there is no .pyc for this interpreter or it does
+    not match the source any more.
+    """
+    try:
+        pyc_path = importlib.util.cache_from_source(source_path)
+    except (NotImplementedError, ValueError):
+        return None  # No cache tag, e.g. with sys.dont_write_bytecode
+    try:
+        with open(pyc_path, "rb") as f:
+            data = f.read()
+        if len(data) < _HEADER_SIZE or data[:4] != importlib.util.MAGIC_NUMBER:
+            return None
+
+        flags = int.from_bytes(data[4:8], "little")
+        if flags & _FLAG_HASH_BASED:
+            # Checked even when the pyc asks not to be
+            with open(source_path, "rb") as f:
+                source_hash = importlib.util.source_hash(f.read())
+            if data[8:16] != source_hash:
+                return None
+        else:
+            st = os.stat(source_path)
+            mtime = int.from_bytes(data[8:12], "little")
+            size = int.from_bytes(data[12:16], "little")
+            if (
+                mtime != int(st.st_mtime) & 0xFFFFFFFF
+                or size != st.st_size & 0xFFFFFFFF
+            ):
+                return None
+    except OSError:
+        return None
+
+    profiling.count("bytes read", len(data))
+    try:
+        code = marshal.loads(memoryview(data)[_HEADER_SIZE:])
+    except (EOFError, ValueError, TypeError):
+        return None
+    return code if isinstance(code, CodeType) else None
+
+
+def _import_names(code: CodeType) -> List[Tuple[int, str]]:
+    """Return (offset, module) for the IMPORT_NAME instructions of code"""
+    raw = code.co_code
+    found: List[Tuple[int, str]] = []
+    # Only instructions that can be IMPORT_NAME are decoded
+    offset = raw.find(_IMPORT_NAME_BYTE)
+    while offset != -1:
+        if not offset % 2:  # an opcode, not an argument
+            arg = raw[offset + 1]
+            shift = 8
+            prefix = offset - 2
+            while prefix >= 0 and raw[prefix] == _EXTENDED_ARG:
+                arg |= raw[prefix + 1] << shift
+                shift += 8
+                prefix -= 2
+            found.append((offset, code.co_names[arg]))
+        offset = raw.find(_IMPORT_NAME_BYTE, offset + 1)
+    return found
+
+
+def import_lines_from_code(code: CodeType) -> Dict[str, int]:
+    """
+    Map top-level imported package names to their first import line
+
+    Matches midna.extractors.import_lines_from_tree for the same source,
+    except for unreachable code (see the module docstring).
+    """
+    lines: Dict[str, int] = {}
+    stack = [code]
+    while stack:
+        nested = stack.pop()
+        for const in nested.co_consts:
+            if type(const) is CodeType:
+                stack.append(const)
+        # Most code objects (functions, comprehensions) import nothing
+        if _IMPORT_NAME_BYTE not in nested.co_code:
+            continue
+        found = _import_names(nested)
+        if not found:
+            continue
+
+        starts = [
+            (offset, line)
+            for offset, line in dis.findlinestarts(nested)
+            if line is not None
+        ]
+        offsets = [offset for offset, _ in starts]
+        for offset, module in found:
+            name = module.split(".")[0]
+            if not name:  # from . import x
+                continue
+            index = bisect_right(offsets, offset) - 1
+            line = starts[index][1] if index >= 0 else nested.co_firstlineno
+            if name not in lines or line < lines[name]:
+                lines[name] = line
+    return lines
+
+
+def pyc_import_lines(source_path: str) -> Optional[Dict[str, int]]:
+    """
+    Map the imports of a source file to their first line, from its .pyc
+
+    Returns None if there is no fresh .pyc; the caller parses the source
+    instead.
+    """
+    with profiling.timer("pyc"):
+        code = read_fresh_code(source_path)
+        if code is None:
+            profiling.count("pyc misses")
+            return None
+        profiling.count("pyc hits")
+        return import_lines_from_code(code)
@@ -0,0 +1,176 @@
+"""Persistent per-file import cache for Midna"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Cache location, relative to the scanned project root
+CACHE_DIR = os.path.join(".midna", "cache")
+# One file per import engine: engines disagree on some files (fast
+# reports imports from files that do not parse)
+CACHE_FILE = "imports-{engine}.json"
+
+# Bump when the entry layout or the extraction semantics change
+CACHE_VERSION = 2
+
+
+# (mtime_ns, size, content hash or None) of a file, taken before reading it
+Signature = Tuple[int, int, Optional[str]]
+
+
+def hash_file(file_path: str) -> str:
+    """Return a content hash for a file"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_signature(file_path: str, use_hash: bool) -> Optional[Signature]:
+    """Return what a cache entry for a file is checked against, if any"""
+    try:
+        stat = os.stat(file_path)
+        content_hash = hash_file(file_path) if use_hash else None
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, content_hash
+
+
+class ImportCache:
+    """
+    On-disk map of file path -> extracted imports (and their lines)
+
+    Entries are keyed by the path relative to the project root and are
+    valid while the file's mtime and size are unchanged. With use_hash,
+    a file whose mtime changed but whose size and content hash still
+    match (e.g. after a fresh checkout in CI) is also a hit. Each engine
+    (see midna.extractors.ENGINES) has a cache of its own.
+    """
+
+    def __init__(
+        self, directory: str = ".", use_hash: bool = False, engine: str = "ast"
+    ) -> None:
+        self.directory = directory
+        self.use_hash = use_hash
+        self.path = os.path.join(
+            directory, CACHE_DIR, CACHE_FILE.format(engine=engine)
+        )
+        self.entries: Dict[str, List] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+
+    def _key(self, file_path: str) -> str:
+        return os.path.relpath(file_path, self.directory)
+
+    def load(self) -> None:
+        """Load the cache from disk, starting empty if it is unusable"""
+        logger = logging.getLogger("midna")
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable import cache: {e}")
+            return
+
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            logger.info("Import cache version changed, rebuilding")
+            return
+
+        self.entries = data.get("files", {})
+        logger.debug(f"Loaded {len(self.entries)} import cache entries")
+
+    def lookup(self, file_path: str) -> Optional[Set[str]]:
+        """Return the cached imports for a file, or None if stale"""
+        lines = self.lookup_lines(file_path)
+        return None if lines is None else set(lines)
+
+    def lookup_lines(self, file_path: str) -> Optional[Dict[str, int]]:
+        """Return the cached import -> line map for a file, or None"""
+        entry = self.entries.get(self._key(file_path))
+        if entry is None:
+            self.misses += 1
+            return None
+
+        mtime_ns, size, content_hash, imports = entry
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        if stat.st_mtime_ns == mtime_ns and stat.st_size == size:
+            self.hits += 1
+            return dict(imports)
+
+        if self.use_hash and stat.st_size == size and content_hash:
+            try:
+                if hash_file(file_path) == content_hash:
+                    entry[0] = stat.st_mtime_ns
+                    self._dirty = True
+                    self.hits += 1
+                    return dict(imports)
+            except OSError:
+                pass
+
+        self.misses += 1
+        return None
+
+    def store(
+        self,
+        file_path: str,
+        imports: Dict[str, int],
+        signature: Optional[Signature],
+    ) -> None:
+        """
+        Record the imports (and their first lines) extracted from a file
+
+        signature is file_signature() of the file taken before it was
+        read, so that an edit made while it was being parsed leaves a
+        stale entry rather than old imports under the new signature.
+        """
+        if signature is None:
+            return
+        mtime_ns, size, content_hash = signature
+        self.entries[self._key(file_path)] = [
+            mtime_ns,
+            size,
+            content_hash,
+            dict(sorted(imports.items())),
+        ]
+        self._dirty = True
+
+    def prune(self, file_paths: Iterable[str]) -> int:
+        """Drop entries for files that are no longer part of the project"""
+        live = {self._key(file_path) for file_path in file_paths}
+        stale = [key for key in self.entries if key not in live]
+        for key in stale:
+            del self.entries[key]
+        if stale:
+            self._dirty = True
+        return len(stale)
+
+    def save(self) -> None:
+        """Write the cache back to disk if anything changed"""
+        if not self._dirty:
+            return
+
+        logger = logging.getLogger("midna")
+        data = {"version": CACHE_VERSION, "files": self.entries}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            # Atomic rename so concurrent runs never see a partial file
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"Failed to write import cache: {e}")
@@ -1,61 +1,90 @@
 """Package installation checker for Midna"""
 
 import logging
-import subprocess
-from typing import List, Set, Tuple
+from typing import List, Optional, Tuple
 
+from .installed import InstalledIndex, get_installed_index
 from .parser import parse_package_name
+from .pep508 import InvalidRequirement, parse_requirement
+from .versions import InvalidVersion, satisfies
 
+# (requirement, installed version) pairs that need a different version
+WrongVersions = List[Tuple[str, str]]
 
-def check_installed_packages(
-    packages: List[str],
-) -> Tuple[List[str], List[str]]:
-    """Check which packages are installed and which are missing"""
-    logger = logging.getLogger("midna")
-    logger.info("Checking installed packages...")
-
-    try:
-        # Get list of installed packages
-        result = subprocess.run(
-            ["pip", "list", "--format=freeze"],
-            capture_output=True,
-            text=True,
-            check=True,
-            shell=False,
-        )
 
-        installed_raw = (
-            result.stdout.strip().split("\n") if result.stdout.strip() else []
-        )
-        installed_packages: Set[str] = set()
+def check_requirements(
+    packages: List[str], installed: Optional[InstalledIndex] = None
+) -> Tuple[List[str], WrongVersions, List[str]]:
+    """
+    Sort requirements into missing, wrong version and satisfied
 
-        for package in installed_raw:
-            if "==" in package:
-                name = package.split("==")[0].lower()
-                installed_packages.add(name)
-
-        logger.debug(f"Found {len(installed_packages)} installed packages")
+    Installed versions are compared with each requirement's specifier,
+    so "requests>=2.31" with requests 2.20 installed is a wrong version.
+    Requirements whose specifier or installed version is not PEP 440
+    count as satisfied when the package is installed.
+    installed defaults to the current environment's index.
+    """
+    logger = logging.getLogger("midna")
 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to get installed packages: {e}")
-        print("ERROR: Failed to check installed packages")
-        raise
+    if installed is None:
+        installed = get_installed_index()
+    logger.debug(f"Found {len(installed)} installed packages")
 
-    missing_packages = []
-    already_installed = []
+    missing: List[str] = []
+    wrong_version: WrongVersions = []
+    satisfied: List[str] = []
 
     for package in packages:
-        package_name = parse_package_name(package).lower()
+        try:
+            requirement = parse_requirement(package)
+            name, specifier = requirement.name, requirement.specifier
+        except InvalidRequirement:
+            name, specifier = parse_package_name(package), ""
 
-        if package_name in installed_packages:
-            already_installed.append(package)
+        version = installed.version(name)
+        if version is None:
+            missing.append(package)
+            logger.debug(f"Missing: {package}")
+            continue
+
+        try:
+            ok = not specifier or satisfies(version, specifier)
+        except InvalidVersion as e:
+            logger.debug(f"Cannot compare versions for {package}: {e}")
+            ok = True
+        if ok:
+            satisfied.append(package)
             logger.debug(f"Already installed: {package}")
         else:
-            missing_packages.append(package)
-            logger.debug(f"Missing: {package}")
+            wrong_version.append((package, version))
+            logger.debug(f"Wrong version: {package} ({version} installed)")
+
+    return missing, wrong_version, satisfied
+
+
+def check_installed_packages(
+    packages: List[str], installed: Optional[InstalledIndex] = None
+) -> Tuple[List[str], List[str]]:
+    """
+    Check which packages are installed and which are missing
+
+    A package installed in a version its specifier does not allow counts
+    as missing. installed defaults to the current environment's index.
+    """
+    logger = logging.getLogger("midna")
+    logger.info("Checking installed packages...")
+
+    missing, wrong_version, already_installed = check_requirements(
+        packages, installed
+    )
+    if wrong_version:
+        # Keep the order of packages
+        unsatisfied = set(missing) | {p for p, _ in wrong_version}
+        missing = [p for p in packages if p in unsatisfied]
 
     logger.info(
-        f"Missing packages: {len(missing_packages)}, "
+        f"Missing packages: {len(missing)}, "
+        f"Wrong version: {len(wrong_version)}, "
         f"Already installed: {len(already_installed)}"
     )
-    return missing_packages, already_installed
+    return missing, already_installed
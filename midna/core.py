@@ -1,15 +1,17 @@
 """Main CLI interface for Midna"""
 
 import sys
-from argparse import ArgumentParser, RawDescriptionHelpFormatter
-import importlib.metadata
+from argparse import ArgumentParser, Namespace, RawDescriptionHelpFormatter
 
-from .checker import check_installed_packages
-from .discovery import auto_discover_requirements
-from .installer import install_packages
-from .logger import setup_logging
-from .parser import read_requirements
-from .uninstaller import check_packages_to_uninstall, uninstall_packages
+# Avoid importing typing at startup; type checkers treat this name as True
+TYPE_CHECKING = False
+
+if TYPE_CHECKING:
+    from typing import List, Optional
+
+# Submodules are imported inside main() by the code paths that need them,
+# so that e.g. `midna --version` from a git hook does not pay for
+# discovery, metadata scanning or TOML parsing
 
 
 def create_parser() -> ArgumentParser:
@@ -26,6 +28,13 @@ def create_parser() -> ArgumentParser:
             "  midna                  # Auto-discover and install\n"
             "  midna file.txt         # Use specific requirements file\n"
             "  midna --dry-run        # Preview without installing\n"
+            "  midna -j 0             # Scan imports on all CPU cores\n"
+            "  midna --cache          # Only re-scan changed files\n"
+            "  midna --exclude tests  # Skip a directory when scanning\n"
+            "  midna why requests     # Show which files import a package\n"
+            "  midna --explain        # Rank packages by importing files\n"
+            "  midna --since main     # Dependencies added since main\n"
+            "  midna dist/app.whl     # Scan the imports inside a wheel\n"
             "\nPackage extraction:\n"
             "  midna -o reqs.txt          # Extract auto-discovered packages\n"
             "  midna file.txt -o deps.txt # Extract from specific file\n"
@@ -35,6 +44,9 @@ def create_parser() -> ArgumentParser:
             "  midna -v --log -o reqs.txt # Full output with logs\n"
             "\nOther operations:\n"
             "  midna -u                   # Uninstall mode\n"
+            "  midna --envs-from envs.txt # What each venv is missing\n"
+            "  midna watch                # Keep imports warm for queries\n"
+            "  midna query missing        # Ask a running watcher\n"
             "  midna --version            # Show version"
         ),
         formatter_class=RawDescriptionHelpFormatter,
@@ -49,7 +61,8 @@ def create_parser() -> ArgumentParser:
         "requirements_file",
         nargs="?",
         help=(
-            "Path to requirements.txt or pyproject.toml file "
+            "Path to requirements.txt or pyproject.toml file, or a "
+            "wheel, zip or tarball to scan for imports "
             "(if not provided, will auto-discover)"
         ),
         metavar="FILE",
@@ -76,6 +89,27 @@ def create_parser() -> ArgumentParser:
         action="store_true",
         help="Show detailed progress information",
     )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help=(
+            "Show which files import each package, most imported first "
+            "(see also: midna why PACKAGE)"
+        ),
+    )
+    parser.add_argument(
+        "--since",
+        help=(
+            "Only scan Python files changed since this git ref and report "
+            "the third-party imports they add or drop"
+        ),
+        metavar="REF",
+    )
+    parser.add_argument(
+        "--staged",
+        action="store_true",
+        help="Like --since HEAD, for the changes staged for commit",
+    )
 
     # Operation modes
     parser.add_argument(
@@ -90,16 +124,159 @@ def create_parser() -> ArgumentParser:
         action="store_true",
         help="Preview actions without making any changes",
     )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help=(
+            "Download all packages in parallel first, then install them, "
+            "reporting and retrying failed packages individually"
+        ),
+    )
+    parser.add_argument(
+        "--find-links",
+        help=(
+            "Install offline from this local wheelhouse directory "
+            "(implies --batch)"
+        ),
+        metavar="DIR",
+    )
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        help=(
+            "Report what this virtualenv or prefix is missing instead of "
+            "installing (repeatable)"
+        ),
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--envs-from",
+        help="Like --env, for every environment listed in FILE",
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help=(
+            "Stop a pip command that runs longer than S seconds "
+            "(default: 1800, 0 = no limit)"
+        ),
+        metavar="S",
+    )
+
+    # Performance options
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help=(
+            "Number of worker processes for import analysis "
+            "(0 = one per CPU, default: 1)"
+        ),
+        metavar="N",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help=(
+            "Cache per-file imports and the installed package index in "
+            ".midna/cache and only re-parse changed files"
+        ),
+    )
+    parser.add_argument(
+        "--cache-hash",
+        action="store_true",
+        help=(
+            "Like --cache, but also match unchanged files by content hash "
+            "(useful after a fresh checkout)"
+        ),
+    )
+
+    parser.add_argument(
+        "--engine",
+        choices=["ast", "fast", "pyc"],
+        default="ast",
+        help=(
+            "Import extraction engine: 'ast' parses whole files, 'fast' "
+            "scans only import statements, 'pyc' reads fresh __pycache__ "
+            "bytecode and parses like 'ast' otherwise (default: ast)"
+        ),
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print time spent per phase and scan counters when done",
+    )
+    parser.add_argument(
+        "--timings-json",
+        help="Write phase timings and counters to FILE as JSON",
+        metavar="FILE",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Run under cProfile and write the stats to FILE",
+        metavar="FILE",
+    )
+
+    # Scan scope options
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        help=(
+            "Only scan Python files matching this gitignore-style glob "
+            "(repeatable)"
+        ),
+        metavar="GLOB",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        help=(
+            "Skip files and directories matching this gitignore-style "
+            "glob (repeatable)"
+        ),
+        metavar="GLOB",
+    )
+    parser.add_argument(
+        "--no-ignore",
+        action="store_true",
+        help="Scan paths listed in .gitignore and .midnaignore too",
+    )
 
     return parser
 
 
+# `midna NAME ...` runs one of these instead of the installer, unless a
+# file called NAME exists (which keeps `midna FILE` working for any FILE)
+SUBCOMMANDS = {
+    "watch": ("watch", "main"),
+    "query": ("watch", "query_main"),
+    "why": ("explain", "main"),
+}
+
+
 def main() -> int:
     """Main entry point for Midna"""
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        import os
+
+        if not os.path.exists(sys.argv[1]):
+            import importlib
+
+            module_name, function = SUBCOMMANDS[sys.argv[1]]
+            module = importlib.import_module(f".{module_name}", __package__)
+            return int(getattr(module, function)(sys.argv[2:]))
+
     parser = create_parser()
     args = parser.parse_args()
 
     if args.version:
+        import importlib.metadata
+
         try:
             version = importlib.metadata.version("midna")
             print(f"Midna version {version}")
@@ -108,21 +285,151 @@ def main() -> int:
             print("Midna version unknown (package not installed)")
             return 1
 
+    if args.timings or args.timings_json or args.profile:
+        return run_profiled(args)
+    return run(args)
+
+
+def run_profiled(args: Namespace) -> int:
+    """Run with phase timers enabled, then report them"""
+    from . import profiling
+
+    profiling.enable()
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        with profiling.timer("total"):
+            return run(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(
+                f"\nProfile written to {args.profile} "
+                f"(view with: python -m pstats {args.profile})",
+                file=sys.stderr,
+            )
+        if args.timings:
+            print("\n" + profiling.format_table(), file=sys.stderr)
+        if args.timings_json:
+            profiling.write_json(args.timings_json)
+
+
+def pip_timeout(args: Namespace) -> "Optional[float]":
+    """Resolve --timeout to seconds, or None for no limit"""
+    from .runner import PIP_TIMEOUT
+
+    if args.timeout is None:
+        return PIP_TIMEOUT
+    return args.timeout if args.timeout > 0 else None
+
+
+def run(args: Namespace) -> int:
+    """Run Midna with parsed command line arguments"""
+    from . import profiling
+    from .logger import setup_logging
+
     logger = setup_logging(args.verbose, args.log)
     if args.log:
         logger.info("Midna started")
 
+    if args.cache or args.cache_hash:
+        from .cache import CACHE_DIR
+        from .installed import get_installed_index
+
+        # Reuse the installed package index until site-packages changes
+        get_installed_index(cache_dir=CACHE_DIR)
+
+    streamed: List[str] = []
+    import_index = None
+    if args.explain:
+        from .import_index import ImportIndex
+
+        # Filled by the discovery scan, so explaining costs no extra pass
+        import_index = ImportIndex()
+
+    # Archives are scanned like a project directory, without unpacking
+    requirements_file = args.requirements_file
+    project = "."
+    if requirements_file:
+        from .archives import is_archive
+
+        if is_archive(requirements_file):
+            project, requirements_file = requirements_file, None
+
+    incremental = args.since is not None or args.staged
+    path_filter = None
+
     try:
+        if not requirements_file or args.explain or incremental:
+            from .ignore import PathFilter, PatternError
+
+            try:
+                path_filter = PathFilter(
+                    include=args.include,
+                    exclude=args.exclude,
+                    use_ignore_files=not args.no_ignore,
+                )
+            except PatternError as e:
+                print(f"ERROR: {e}")
+                return 1
+
+        if incremental:
+            from .incremental import (
+                GitError,
+                diff_dependencies,
+                format_changes,
+            )
+
+            try:
+                with profiling.timer("discovery"):
+                    changes = diff_dependencies(
+                        ".", args.since, args.staged, args.engine, path_filter
+                    )
+            except GitError as e:
+                print(f"ERROR: {e}")
+                return 1
+            print(format_changes(changes))
+            return 0
+
         # Determine how to get packages
-        if args.requirements_file:
+        if requirements_file:
             # Traditional mode: use specified file
-            packages = read_requirements(args.requirements_file)
-            source_info = f"file: {args.requirements_file}"
-            logger.info(f"Using specified file: {args.requirements_file}")
+            from .parser import read_requirements
+
+            with profiling.timer("discovery"):
+                packages = read_requirements(requirements_file)
+            source_info = f"file: {requirements_file}"
+            logger.info(f"Using specified file: {requirements_file}")
         else:
             # Auto-discovery mode
+            from .discovery import auto_discover_requirements
+
             print("Auto-discovering requirements...")
-            discovered_items = auto_discover_requirements(".")
+
+            def report_package(name: str, version: str) -> None:
+                # Show packages as soon as import analysis finds them
+                if not streamed:
+                    print("\nDiscovered packages:")
+                streamed.append(name)
+                print(f"  + {name}", flush=True)
+
+            with profiling.timer("discovery"):
+                discovered_items = auto_discover_requirements(
+                    project,
+                    jobs=args.jobs,
+                    use_cache=args.cache,
+                    cache_hash=args.cache_hash,
+                    engine=args.engine,
+                    on_package=report_package,
+                    path_filter=path_filter,
+                    import_index=import_index,
+                )
 
             # Convert list of tuples to list of package names
             packages_info, discovery_method = discovered_items
@@ -132,8 +439,11 @@ def main() -> int:
             logger.info(f"Auto-discovery used: {source_info}")
 
         if not packages:
-            if args.requirements_file:
+            if requirements_file:
                 print("No packages found in requirements file.")
+            elif project != ".":
+                print(f"No packages discovered in {project}.")
+                return 0
             else:
                 print("No packages discovered in current directory.")
                 print("Tip: You can:")
@@ -144,6 +454,32 @@ def main() -> int:
 
         print(f"\nFound {len(packages)} packages ({source_info})")
 
+        if import_index is not None:
+            from .explain import (
+                explain_imports,
+                format_explanation,
+                scan_imports,
+            )
+
+            if not len(import_index):
+                # Packages came from a requirements file, nothing scanned
+                with profiling.timer("discovery"):
+                    import_index = scan_imports(
+                        project,
+                        args.jobs,
+                        args.cache,
+                        args.cache_hash,
+                        args.engine,
+                        path_filter,
+                    )
+
+            rows = explain_imports(import_index, project)
+            if rows:
+                print("\nImported packages (most imported first):")
+                print(format_explanation(rows))
+            else:
+                print("\nNo third-party imports found in Python files")
+
         # Save packages to output file if requested
         if args.output:
             try:
@@ -157,18 +493,46 @@ def main() -> int:
                 logger.error(f"Failed to save packages: {e}")
                 return 1
 
-        # Show packages that were found
-        if args.verbose or not args.requirements_file:
+        # Show packages that were found (unless already streamed)
+        if (args.verbose or not requirements_file) and not streamed:
             print("\nDiscovered packages:")
             for package in packages:
                 print(f"  + {package}")
 
+        if args.env or args.envs_from:
+            # Check other environments instead of changing this one
+            from .environments import (
+                check_environments,
+                format_matrix,
+                read_envs_file,
+            )
+
+            envs = list(args.env)
+            if args.envs_from:
+                envs += read_envs_file(args.envs_from)
+            print(f"\nChecking {len(envs)} environments...")
+            with profiling.timer("check environments"):
+                results = check_environments(packages, envs)
+            import os
+
+            labels = [os.path.relpath(env) for env in envs]
+            print(format_matrix(packages, results, labels))
+            if any(missing or error for _, missing, error in results):
+                return 1
+            return 0
+
         if args.uninstall:
             # Handle uninstall mode
-            if args.requirements_file:
-                found_packages, not_found_packages = (
-                    check_packages_to_uninstall(args.requirements_file)
-                )
+            from .uninstaller import (
+                check_packages_to_uninstall,
+                uninstall_packages,
+            )
+
+            if requirements_file:
+                with profiling.timer("check installed"):
+                    found_packages, not_found_packages = (
+                        check_packages_to_uninstall(requirements_file)
+                    )
             else:
                 # For auto-discovered packages, create temp file
                 import tempfile
@@ -180,9 +544,10 @@ def main() -> int:
                     temp_path = temp_file.name
 
                 try:
-                    found_packages, not_found_packages = (
-                        check_packages_to_uninstall(temp_path)
-                    )
+                    with profiling.timer("check installed"):
+                        found_packages, not_found_packages = (
+                            check_packages_to_uninstall(temp_path)
+                        )
                 finally:
                     import os
 
@@ -209,7 +574,10 @@ def main() -> int:
                 temp_path = temp_file.name
 
             try:
-                exit_code = uninstall_packages(temp_path, args.dry_run)
+                with profiling.timer("uninstall"):
+                    exit_code = uninstall_packages(
+                        temp_path, args.dry_run, pip_timeout(args)
+                    )
             finally:
                 import os
 
@@ -218,9 +586,13 @@ def main() -> int:
             return exit_code
         else:
             # Handle install mode
-            missing_packages, already_installed = check_installed_packages(
-                packages
-            )
+            from .checker import check_requirements
+            from .installer import install_packages, install_packages_batched
+
+            with profiling.timer("check installed"):
+                missing, wrong_version, already_installed = check_requirements(
+                    packages
+                )
             if already_installed:
                 print(
                     f"\nAlready installed ({len(already_installed)} "
@@ -228,13 +600,34 @@ def main() -> int:
                 )
                 for package in already_installed:
                     print(f"  + {package}")
-            if not missing_packages:
+            if wrong_version:
+                print(f"\nWrong version ({len(wrong_version)} packages):")
+                for package, version in wrong_version:
+                    print(f"  ~ {package} ({version} installed)")
+            if not missing and not wrong_version:
                 print("\nAll packages are already installed!")
                 return 0
-            print(f"\nWill install ({len(missing_packages)} packages):")
-            for package in missing_packages:
-                print(f"  - {package}")
-            exit_code = install_packages(missing_packages, args.dry_run)
+            if missing:
+                print(f"\nWill install ({len(missing)} packages):")
+                for package in missing:
+                    print(f"  - {package}")
+
+            # One pip run installs the missing ones and replaces the
+            # wrong versions, in the order they were required
+            unsatisfied = set(missing) | {p for p, _ in wrong_version}
+            missing_packages = [p for p in packages if p in unsatisfied]
+            with profiling.timer("install"):
+                if args.batch or args.find_links:
+                    exit_code = install_packages_batched(
+                        missing_packages,
+                        args.dry_run,
+                        find_links=args.find_links,
+                        timeout=pip_timeout(args),
+                    )
+                else:
+                    exit_code = install_packages(
+                        missing_packages, args.dry_run, pip_timeout(args)
+                    )
             return exit_code
 
     except FileNotFoundError as e:
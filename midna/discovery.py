@@ -1,12 +1,54 @@
 """Auto-discovery for Midna - find requirements automatically"""
 
-import ast
 import logging
 import os
+from functools import partial
 from pathlib import Path
-from typing import List, Set, Tuple
-
-from .package_classifier import classify_packages
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from . import profiling
+from .cache import ImportCache, Signature, file_signature
+from .extractors import decode_source, extract_import_lines
+from .ignore import IgnoreMatcher, PathFilter
+from .notebooks import NOTEBOOK_SUFFIX, extract_notebook_import_lines
+from .package_classifier import (
+    PROJECT,
+    STDLIB,
+    THIRD_PARTY,
+    ProjectModules,
+    classify_package,
+    is_stdlib_package,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+    from .import_index import ImportIndex
+
+# Import -> line maps and cache signatures per file of a chunk, plus the
+# worker's profiling data
+ChunkResult = Tuple[
+    List[Dict[str, int]], List[Optional[Signature]], Dict[str, Any]
+]
+
+# Files scanned for imports: Python modules and Jupyter notebooks
+SOURCE_SUFFIXES = (".py", NOTEBOOK_SUFFIX)
+
+# Files per task sent to a worker process: large enough to amortize the
+# pickling overhead, small enough to keep every worker busy
+CHUNK_SIZE = 32
 
 
 def find_requirements_files(directory: str = ".") -> List[str]:
@@ -43,44 +85,82 @@ def find_requirements_files(directory: str = ".") -> List[str]:
     return found_files
 
 
-def extract_imports_from_file(file_path: str) -> Set[str]:
-    """Extract import statements from a Python file"""
+def extract_imports_from_file(file_path: str, engine: str = "ast") -> Set[str]:
+    """
+    Extract import statements from a Python file
+
+    engine selects the extractor (see midna.extractors.ENGINES): "ast"
+    parses the whole file, "fast" scans only import statements, "pyc"
+    reads the file's cached bytecode if it is fresh.
+    """
+    return set(extract_import_lines_from_file(file_path, engine))
+
+
+def extract_import_lines_from_file(
+    file_path: str, engine: str = "ast"
+) -> Dict[str, int]:
+    """
+    Map the imports of a Python file to the first line of each
+
+    Notebooks (.ipynb) are read with midna.notebooks: only their code
+    cells are parsed. With the "pyc" engine, imports come from a fresh
+    __pycache__ .pyc if there is one (see midna.bytecode).
+    """
+    if engine == "pyc" and not file_path.endswith(NOTEBOOK_SUFFIX):
+        from .bytecode import pyc_import_lines
+
+        imports = pyc_import_lines(file_path)
+        if imports is not None:
+            return imports
+
+    try:
+        with open(file_path, "rb") as fb:
+            return extract_import_lines_from_stream(fb, file_path, engine)
+    except OSError as e:
+        logging.getLogger("midna").warning(f"Error reading {file_path}: {e}")
+        profiling.count("read failures")
+        return {}
+
+
+def extract_import_lines_from_stream(
+    stream: IO[bytes], name: str, engine: str = "ast"
+) -> Dict[str, int]:
+    """
+    Map the imports of an open Python file to the first line of each
+
+    name is the file's path, used to tell notebooks from modules and in
+    warnings. Modules are read whole, notebooks chunk by chunk.
+    """
     logger = logging.getLogger("midna")
-    imports: Set[str] = set()
+    imports: Dict[str, int] = {}
 
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            try:
-                tree = ast.parse(f.read())
-            except SyntaxError as e:
-                logger.warning(f"Syntax error in {file_path}: {e}")
-                return imports
-
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    # Get the top-level package name
-                    package = alias.name.split(".")[0]
-                    imports.add(package)
-
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    # Get the top-level package name
-                    package = node.module.split(".")[0]
-                    imports.add(package)
+        if name.endswith(NOTEBOOK_SUFFIX):
+            return extract_notebook_import_lines(stream, engine, name)
+        data = stream.read()
+        profiling.count("bytes read", len(data))
+        # Cheap pre-filter: no keyword, no imports
+        if engine == "fast" and b"import" not in data:
+            return imports
+        source = decode_source(data)
+
+        try:
+            with profiling.timer("parse"):
+                imports = extract_import_lines(source, engine)
+        except SyntaxError as e:
+            logger.warning(f"Syntax error in {name}: {e}")
+            profiling.count("parse failures")
 
     except Exception as e:
-        logger.warning(f"Error reading {file_path}: {e}")
+        logger.warning(f"Error reading {name}: {e}")
+        profiling.count("read failures")
 
     return imports
 
 
-def find_python_files(directory: str = ".") -> List[str]:
-    """Find all Python files in directory and subdirectories"""
-    python_files = []
-
-    # Skip common directories that shouldn't be scanned
-    skip_dirs = {
+# Directories that are never scanned, whatever the ignore files say
+SKIP_DIRS = frozenset(
+    {
         ".git",
         ".svn",
         ".hg",  # VCS
@@ -95,34 +175,465 @@ def find_python_files(directory: str = ".") -> List[str]:
         "build",
         "dist",
         ".eggs",  # Build artifacts
+        ".midna",  # Midna's own cache
+        ".ipynb_checkpoints",  # Jupyter autosaves
     }
+)
 
-    for root, dirs, files in os.walk(directory):
-        # Remove skip directories from dirs list
-        dirs[:] = [d for d in dirs if d not in skip_dirs]
 
-        for file in files:
-            if file.endswith(".py"):
-                python_files.append(os.path.join(root, file))
+_INIT_FILES = ("__init__.py", "__init__.pyi")
+_MODULE_SUFFIXES = (".py", ".pyi")
 
-    return python_files
 
+def _list_dir(path: str) -> List["os.DirEntry[str]"]:
+    """List a directory, or return nothing if it cannot be listed"""
+    try:
+        with os.scandir(path) as it:
+            return list(it)
+    except OSError as e:
+        logging.getLogger("midna").debug(f"Cannot list {path}: {e}")
+        return []
+
+
+def _has_modules(
+    entries: List["os.DirEntry[str]"],
+    rel_dir: str,
+    path_filter: PathFilter,
+    matcher: IgnoreMatcher,
+    listed: Dict[str, List["os.DirEntry[str]"]],
+) -> bool:
+    """
+    Whether a directory holds .py/.pyi files, directly or below
+
+    Stops at the first one found. Every directory listed on the way is
+    kept in listed, where the walk picks it up instead of listing it
+    again.
+    """
+    subdirs = []
+    for entry in entries:
+        if entry.is_dir():
+            subdirs.append(entry)
+        elif entry.name.endswith(_MODULE_SUFFIXES):
+            return True
+    for entry in subdirs:
+        if (
+            entry.name in SKIP_DIRS
+            or entry.is_symlink()
+            or path_filter.skips_dir(rel_dir + entry.name, matcher)
+        ):
+            continue
+        sub_entries = listed[entry.path] = _list_dir(entry.path)
+        if _has_modules(
+            sub_entries,
+            f"{rel_dir}{entry.name}/",
+            path_filter,
+            matcher,
+            listed,
+        ):
+            return True
+    return False
+
+
+def _add_project_modules(
+    modules: ProjectModules,
+    entries: List["os.DirEntry[str]"],
+    rel_dir: str,
+    path_filter: PathFilter,
+    matcher: IgnoreMatcher,
+    listed: Dict[str, List["os.DirEntry[str]"]],
+) -> None:
+    """Add the modules and packages in a top-level directory listing"""
+    for entry in entries:
+        name = entry.name
+        if entry.is_dir():
+            if name in SKIP_DIRS or path_filter.skips_dir(
+                rel_dir + name, matcher
+            ):
+                continue
+            # Listings are kept for the walk, which does not follow
+            # symlinks
+            kept = {} if entry.is_symlink() else listed
+            sub_entries = kept[entry.path] = _list_dir(entry.path)
+            if name == "src" and not rel_dir:
+                if not any(e.name in _INIT_FILES for e in sub_entries):
+                    # src layout: the packages are one level down
+                    _add_project_modules(
+                        modules,
+                        sub_entries,
+                        "src/",
+                        path_filter,
+                        matcher,
+                        kept,
+                    )
+                    continue
+            # A directory of Python files is importable, as a namespace
+            # package if it has no __init__.py
+            if _has_modules(
+                sub_entries, f"{rel_dir}{name}/", path_filter, matcher, kept
+            ):
+                modules.add(name)
+        elif name.endswith(_MODULE_SUFFIXES) and path_filter.accepts_file(
+            rel_dir + name, matcher
+        ):
+            modules.add(name)
+
+
+def _add_root_modules(
+    modules: ProjectModules,
+    directory: str,
+    entries: List["os.DirEntry[str]"],
+    path_filter: PathFilter,
+    matcher: IgnoreMatcher,
+    listed: Dict[str, List["os.DirEntry[str]"]],
+) -> None:
+    if any(entry.name in _INIT_FILES for entry in entries):
+        # The project root is a package itself, imported by its name
+        modules.add(os.path.basename(os.path.realpath(directory)))
+    _add_project_modules(modules, entries, "", path_filter, matcher, listed)
+
+
+def scan_project_modules(
+    directory: str = ".", path_filter: Optional[PathFilter] = None
+) -> ProjectModules:
+    """
+    List the top-level modules and packages a project defines
+
+    Only the project root (and src/) are listed; iter_python_files
+    collects the same names during a full walk. directory may also be
+    an archive (see midna.archives).
+    """
+    if path_filter is None:
+        path_filter = PathFilter()
+    from .archives import archive_project_modules, is_archive
+
+    if is_archive(directory):
+        return archive_project_modules(directory, path_filter)
+    modules = ProjectModules()
+    _add_root_modules(
+        modules,
+        directory,
+        _list_dir(directory),
+        path_filter,
+        path_filter.root_matcher(directory),
+        {},
+    )
+    return modules
+
+
+def iter_python_files(
+    directory: str = ".",
+    path_filter: Optional[PathFilter] = None,
+    project_modules: Optional[ProjectModules] = None,
+) -> Iterator[str]:
+    """
+    Yield Python files in directory and subdirectories as they are found
+
+    Python files are modules (.py) and Jupyter notebooks (.ipynb).
+
+    Directories in SKIP_DIRS, matched by .gitignore/.midnaignore rules or
+    by exclude globs (see midna.ignore.PathFilter) are pruned before they
+    are listed. Entry types come from the directory listing itself, so
+    files are not stat'ed. Symlinked directories are not followed.
+    If project_modules is given, the project's top-level modules and
+    packages are added to it before the first file is yielded.
+    """
+    if path_filter is None:
+        path_filter = PathFilter()
+
+    stack = [(directory, "", path_filter.root_matcher(directory))]
+    # Listings made ahead of the walk, for project_modules
+    listed: Dict[str, List["os.DirEntry[str]"]] = {}
+    while stack:
+        current, rel_dir, matcher = stack.pop()
+        entries = listed.pop(current, None)
+        if entries is None:
+            entries = _list_dir(current)
+
+        if not rel_dir and project_modules is not None:
+            _add_root_modules(
+                project_modules,
+                directory,
+                entries,
+                path_filter,
+                matcher,
+                listed,
+            )
+
+        if rel_dir and path_filter.use_ignore_files:
+            for entry in entries:
+                if entry.name == ".gitignore":
+                    matcher = matcher.extended(entry.path, rel_dir)
+                    break
+
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            if entry.is_dir():
+                if (
+                    name in SKIP_DIRS
+                    or entry.is_symlink()
+                    or path_filter.skips_dir(rel_dir + name, matcher)
+                ):
+                    continue
+                subdirs.append((entry.path, f"{rel_dir}{name}/", matcher))
+            elif name.endswith(SOURCE_SUFFIXES) and path_filter.accepts_file(
+                rel_dir + name, matcher
+            ):
+                yield entry.path
+
+        # Visit subdirectories in listing order, like os.walk
+        stack.extend(reversed(subdirs))
+
+
+def python_path_test(
+    path_filter: PathFilter, matcher: IgnoreMatcher
+) -> Callable[[str], bool]:
+    """
+    Return a test for the relative paths ("pkg/mod.py") a walk yields
+
+    For checking paths that come from elsewhere than a directory walk
+    (git, archives): only matcher's rules apply, not nested ignore files.
+    """
+    # Directory -> whether the walk would enter it
+    visited: Dict[str, bool] = {"": True}
+
+    def enters(rel_dir: str) -> bool:
+        result = visited.get(rel_dir)
+        if result is None:
+            parent, _, name = rel_dir.rpartition("/")
+            result = visited[rel_dir] = (
+                enters(parent)
+                and name not in SKIP_DIRS
+                and not path_filter.skips_dir(rel_dir, matcher)
+            )
+        return result
+
+    def accepts(path: str) -> bool:
+        return (
+            path.endswith(SOURCE_SUFFIXES)
+            and enters(path.rpartition("/")[0])
+            and path_filter.accepts_file(path, matcher)
+        )
+
+    return accepts
+
+
+def find_python_files(
+    directory: str = ".",
+    path_filter: Optional[PathFilter] = None,
+    project_modules: Optional[ProjectModules] = None,
+) -> List[str]:
+    """Find all Python files in directory and subdirectories"""
+    return list(iter_python_files(directory, path_filter, project_modules))
+
+
+def resolve_jobs(jobs: int) -> int:
+    """Resolve a --jobs value, where 0 or less means one job per CPU"""
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def _extract_imports_chunk(
+    file_paths: List[str],
+    engine: str = "ast",
+    profile: bool = False,
+    sign: Optional[bool] = None,
+) -> ChunkResult:
+    """
+    Extract imports from a chunk of files (runs in a worker process)
+
+    Unless sign is None, each file's cache signature (hashed if sign is
+    True) is taken before the file is read. With profile, the worker's
+    own timers and counters are returned so the parent process can add
+    them to its totals.
+    """
+    if profile:
+        profiling.reset()
+        profiling.enable()
+    results = []
+    signatures: List[Optional[Signature]] = []
+    for file_path in file_paths:
+        signatures.append(
+            None if sign is None else file_signature(file_path, sign)
+        )
+        results.append(extract_import_lines_from_file(file_path, engine))
+    return results, signatures, profiling.snapshot() if profile else {}
+
+
+def iter_file_imports(
+    directory: str = ".",
+    jobs: int = 1,
+    use_cache: bool = False,
+    cache_hash: bool = False,
+    engine: str = "ast",
+    path_filter: Optional[PathFilter] = None,
+) -> Iterator[Tuple[str, Set[str]]]:
+    """
+    Yield (file_path, imports) for every Python file in the project
+
+    See iter_file_import_lines, which this wraps, for the options.
+    """
+    for file_path, imports in iter_file_import_lines(
+        directory, jobs, use_cache, cache_hash, engine, path_filter
+    ):
+        yield file_path, set(imports)
+
+
+def iter_file_import_lines(
+    directory: str = ".",
+    jobs: int = 1,
+    use_cache: bool = False,
+    cache_hash: bool = False,
+    engine: str = "ast",
+    path_filter: Optional[PathFilter] = None,
+    project_modules: Optional[ProjectModules] = None,
+) -> Iterator[Tuple[str, Dict[str, int]]]:
+    """
+    Yield (file_path, {import: first line}) for every Python file
+
+    The walk, cache lookups and parsing are interleaved, so results
+    arrive while the tree is still being walked and memory stays bounded
+    by the chunks in flight. With jobs > 1 files are parsed in chunks by
+    a pool of worker processes (cache hits are yielded right away). With
+    use_cache, per-file results are kept in .midna/cache under the
+    project root and only new or changed files are parsed again
+    (cache_hash also matches files whose mtime changed but whose content
+    did not). engine selects the import extractor used for each file
+    and path_filter which files are scanned; project_modules collects
+    the project's own modules during the walk (see iter_python_files).
+    directory may also be a wheel, zip or tarball, whose Python members
+    are scanned without unpacking it (see midna.archives).
+    """
+    from collections import deque
+
+    from .archives import is_archive, iter_archive_import_lines
+
+    if is_archive(directory):
+        # Members are parsed in this process, without the cache
+        yield from iter_archive_import_lines(
+            directory, engine, path_filter, project_modules
+        )
+        return
 
-def analyze_project_imports(directory: str = ".") -> Set[str]:
-    """Analyze all Python files in project to find imported packages"""
     logger = logging.getLogger("midna")
     logger.info(f"Analyzing Python files in: {directory}")
 
-    all_imports = set()
-    python_files = find_python_files(directory)
+    jobs = resolve_jobs(jobs)
+    cache: Optional[ImportCache] = None
+    if use_cache or cache_hash:
+        cache = ImportCache(directory, use_hash=cache_hash, engine=engine)
+        cache.load()
+
+    def finish(
+        file_paths: List[str], chunk_result: ChunkResult
+    ) -> Iterator[Tuple[str, Dict[str, int]]]:
+        results, signatures, worker_stats = chunk_result
+        if worker_stats:
+            profiling.merge(worker_stats)
+        for file_path, imports, signature in zip(
+            file_paths, results, signatures
+        ):
+            if cache is not None:
+                cache.store(file_path, imports, signature)
+            if imports:
+                logger.debug(f"Imports from {file_path}: {sorted(imports)}")
+            yield file_path, imports
+
+    sign = None if cache is None else cache.use_hash
+    worker = partial(_extract_imports_chunk, engine=engine, sign=sign)
+    pool_worker = partial(
+        _extract_imports_chunk,
+        engine=engine,
+        profile=profiling.is_enabled(),
+        sign=sign,
+    )
+    seen_files: List[str] = []
+    chunk: List[str] = []
+    in_flight: Deque[Tuple[List[str], "Future[ChunkResult]"]] = deque()
+    executor: Optional["ProcessPoolExecutor"] = None
+    file_count = 0
 
-    logger.info(f"Found {len(python_files)} Python files to analyze")
+    try:
+        files = iter_python_files(directory, path_filter, project_modules)
+        for file_path in profiling.timed_iter("walk", files):
+            file_count += 1
+            if cache is not None:
+                seen_files.append(file_path)
+                with profiling.timer("cache lookup"):
+                    cached_imports = cache.lookup_lines(file_path)
+                if cached_imports is not None:
+                    yield file_path, cached_imports
+                    continue
+
+            if jobs == 1:
+                yield from finish([file_path], worker([file_path]))
+                continue
+
+            chunk.append(file_path)
+            if len(chunk) < CHUNK_SIZE:
+                continue
+
+            if executor is None:
+                from concurrent import futures
+
+                logger.info(f"Scanning with {jobs} worker processes")
+                executor = futures.ProcessPoolExecutor(max_workers=jobs)
+            in_flight.append((chunk, executor.submit(pool_worker, chunk)))
+            chunk = []
+
+            # Keep a couple of chunks per worker queued, no more
+            if len(in_flight) > jobs * 2:
+                done_paths, future = in_flight.popleft()
+                yield from finish(done_paths, future.result())
+
+        if chunk:
+            if executor is None:
+                # Too few files to be worth starting a pool
+                yield from finish(chunk, worker(chunk))
+            else:
+                in_flight.append((chunk, executor.submit(pool_worker, chunk)))
+        while in_flight:
+            done_paths, future = in_flight.popleft()
+            yield from finish(done_paths, future.result())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    logger.info(f"Analyzed {file_count} Python files")
+    profiling.count("files scanned", file_count)
+    if cache is not None:
+        logger.info(f"Import cache: {cache.hits} hits, {cache.misses} misses")
+        profiling.count("cache hits", cache.hits)
+        profiling.count("cache misses", cache.misses)
+        pruned = cache.prune(seen_files)
+        if pruned:
+            logger.info(f"Dropped {pruned} deleted files from import cache")
+        with profiling.timer("cache save"):
+            cache.save()
+
+
+def analyze_project_imports(
+    directory: str = ".",
+    jobs: int = 1,
+    use_cache: bool = False,
+    cache_hash: bool = False,
+    engine: str = "ast",
+    path_filter: Optional[PathFilter] = None,
+) -> Set[str]:
+    """
+    Analyze all Python files in project to find imported packages
 
-    for file_path in python_files:
-        imports = extract_imports_from_file(file_path)
+    See iter_file_imports for the jobs, cache, engine and path_filter
+    options; only path_filter changes the result.
+    """
+    logger = logging.getLogger("midna")
+
+    all_imports: Set[str] = set()
+    for _, imports in iter_file_imports(
+        directory, jobs, use_cache, cache_hash, engine, path_filter
+    ):
         all_imports.update(imports)
-        if imports:
-            logger.debug(f"Imports from {file_path}: {imports}")
 
     # Filter out standard library modules
     filtered_imports = filter_standard_library(all_imports)
@@ -133,103 +644,97 @@ def analyze_project_imports(directory: str = ".") -> Set[str]:
     return filtered_imports
 
 
-def filter_standard_library(imports: Set[str]) -> Set[str]:
-    """Filter out Python standard library modules"""
+def iter_discovered_packages(
+    directory: str = ".",
+    jobs: int = 1,
+    use_cache: bool = False,
+    cache_hash: bool = False,
+    engine: str = "ast",
+    path_filter: Optional[PathFilter] = None,
+    import_index: Optional["ImportIndex"] = None,
+) -> Iterator[Tuple[str, str]]:
+    """
+    Yield installed third-party (distribution_name, version) pairs
+
+    Each import is classified the first time it is seen and each
+    distribution is yielded once, as soon as the file importing it has
+    been scanned. Options are the same as for iter_file_imports; if
+    import_index is given, every file's imports and their lines are
+    added to it during the same scan (see midna.explain).
+    """
+    logger = logging.getLogger("midna")
+    seen_imports: Set[str] = set()
+    seen_packages: Set[Tuple[str, str]] = set()
+    counts: Dict[str, int] = {STDLIB: 0, PROJECT: 0, THIRD_PARTY: 0}
+    # Complete once the walk has listed the project root
+    project_modules = ProjectModules()
+
+    for file_path, imports in iter_file_import_lines(
+        directory,
+        jobs,
+        use_cache,
+        cache_hash,
+        engine,
+        path_filter,
+        project_modules,
+    ):
+        if import_index is not None:
+            import_index.add(file_path, imports)
+        for name in sorted(imports.keys() - seen_imports):
+            seen_imports.add(name)
+            if name.startswith("_"):
+                continue
+
+            with profiling.timer("classify"):
+                kind, distributions = classify_package(
+                    name, directory, project_modules
+                )
+            if kind in counts:
+                counts[kind] += 1
+            for package in distributions:
+                if package not in seen_packages:
+                    seen_packages.add(package)
+                    yield package
+
+    logger.info(f"Found {counts[STDLIB]} stdlib packages")
+    logger.info(f"Found {counts[PROJECT]} project packages")
+    logger.info(f"Found {counts[THIRD_PARTY]} third-party packages")
 
-    # Common standard library modules (not exhaustive but covers most)
-    stdlib_modules = {
-        "os",
-        "sys",
-        "json",
-        "re",
-        "math",
-        "random",
-        "datetime",
-        "time",
-        "pathlib",
-        "collections",
-        "itertools",
-        "functools",
-        "operator",
-        "typing",
-        "dataclasses",
-        "enum",
-        "abc",
-        "contextlib",
-        "logging",
-        "argparse",
-        "configparser",
-        "subprocess",
-        "shutil",
-        "tempfile",
-        "glob",
-        "fnmatch",
-        "linecache",
-        "pickle",
-        "copy",
-        "pprint",
-        "textwrap",
-        "string",
-        "io",
-        "codecs",
-        "locale",
-        "calendar",
-        "hashlib",
-        "hmac",
-        "secrets",
-        "uuid",
-        "urllib",
-        "http",
-        "email",
-        "html",
-        "xml",
-        "csv",
-        "sqlite3",
-        "zlib",
-        "gzip",
-        "bz2",
-        "lzma",
-        "zipfile",
-        "tarfile",
-        "threading",
-        "multiprocessing",
-        "concurrent",
-        "queue",
-        "socket",
-        "ssl",
-        "asyncio",
-        "unittest",
-        "doctest",
-        "trace",
-        "pdb",
-        "profile",
-        "warnings",
-        "inspect",
-        "dis",
-        "importlib",
-        "pkgutil",
-        "platform",
-        "ctypes",
-        "struct",
-        "array",
-        "weakref",
-        "gc",
-        "types",
-    }
 
+def filter_standard_library(imports: Set[str]) -> Set[str]:
+    """Filter out Python standard library modules"""
     return {
         imp
         for imp in imports
-        if imp not in stdlib_modules and not imp.startswith("_")
+        if not is_stdlib_package(imp) and not imp.startswith("_")
     }
 
 
 def auto_discover_requirements(
     directory: str = ".",
+    jobs: int = 1,
+    use_cache: bool = False,
+    cache_hash: bool = False,
+    engine: str = "ast",
+    on_package: Optional[Callable[[str, str], None]] = None,
+    path_filter: Optional[PathFilter] = None,
+    import_index: Optional["ImportIndex"] = None,
 ) -> Tuple[List[Tuple[str, str]], str]:
     """
     Auto-discover requirements using multiple strategies
 
+    Args:
+        directory: Project root to search
+        jobs: Worker processes for import analysis (0 = one per CPU)
+        use_cache: Reuse per-file imports cached under .midna/cache
+        cache_hash: Also validate cache entries by content hash
+        engine: Import extraction engine ("ast", "fast" or "pyc")
+        on_package: Called with (name, version) for each third-party
+            package as soon as import analysis finds it
+        path_filter: Ignore rules and include/exclude globs for the walk
+        import_index: Filled with every file's imports and their lines
+            if import analysis runs
+
     Returns:
         Tuple of (packages_list, discovery_method) where packages_list contains
         tuples of (package_name, version) for third-party packages
@@ -238,7 +743,8 @@ def auto_discover_requirements(
     logger.info("Starting auto-discovery of requirements...")
 
     # Strategy 1: Look for existing requirements files
-    req_files = find_requirements_files(directory)
+    with profiling.timer("find requirements files"):
+        req_files = find_requirements_files(directory)
 
     if req_files:
         # Prefer requirements.txt if available
@@ -257,25 +763,31 @@ def auto_discover_requirements(
         from .parser import read_requirements
 
         try:
-            packages = [(pkg, "") for pkg in read_requirements(preferred_file)]
+            with profiling.timer("read requirements"):
+                requirements = read_requirements(preferred_file)
+            packages = [(pkg, "") for pkg in requirements]
             return packages, f"requirements file: {preferred_file}"
         except Exception as e:
             logger.warning(f"Failed to read {preferred_file}: {e}")
 
     # Strategy 2: Analyze Python files for imports
     logger.info("No requirements files found, analyzing Python imports...")
-    discovered_imports = analyze_project_imports(directory)
-
-    if discovered_imports:
-        # Classify the discovered packages
-        stdlib, project, third_party = classify_packages(
-            discovered_imports, directory
-        )
-        logger.info(f"Found {len(stdlib)} stdlib packages")
-        logger.info(f"Found {len(project)} project packages")
-        logger.info(f"Found {len(third_party)} third-party packages")
-
-        return third_party, "import analysis"
+    third_party = []
+    for package in iter_discovered_packages(
+        directory,
+        jobs,
+        use_cache,
+        cache_hash,
+        engine,
+        path_filter,
+        import_index,
+    ):
+        third_party.append(package)
+        if on_package is not None:
+            on_package(*package)
+
+    if third_party:
+        return sorted(third_party), "import analysis"
 
     # Strategy 3: No packages found
     logger.info("No packages discovered")
@@ -0,0 +1,186 @@
+"""Check requirements against other Python environments (--env)"""
+
+import glob
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .checker import check_installed_packages
+from .installed import InstalledIndex
+
+# Environments read at the same time (reading metadata is I/O bound)
+ENV_WORKERS = 16
+
+# (environment, missing packages, error message or "")
+EnvResult = Tuple[str, List[str], str]
+
+
+def read_envs_file(path: str) -> List[str]:
+    """
+    Read environment paths from a file, one per line
+
+    Blank lines and # comments are skipped, relative paths are relative
+    to the file and glob patterns (services/*/.venv) are expanded.
+    """
+    logger = logging.getLogger("midna")
+    base = os.path.dirname(os.path.abspath(path))
+    envs: List[str] = []
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            env = os.path.join(base, os.path.expanduser(line))
+            if glob.has_magic(env):
+                matches = sorted(glob.glob(env))
+                if not matches:
+                    logger.warning(f"No environments match {line}")
+                envs.extend(matches)
+            else:
+                envs.append(env)
+    return envs
+
+
+def _read_pyvenv_cfg(prefix: str) -> Dict[str, str]:
+    """Return the key = value pairs of a virtualenv's pyvenv.cfg"""
+    config: Dict[str, str] = {}
+    try:
+        with open(
+            os.path.join(prefix, "pyvenv.cfg"), "r", encoding="utf-8"
+        ) as f:
+            for line in f:
+                key, sep, value = line.partition("=")
+                if sep:
+                    config[key.strip().lower()] = value.strip()
+    except OSError:
+        pass
+    return config
+
+
+def _prefix_site_packages(prefix: str, version: str = "*") -> List[str]:
+    """Site-packages directories below an installation prefix"""
+    pattern = os.path.join(prefix, "lib", f"python{version}", "*-packages")
+    found = sorted(glob.glob(pattern))
+    windows = os.path.join(prefix, "Lib", "site-packages")
+    if os.path.isdir(windows):
+        found.append(windows)
+    return found
+
+
+def find_site_packages(env: str) -> List[str]:
+    """
+    Find an environment's site-packages without running its interpreter
+
+    env is a virtualenv, conda environment or installation prefix, the
+    path to its python executable, or a site-packages directory. For a
+    virtualenv created with --system-site-packages the base
+    installation's site-packages come last, as on its sys.path.
+    Raises FileNotFoundError if there is none.
+    """
+    prefix = os.path.abspath(os.path.expanduser(env))
+    if os.path.isfile(prefix):
+        # .../bin/python or ...\\Scripts\\python.exe
+        prefix = os.path.dirname(os.path.dirname(prefix))
+    if os.path.basename(prefix) in ("site-packages", "dist-packages"):
+        if os.path.isdir(prefix):
+            return [prefix]
+        raise FileNotFoundError(f"No such directory: {env}")
+
+    found = _prefix_site_packages(prefix)
+    if not found:
+        raise FileNotFoundError(f"No site-packages found in {env}")
+
+    config = _read_pyvenv_cfg(prefix)
+    home = config.get("home")
+    if home and config.get("include-system-site-packages") == "true":
+        version = config.get("version_info", config.get("version", ""))
+        major_minor = ".".join(version.split(".")[:2]) or "*"
+        # home is the base interpreter's bin directory
+        found += _prefix_site_packages(os.path.dirname(home), major_minor)
+
+    unique: List[str] = []
+    seen = set()
+    for path in found:
+        real = os.path.realpath(path)
+        if real not in seen:  # lib64 is often a link to lib
+            seen.add(real)
+            unique.append(path)
+    return unique
+
+
+def environment_index(env: str) -> InstalledIndex:
+    """Index the distributions installed in another environment"""
+    return InstalledIndex.build(find_site_packages(env))
+
+
+def check_environments(
+    packages: List[str], envs: Sequence[str], workers: int = ENV_WORKERS
+) -> List[EnvResult]:
+    """
+    Check which packages each environment is missing, in parallel
+
+    Only metadata directory names are read, so no interpreter or pip is
+    started. Results are in the order of envs; an environment that
+    cannot be read is reported with an error instead.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    logger = logging.getLogger("midna")
+
+    def check(env: str) -> EnvResult:
+        try:
+            index = environment_index(env)
+        except OSError as e:
+            logger.info(f"Cannot read environment {env}: {e}")
+            return env, [], str(e)
+        missing, _ = check_installed_packages(packages, index)
+        return env, missing, ""
+
+    if not envs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(envs))) as executor:
+        return list(executor.map(check, envs))
+
+
+def format_matrix(
+    packages: List[str],
+    results: List[EnvResult],
+    labels: Optional[List[str]] = None,
+) -> str:
+    """
+    Format check_environments() results as a package x environment grid
+
+    Environments are numbered columns (+ installed, - missing, ? not
+    readable) explained by a legend with each environment's status.
+    """
+    if labels is None:
+        labels = [env for env, _, _ in results]
+    width = len(str(len(results))) + 1
+    name_width = max([len("Package")] + [len(p) for p in packages])
+
+    header = "".join(f"{i:>{width}}" for i in range(1, len(results) + 1))
+    lines = [f"{'Package':<{name_width}} {header}"]
+    missing_sets = [set(missing) for _, missing, _ in results]
+    for package in packages:
+        cells = []
+        for (_, _, error), missing in zip(results, missing_sets):
+            if error:
+                cells.append("?")
+            else:
+                cells.append("-" if package in missing else "+")
+        row = "".join(f"{cell:>{width}}" for cell in cells)
+        lines.append(f"{package:<{name_width}} {row}")
+
+    lines.append("")
+    for number, ((_, missing_names, error), label) in enumerate(
+        zip(results, labels), 1
+    ):
+        if error:
+            status = f"error: {error}"
+        elif missing_names:
+            status = f"missing {len(missing_names)}"
+        else:
+            status = "complete"
+        lines.append(f"{number:>{width}}  {label} ({status})")
+    return "\n".join(lines)
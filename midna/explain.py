@@ -0,0 +1,160 @@
+"""Explain why packages are required (midna why, --explain)"""
+
+from argparse import ArgumentParser
+from typing import Dict, List, Optional, Tuple
+
+from .discovery import iter_file_import_lines
+from .ignore import PathFilter
+from .import_index import ImportIndex
+from .installed import get_installed_index
+from .package_classifier import THIRD_PARTY, classify_package
+
+# (package, modules, locations): package is "name==version" for an
+# installed distribution or the bare import name for a missing one, and
+# locations are the (file_path, line) pairs importing any of modules
+Explanation = Tuple[str, List[str], List[Tuple[str, int]]]
+
+
+def scan_imports(
+    directory: str = ".",
+    jobs: int = 1,
+    use_cache: bool = False,
+    cache_hash: bool = False,
+    engine: str = "ast",
+    path_filter: Optional[PathFilter] = None,
+) -> ImportIndex:
+    """Index the project's imports with their lines in a single scan"""
+    index = ImportIndex()
+    for file_path, imports in iter_file_import_lines(
+        directory, jobs, use_cache, cache_hash, engine, path_filter
+    ):
+        index.add(file_path, imports)
+    return index
+
+
+def file_count(locations: List[Tuple[str, int]]) -> int:
+    """Count the distinct files among (file_path, line) pairs"""
+    return len({file_path for file_path, _ in locations})
+
+
+def explain_imports(
+    index: ImportIndex, project_root: str = "."
+) -> List[Explanation]:
+    """
+    Group the third-party imports in index by the package providing them
+
+    Packages imported by the most files come first.
+    """
+    groups: Dict[str, Tuple[List[str], List[Tuple[str, int]]]] = {}
+    for module in sorted(index.modules()):
+        if module.startswith("_"):
+            continue
+        kind, distributions = classify_package(module, project_root)
+        if kind != THIRD_PARTY:
+            continue
+
+        labels = [f"{name}=={version}" for name, version in distributions]
+        for label in labels or [module]:
+            modules, locations = groups.setdefault(label, ([], []))
+            modules.append(module)
+            locations.extend(index.locations(module))
+
+    rows = [
+        (label, modules, sorted(locations))
+        for label, (modules, locations) in groups.items()
+    ]
+    rows.sort(key=lambda row: (-file_count(row[2]), row[0].lower()))
+    return rows
+
+
+def format_explanation(rows: List[Explanation], limit: int = 3) -> str:
+    """Format explain_imports() rows, listing up to limit imports each"""
+    lines = []
+    for package, modules, locations in rows:
+        count = file_count(locations)
+        note = "" if "==" in package else ", not installed"
+        lines.append(
+            f"  {package:<32} {count:>5} file{'s' if count != 1 else ''}"
+            f"  ({', '.join(modules)}{note})"
+        )
+        for file_path, line in locations[:limit]:
+            lines.append(f"      {file_path}:{line}")
+        if len(locations) > limit:
+            lines.append(f"      ... and {len(locations) - limit} more")
+    return "\n".join(lines)
+
+
+def why(
+    index: ImportIndex, name: str
+) -> List[Tuple[str, List[Tuple[str, int]]]]:
+    """
+    Return (module, locations) for each imported module behind name
+
+    name may be a distribution (PyYAML) or an import name (yaml).
+    """
+    modules = get_installed_index().modules_of(name)
+    if name not in modules:
+        modules.append(name)
+    found = []
+    for module in modules:
+        locations = index.locations(module)
+        if locations:
+            found.append((module, sorted(locations)))
+    return found
+
+
+def main(argv: List[str]) -> int:
+    """Entry point for `midna why`"""
+    from .logger import setup_logging
+
+    parser = ArgumentParser(
+        prog="midna why",
+        description="Show which files and lines import a package.",
+    )
+    parser.add_argument(
+        "packages",
+        nargs="+",
+        help="Distribution or import name",
+        metavar="PACKAGE",
+    )
+    parser.add_argument("--jobs", "-j", type=int, default=1)
+    parser.add_argument("--cache", action="store_true")
+    parser.add_argument("--cache-hash", action="store_true")
+    parser.add_argument(
+        "--engine", choices=["ast", "fast", "pyc"], default="ast"
+    )
+    parser.add_argument("--include", action="append", default=[])
+    parser.add_argument("--exclude", action="append", default=[])
+    parser.add_argument("--no-ignore", action="store_true")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+
+    setup_logging(args.verbose)
+    index = scan_imports(
+        ".",
+        jobs=args.jobs,
+        use_cache=args.cache,
+        cache_hash=args.cache_hash,
+        engine=args.engine,
+        path_filter=PathFilter(
+            include=args.include,
+            exclude=args.exclude,
+            use_ignore_files=not args.no_ignore,
+        ),
+    )
+
+    exit_code = 0
+    for name in args.packages:
+        found = why(index, name)
+        if not found:
+            print(f"{name} is not imported by any scanned file")
+            exit_code = 1
+            continue
+
+        files = file_count([loc for _, locs in found for loc in locs])
+        plural = "s" if files != 1 else ""
+        print(f"{name} is imported by {files} file{plural}:")
+        for module, locations in found:
+            for file_path, line in locations:
+                print(f"  {file_path}:{line}  (import {module})")
+    return exit_code
@@ -0,0 +1,174 @@
+"""Import extraction engines for Midna"""
+
+import ast
+import re
+from typing import Dict, Set
+
+# Available engines: "ast" parses the whole module, "fast" only looks at
+# import statements and falls back to "ast" when a file is ambiguous,
+# "pyc" reads fresh __pycache__ bytecode of files (see midna.bytecode)
+# and parses sources like "ast"
+ENGINES = ("ast", "fast", "pyc")
+
+# One pass over the source that skips strings and comments so that only
+# real `import` keywords are reported. Every branch starts with a literal
+# character, which lets the regex engine jump between candidates quickly.
+_SCAN_RE = re.compile(
+    r'"""[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""'
+    r"|'''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''"
+    r'|"[^"\\\n]*(?:\\.[^"\\\n]*)*"'
+    r"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'"
+    r"|#[^\n]*"
+    r"|import\b",
+    re.DOTALL,
+)
+
+_DOTTED_NAME = r"[^\W\d]\w*(?:\s*\.\s*[^\W\d]\w*)*"
+
+# `import a.b as c` (one comma-separated item)
+_IMPORT_ITEM_RE = re.compile(rf"({_DOTTED_NAME})(?:\s+as\s+[^\W\d]\w*)?")
+
+# Everything on the line before the `import` keyword of `from x import y`
+_FROM_PREFIX_RE = re.compile(rf"[ \t\f]*from\b\s*\.*\s*({_DOTTED_NAME})?\s*")
+
+
+class AmbiguousSource(Exception):
+    """Raised when the fast scanner cannot safely handle a source"""
+
+
+def decode_source(data: bytes) -> str:
+    """Decode Python source bytes the way open(..., encoding="utf-8") does"""
+    source = data.decode("utf-8")
+    if "\r" in source:
+        source = source.replace("\r\n", "\n").replace("\r", "\n")
+    return source
+
+
+def _top_level(module: str) -> str:
+    """Return the top-level package of a (possibly spaced) dotted name"""
+    return module.split(".")[0].strip()
+
+
+def _add_line(lines: Dict[str, int], name: str, line: int) -> None:
+    """Record the first line that imports name"""
+    if name not in lines or line < lines[name]:
+        lines[name] = line
+
+
+def import_lines_from_tree(tree: ast.AST) -> Dict[str, int]:
+    """Map top-level imported package names to their first import line"""
+    lines: Dict[str, int] = {}
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                # Get the top-level package name
+                _add_line(lines, alias.name.split(".")[0], node.lineno)
+
+        elif isinstance(node, ast.ImportFrom):
+            if node.module:
+                # Get the top-level package name
+                _add_line(lines, node.module.split(".")[0], node.lineno)
+
+    return lines
+
+
+def imports_from_tree(tree: ast.AST) -> Set[str]:
+    """Collect top-level imported package names from a parsed module"""
+    return set(import_lines_from_tree(tree))
+
+
+def _statement_tail(source: str, start: int) -> str:
+    """Return the rest of the logical line from start, minus any comment"""
+    end = source.find("\n", start)
+    # Follow backslash continuations
+    while end != -1 and source[end - 1] == "\\":
+        end = source.find("\n", end + 1)
+    tail = source[start:] if end == -1 else source[start:end]
+    return tail.split("#", 1)[0].split(";", 1)[0].replace("\\\n", " ")
+
+
+def scan_import_lines(source: str) -> Dict[str, int]:
+    """
+    Find imports and the first line of each by scanning for `import`
+    keywords instead of parsing
+
+    Raises AmbiguousSource for constructs the scanner does not handle
+    (e.g. `if x: import y`, `a; import b` or continuation lines). Unlike
+    the AST engine it does not validate the rest of the file, so a file
+    with a syntax error elsewhere still reports its imports.
+    """
+    if source.startswith("\ufeff"):
+        raise AmbiguousSource("byte order mark")
+
+    imports: Dict[str, int] = {}
+    line = 1
+    counted = 0
+
+    for match in _SCAN_RE.finditer(source):
+        if match.group()[0] != "i":
+            continue  # string or comment
+
+        start = match.start()
+        if start and (source[start - 1].isalnum() or source[start - 1] == "_"):
+            continue  # part of a longer identifier
+
+        line_start = source.rfind("\n", 0, start) + 1
+        if line_start >= 2 and source[line_start - 2] == "\\":
+            raise AmbiguousSource("continuation line")
+        line += source.count("\n", counted, line_start)
+        counted = line_start
+
+        prefix = source[line_start:start]
+        if not prefix.strip(" \t\f"):
+            # import a.b as c, d
+            tail = _statement_tail(source, match.end())
+            for item in tail.split(","):
+                item_match = _IMPORT_ITEM_RE.fullmatch(item.strip())
+                if not item_match:
+                    raise AmbiguousSource(f"import statement: {tail!r}")
+                _add_line(imports, _top_level(item_match.group(1)), line)
+            continue
+
+        # from .a.b import c
+        from_match = _FROM_PREFIX_RE.fullmatch(prefix)
+        if not from_match:
+            raise AmbiguousSource(f"import after: {prefix!r}")
+        if from_match.group(1):
+            _add_line(imports, _top_level(from_match.group(1)), line)
+
+    return imports
+
+
+def scan_imports(source: str) -> Set[str]:
+    """Find imports by scanning instead of parsing (see scan_import_lines)"""
+    return set(scan_import_lines(source))
+
+
+def extract_import_lines(source: str, engine: str = "ast") -> Dict[str, int]:
+    """
+    Map top-level imported package names to the first line importing them
+
+    Raises SyntaxError if the AST engine (or the fast engine's fallback)
+    cannot parse the source, and ValueError for an unknown engine.
+    """
+    if engine == "fast":
+        if "import" not in source:
+            return {}
+        try:
+            return scan_import_lines(source)
+        except AmbiguousSource:
+            pass
+    elif engine not in ("ast", "pyc"):
+        raise ValueError(f"Unknown extraction engine: {engine}")
+
+    return import_lines_from_tree(ast.parse(source))
+
+
+def extract_imports(source: str, engine: str = "ast") -> Set[str]:
+    """
+    Extract top-level imported package names from Python source
+
+    Raises like extract_import_lines.
+    """
+    return set(extract_import_lines(source, engine))
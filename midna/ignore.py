@@ -0,0 +1,229 @@
+"""gitignore-style path matching for Midna's file walker"""
+
+import logging
+import os
+import re
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+# Ignore files read from the project root; .gitignore is also read from
+# every subdirectory the walker enters
+ROOT_IGNORE_FILES = (
+    os.path.join(".git", "info", "exclude"),
+    ".gitignore",
+    ".midnaignore",
+)
+
+
+class PatternError(ValueError):
+    """An include or exclude glob that cannot be compiled"""
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate a gitignore glob (*, ?, [...], **) to a regex fragment"""
+    parts: List[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        if char == "*":
+            if pattern.startswith("**", i):
+                at_start = i == 0 or pattern[i - 1] == "/"
+                at_end = i + 2 == n or pattern[i + 2] == "/"
+                if at_start and at_end:
+                    if i + 2 == n:
+                        parts.append(".*")  # trailing /** matches everything
+                        i += 2
+                    else:
+                        parts.append("(?:.*/)?")  # **/ matches any dirs
+                        i += 3
+                    continue
+            parts.append("[^/]*")
+            i += 1
+            while i < n and pattern[i] == "*":
+                i += 1
+            continue
+        if char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1 : end]
+                if body[0] in "!^":
+                    body = "^" + body[1:]
+                parts.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+                i = end
+        elif char == "\\" and i + 1 < n:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
+
+
+def compile_pattern(pattern: str) -> Tuple[Pattern[str], bool]:
+    """
+    Compile one gitignore pattern into (regex, directory_only)
+
+    The regex matches a slash-separated path relative to the directory
+    holding the ignore file. Patterns without an inner slash match at
+    any depth, like in git.
+    """
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if "/" in pattern:
+        regex = glob_to_regex(pattern.lstrip("/"))
+    else:
+        regex = "(?:.*/)?" + glob_to_regex(pattern)
+    return re.compile(regex + r"\Z"), directory_only
+
+
+class IgnoreMatcher:
+    """
+    Ordered gitignore rules, compiled once
+
+    Each rule is (base, regex, negated, directory_only) where base is the
+    relative directory (with trailing slash, or "") that holds the
+    ignore file. As in git, the last matching rule decides.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[List[Tuple[str, Pattern[str], bool, bool]]] = None,
+    ) -> None:
+        self.rules = rules or []
+
+    @staticmethod
+    def parse_lines(
+        lines: Iterable[str], base: str = ""
+    ) -> List[Tuple[str, Pattern[str], bool, bool]]:
+        """Compile the rules in an ignore file's lines"""
+        rules = []
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.endswith("\\ "):
+                line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]  # \# and \! escape a leading character
+            if not line:
+                continue
+            try:
+                regex, directory_only = compile_pattern(line)
+            except re.error as e:
+                # Like git, a broken pattern is skipped, not fatal
+                logging.getLogger("midna").warning(
+                    f"Skipping invalid ignore pattern {line!r}: {e}"
+                )
+                continue
+            rules.append((base, regex, negated, directory_only))
+        return rules
+
+    def extended(self, path: str, base: str = "") -> "IgnoreMatcher":
+        """Return a matcher with the rules from the ignore file at path"""
+        logger = logging.getLogger("midna")
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                rules = self.parse_lines(f, base)
+        except OSError as e:
+            logger.debug(f"Cannot read ignore file {path}: {e}")
+            return self
+        if not rules:
+            return self
+        logger.debug(f"Loaded {len(rules)} ignore rules from {path}")
+        return IgnoreMatcher(self.rules + rules)
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        """Check a slash-separated path relative to the walk root"""
+        for base, regex, negated, directory_only in reversed(self.rules):
+            if directory_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base):
+                    continue
+                candidate = rel_path[len(base) :]
+            else:
+                candidate = rel_path
+            if regex.match(candidate):
+                return not negated
+        return False
+
+
+def compile_globs(
+    patterns: Iterable[str], contents: bool = False
+) -> Optional[Pattern[str]]:
+    """
+    Compile user include/exclude globs into a single regex (or None)
+
+    With contents, a glob that matches a directory also matches every
+    path below it, so "src" and "src/" match "src/pkg/mod.py". Raises
+    PatternError for a glob that is not valid.
+    """
+    regexes = []
+    for pattern in patterns:
+        if not pattern:
+            continue
+        try:
+            regex, directory_only = compile_pattern(pattern)
+        except re.error as e:
+            raise PatternError(f"Invalid glob {pattern!r}: {e}") from e
+        source = regex.pattern
+        if contents:
+            below = "/.*" if directory_only else "(?:/.*)?"
+            source = source[: -len(r"\Z")] + below + r"\Z"
+        regexes.append(source)
+    if not regexes:
+        return None
+    return re.compile("|".join(f"(?:{r})" for r in regexes))
+
+
+class PathFilter:
+    """
+    Decides which paths the walker visits
+
+    Combines the project's ignore files (unless use_ignore_files is
+    False) with user --include/--exclude globs. Exclude globs prune
+    directories and files; include globs, if any, restrict which files
+    are scanned to those that match or are below a matching directory.
+    All globs use gitignore syntax and are matched against paths
+    relative to the project root.
+    """
+
+    def __init__(
+        self,
+        include: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+        use_ignore_files: bool = True,
+    ) -> None:
+        self.include = compile_globs(include, contents=True)
+        self.exclude = compile_globs(exclude)
+        self.use_ignore_files = use_ignore_files
+
+    def root_matcher(self, directory: str) -> IgnoreMatcher:
+        """Load the ignore files at the project root"""
+        matcher = IgnoreMatcher()
+        if self.use_ignore_files:
+            for name in ROOT_IGNORE_FILES:
+                path = os.path.join(directory, name)
+                if os.path.isfile(path):
+                    matcher = matcher.extended(path)
+        return matcher
+
+    def skips_dir(self, rel_path: str, matcher: IgnoreMatcher) -> bool:
+        """Check whether the walker should prune a directory"""
+        if self.exclude is not None and self.exclude.match(rel_path):
+            return True
+        return matcher.is_ignored(rel_path, True)
+
+    def accepts_file(self, rel_path: str, matcher: IgnoreMatcher) -> bool:
+        """Check whether the walker should yield a file"""
+        if self.exclude is not None and self.exclude.match(rel_path):
+            return False
+        if self.include is not None and not self.include.match(rel_path):
+            return False
+        return not matcher.is_ignored(rel_path, False)
@@ -0,0 +1,479 @@
+"""Compact per-file import index for Midna
+
+Keeps which file imports which module for very large projects without
+a set of strings per file: module names are interned to integer IDs,
+each file's imports are an (offset, length) span of one array('I')
+(with the line of each import in a parallel array), and a reverse index
+from module to files is built on demand. Saved indexes are loaded
+through mmap without copying the arrays.
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+MAGIC = b"MIDX"
+
+# Bump when the file layout changes
+INDEX_VERSION = 2
+
+# Unsigned 32-bit integers ("I" is 4 bytes on every supported platform)
+TYPECODE = "I" if array("I").itemsize == 4 else "L"
+
+# magic, version, byte order, names, files, data length, name bytes,
+# path bytes
+_HEADER = struct.Struct("<4sIIIIIII")
+_BYTE_ORDER = 1 if sys.byteorder == "little" else 2
+
+# Rewrite the spans once this share of the data array is unused
+_COMPACT_RATIO = 0.5
+
+
+def _cast_ints(section: memoryview) -> memoryview:
+    """View native bytes as TYPECODE integers, without copying"""
+    if TYPECODE == "I":
+        return section.cast("I")
+    return section.cast("L")
+
+
+def _pack_strings(strings: Sequence[str]) -> Tuple[array, bytes]:
+    """Encode strings as one UTF-8 blob plus len + 1 offsets"""
+    encoded = [s.encode("utf-8", "surrogateescape") for s in strings]
+    offsets = array(TYPECODE, [0])
+    total = 0
+    for item in encoded:
+        total += len(item)
+        offsets.append(total)
+    return offsets, b"".join(encoded)
+
+
+def _build_reverse(
+    names: int,
+    file_ids: Iterable[int],
+    offsets: Sequence[int],
+    lengths: Sequence[int],
+    data: Sequence[int],
+    lines: Sequence[int],
+) -> Tuple[array, array, array]:
+    """
+    Module ID -> file IDs, as CSR (starts, files) arrays
+
+    The third array holds the import line for each entry of files.
+    """
+    file_ids = list(file_ids)
+    starts = array(TYPECODE, bytes(4 * (names + 1)))
+    for file_id in file_ids:
+        start = offsets[file_id]
+        for module_id in data[start : start + lengths[file_id]]:
+            starts[module_id + 1] += 1
+    for module_id in range(names):
+        starts[module_id + 1] += starts[module_id]
+
+    files = array(TYPECODE, bytes(4 * starts[-1]))
+    file_lines = array(TYPECODE, bytes(4 * starts[-1]))
+    fill = array(TYPECODE, starts)
+    for file_id in file_ids:
+        start = offsets[file_id]
+        for position in range(start, start + lengths[file_id]):
+            module_id = data[position]
+            files[fill[module_id]] = file_id
+            file_lines[fill[module_id]] = lines[position]
+            fill[module_id] += 1
+    return starts, files, file_lines
+
+
+class ImportIndex:
+    """
+    File -> imported top-level modules, stored as integer arrays
+
+    offsets[f] and lengths[f] locate the module IDs imported by file ID f
+    in data, and lines holds the first line of each of those imports (0
+    when unknown). Replacing a file's imports appends a new span; the
+    old one is reclaimed by compact(), which runs automatically once
+    enough of data is unused. The reverse index is rebuilt on the first lookup
+    after a change, and saved along with the index.
+    """
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        # File ID -> path (None once removed); decoded lazily when loaded
+        self._paths: Optional[List[Optional[str]]] = []
+        self._path_ids: Optional[Dict[str, int]] = {}
+        self.offsets: Sequence[int] = array(TYPECODE)
+        self.lengths: Sequence[int] = array(TYPECODE)
+        self.data: Sequence[int] = array(TYPECODE)
+        self.lines: Sequence[int] = array(TYPECODE)
+        self._garbage = 0
+        self._reverse: Optional[
+            Tuple[Sequence[int], Sequence[int], Sequence[int]]
+        ] = None
+
+        # Set by load(): the mapping and the views into it
+        self._mmap: Optional[mmap.mmap] = None
+        self._views: List[memoryview] = []
+        self._path_offsets: Optional[Sequence[int]] = None
+        self._path_blob: Optional[memoryview] = None
+
+    @classmethod
+    def from_items(
+        cls, items: Iterable[Tuple[str, Iterable[str]]]
+    ) -> "ImportIndex":
+        """Build an index from (file_path, imports) pairs"""
+        index = cls()
+        for file_path, imports in items:
+            index.add(file_path, imports)
+        return index
+
+    # Reading
+
+    def _path(self, file_id: int) -> Optional[str]:
+        if self._paths is not None:
+            return self._paths[file_id]
+        assert self._path_offsets is not None and self._path_blob is not None
+        start = self._path_offsets[file_id]
+        end = self._path_offsets[file_id + 1]
+        return str(self._path_blob[start:end], "utf-8", "surrogateescape")
+
+    def _file_ids(self) -> Dict[str, int]:
+        if self._path_ids is None:
+            self._path_ids = {}
+            for file_id in range(len(self.offsets)):
+                path = self._path(file_id)
+                if path is not None:
+                    self._path_ids[path] = file_id
+        return self._path_ids
+
+    def _module_ids(self, file_id: int) -> Sequence[int]:
+        start = self.offsets[file_id]
+        return self.data[start : start + self.lengths[file_id]]
+
+    def __len__(self) -> int:
+        return len(self._file_ids())
+
+    def __contains__(self, file_path: object) -> bool:
+        return file_path in self._file_ids()
+
+    def paths(self) -> List[str]:
+        """Return the indexed file paths"""
+        return list(self._file_ids())
+
+    def imports_of(self, file_path: str) -> List[str]:
+        """Return the modules a file imports (empty if not indexed)"""
+        file_id = self._file_ids().get(file_path)
+        if file_id is None:
+            return []
+        return [self.names[i] for i in self._module_ids(file_id)]
+
+    def items(self) -> Iterator[Tuple[str, List[str]]]:
+        """Yield (file_path, imports) for every indexed file"""
+        for file_path, file_id in self._file_ids().items():
+            yield file_path, [self.names[i] for i in self._module_ids(file_id)]
+
+    def _reverse_index(
+        self,
+    ) -> Tuple[Sequence[int], Sequence[int], Sequence[int]]:
+        if self._reverse is None:
+            self._reverse = _build_reverse(
+                len(self.names),
+                sorted(self._file_ids().values()),
+                self.offsets,
+                self.lengths,
+                self.data,
+                self.lines,
+            )
+        return self._reverse
+
+    def files_importing(self, module: str) -> List[str]:
+        """Return the files that import a module"""
+        return [file_path for file_path, _ in self.locations(module)]
+
+    def locations(self, module: str) -> List[Tuple[str, int]]:
+        """
+        Return (file_path, line) for every file that imports a module
+
+        Finding the module's entries is a constant-time slice of the
+        reverse index. The line is 0 when the file was added without
+        line numbers.
+        """
+        module_id = self._name_ids.get(module)
+        if module_id is None:
+            return []
+        starts, files, lines = self._reverse_index()
+        start, end = starts[module_id], starts[module_id + 1]
+        return [
+            (self._path(file_id) or "", line)
+            for file_id, line in zip(files[start:end], lines[start:end])
+        ]
+
+    def import_counts(self) -> Dict[str, int]:
+        """Return module -> number of files importing it"""
+        starts = self._reverse_index()[0]
+        return {
+            name: starts[i + 1] - starts[i]
+            for i, name in enumerate(self.names)
+            if starts[i + 1] > starts[i]
+        }
+
+    def modules(self) -> Set[str]:
+        """Return every module imported by at least one file"""
+        return set(self.import_counts())
+
+    # Updating
+
+    def _make_writable(self) -> None:
+        """Copy a loaded index out of its mapping before changing it"""
+        if self._mmap is None:
+            return
+        paths = [self._path(i) for i in range(len(self.offsets))]
+        self.offsets = array(TYPECODE, self.offsets)
+        self.lengths = array(TYPECODE, self.lengths)
+        self.data = array(TYPECODE, self.data)
+        self.lines = array(TYPECODE, self.lines)
+        self._reverse = None
+        self._paths = paths
+        self.close()
+
+    def _intern(self, name: str) -> int:
+        module_id = self._name_ids.get(name)
+        if module_id is None:
+            module_id = len(self.names)
+            self.names.append(name)
+            self._name_ids[name] = module_id
+        return module_id
+
+    def add(
+        self, file_path: str, imports: Union[Iterable[str], Mapping[str, int]]
+    ) -> None:
+        """
+        Set the imports of a file, replacing any previous entry
+
+        imports may map each module to the line importing it (as from
+        midna.extractors.extract_import_lines).
+        """
+        self._make_writable()
+        assert isinstance(self.data, array) and self._paths is not None
+        assert isinstance(self.offsets, array)
+        assert isinstance(self.lengths, array)
+        assert isinstance(self.lines, array)
+
+        if isinstance(imports, Mapping):
+            line_of = {self._intern(n): line for n, line in imports.items()}
+        else:
+            line_of = {self._intern(name): 0 for name in imports}
+        module_ids = sorted(line_of)
+        file_ids = self._file_ids()
+        file_id = file_ids.get(file_path)
+        if file_id is None:
+            file_id = len(self._paths)
+            self._paths.append(file_path)
+            file_ids[file_path] = file_id
+            self.offsets.append(len(self.data))
+            self.lengths.append(len(module_ids))
+        else:
+            self._garbage += self.lengths[file_id]
+            self.offsets[file_id] = len(self.data)
+            self.lengths[file_id] = len(module_ids)
+        self.data.extend(module_ids)
+        self.lines.extend(line_of[module_id] for module_id in module_ids)
+        self._reverse = None
+
+        if self._garbage > len(self.data) * _COMPACT_RATIO:
+            self.compact()
+
+    def remove(self, file_path: str) -> bool:
+        """Forget a file; returns whether it was indexed"""
+        self._make_writable()
+        assert self._paths is not None and isinstance(self.lengths, array)
+
+        file_id = self._file_ids().pop(file_path, None)
+        if file_id is None:
+            return False
+        self._paths[file_id] = None
+        self._garbage += self.lengths[file_id]
+        self.lengths[file_id] = 0
+        self._reverse = None
+        return True
+
+    def _compacted(self) -> Tuple[List[str], array, array, array, array]:
+        """Return (paths, offsets, lengths, data, lines) minus unused spans"""
+        paths = []
+        offsets = array(TYPECODE)
+        lengths = array(TYPECODE)
+        data = array(TYPECODE)
+        lines = array(TYPECODE)
+        for file_path, file_id in self._file_ids().items():
+            start = self.offsets[file_id]
+            length = self.lengths[file_id]
+            paths.append(file_path)
+            offsets.append(len(data))
+            lengths.append(length)
+            data.extend(self.data[start : start + length])
+            lines.extend(self.lines[start : start + length])
+        return paths, offsets, lengths, data, lines
+
+    def compact(self) -> None:
+        """Drop removed files and unused spans, renumbering file IDs"""
+        paths, offsets, lengths, data, lines = self._compacted()
+        self.close()
+        self._paths = list(paths)
+        self._path_ids = {path: i for i, path in enumerate(paths)}
+        self.offsets, self.lengths, self.data = offsets, lengths, data
+        self.lines = lines
+        self._garbage = 0
+        self._reverse = None
+
+    # Persistence
+
+    def save(self, path: str) -> None:
+        """Write the index to path (atomically, compacted)"""
+        paths, offsets, lengths, data, lines = self._compacted()
+        name_offsets, name_blob = _pack_strings(self.names)
+        path_offsets, path_blob = _pack_strings(paths)
+        starts, files, file_lines = _build_reverse(
+            len(self.names), range(len(paths)), offsets, lengths, data, lines
+        )
+        header = _HEADER.pack(
+            MAGIC,
+            INDEX_VERSION,
+            _BYTE_ORDER,
+            len(self.names),
+            len(paths),
+            len(data),
+            len(name_blob),
+            len(path_blob),
+        )
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            for section in (
+                name_offsets,
+                path_offsets,
+                offsets,
+                lengths,
+                data,
+                lines,
+                starts,
+                files,
+                file_lines,
+            ):
+                section.tofile(f)
+            f.write(name_blob)
+            f.write(path_blob)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ImportIndex":
+        """
+        Map a saved index into memory
+
+        The integer arrays (including the reverse index) and file paths
+        stay in the mapping and are only decoded when used, so loading
+        costs O(number of modules).
+        Raises ValueError for a file that is not a compatible index.
+        """
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        index = cls()
+        index._mmap = mapping
+        view = memoryview(mapping)
+        index._views.append(view)
+        try:
+            fields = _HEADER.unpack_from(view)
+            magic, version, byte_order = fields[:3]
+            names, files, data_len, name_bytes, path_bytes = fields[3:]
+            if magic != MAGIC or version != INDEX_VERSION:
+                raise ValueError(f"Not a version {INDEX_VERSION} index")
+            expected = (
+                _HEADER.size
+                + 4 * (2 * (names + 1) + 3 * files + 1 + 4 * data_len)
+                + name_bytes
+                + path_bytes
+            )
+            if len(mapping) != expected:
+                raise ValueError("Truncated index file")
+
+            position = _HEADER.size
+
+            def take(count: int) -> Sequence[int]:
+                nonlocal position
+                section = view[position : position + 4 * count]
+                position += 4 * count
+                if byte_order != _BYTE_ORDER:
+                    # Saved on a machine with the other byte order
+                    values = array(TYPECODE, section.tobytes())
+                    values.byteswap()
+                    return values
+                ints = _cast_ints(section)
+                index._views += [section, ints]
+                return ints
+
+            name_offsets = take(names + 1)
+            index._path_offsets = take(files + 1)
+            index.offsets = take(files)
+            index.lengths = take(files)
+            index.data = take(data_len)
+            index.lines = take(data_len)
+            index._reverse = (
+                take(names + 1),
+                take(data_len),
+                take(data_len),
+            )
+
+            name_blob = view[position : position + name_bytes]
+            index._path_blob = view[position + name_bytes :]
+            index._views += [name_blob, index._path_blob]
+        except (ValueError, struct.error):
+            index.close()
+            raise
+
+        index.names = [
+            str(
+                name_blob[name_offsets[i] : name_offsets[i + 1]],
+                "utf-8",
+                "surrogateescape",
+            )
+            for i in range(names)
+        ]
+        index._name_ids = {name: i for i, name in enumerate(index.names)}
+        index._paths = None
+        index._path_ids = None
+        return index
+
+    def close(self) -> None:
+        """Release the mapping of a loaded index (if any)"""
+        if self._mmap is None:
+            return
+        if self._paths is None:
+            self._paths = [self._path(i) for i in range(len(self.offsets))]
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._path_offsets = None
+        self._path_blob = None
+        self._mmap.close()
+        self._mmap = None
+
+    def __enter__(self) -> "ImportIndex":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
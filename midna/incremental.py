@@ -0,0 +1,348 @@
+"""Incremental scans of the files git reports as changed for Midna
+
+`midna --since REF` and `midna --staged` only extract imports from the
+Python files that changed (since REF, or in the staging area compared
+to HEAD) and report the third-party imports they add or drop. Imports
+of untouched files come from a store keyed by git blob ID, so they are
+parsed once per content, whatever branch or commit they show up in.
+"""
+
+import io
+import logging
+import os
+import subprocess
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from . import profiling
+from .cache import CACHE_DIR
+from .discovery import extract_import_lines_from_file, python_path_test
+from .extractors import decode_source, extract_import_lines
+from .ignore import PathFilter
+from .import_index import ImportIndex
+from .notebooks import NOTEBOOK_SUFFIX, extract_notebook_import_lines
+from .package_classifier import THIRD_PARTY, classify_package
+
+# Blob ID -> imports of every Python file seen in a scanned tree
+BLOB_INDEX_FILE = "blobs.idx"
+
+# Module -> (file, line) pairs importing it
+Locations = Dict[str, List[Tuple[str, int]]]
+
+
+class GitError(RuntimeError):
+    """git is missing, or a git command failed"""
+
+
+class DependencyChanges:
+    """Third-party imports added and dropped by a set of changed files"""
+
+    def __init__(
+        self,
+        base: str,
+        files: List[str],
+        added: Locations,
+        dropped: Locations,
+    ) -> None:
+        # What the changes are compared to: a ref, or HEAD for --staged
+        self.base = base
+        self.files = files
+        # New modules with where they are imported now
+        self.added = added
+        # Modules no longer imported, with where they used to be
+        self.dropped = dropped
+
+
+def _git(directory: str, *args: str) -> bytes:
+    """Run a git command in directory and return its output"""
+    try:
+        result = subprocess.run(
+            ["git", "-C", directory, *args], capture_output=True
+        )
+    except OSError as e:
+        raise GitError(f"Cannot run git: {e}") from e
+    if result.returncode != 0:
+        error = result.stderr.decode(errors="replace").strip()
+        message = error.splitlines()[0] if error else "git failed"
+        raise GitError(message.replace("fatal: ", "", 1))
+    return result.stdout
+
+
+def _split_z(output: bytes) -> List[str]:
+    return [
+        item.decode("utf-8", "surrogateescape")
+        for item in output.split(b"\0")
+        if item
+    ]
+
+
+def tree_blobs(directory: str, ref: str) -> Dict[str, str]:
+    """Map the files of ref below directory to their blob IDs"""
+    blobs: Dict[str, str] = {}
+    # <mode> SP <type> SP <object> TAB <path>
+    for item in _split_z(_git(directory, "ls-tree", "-r", "-z", ref)):
+        info, _, path = item.partition("\t")
+        _, kind, blob = info.split(" ")
+        if kind == "blob":
+            blobs[path] = blob
+    return blobs
+
+
+def staged_blobs(directory: str) -> Dict[str, str]:
+    """Map the files in the staging area below directory to blob IDs"""
+    blobs: Dict[str, str] = {}
+    # <mode> SP <object> SP <stage> TAB <path>
+    for item in _split_z(_git(directory, "ls-files", "-s", "-z")):
+        info, _, path = item.partition("\t")
+        _, blob, stage = info.split(" ")
+        if stage == "0":  # merge conflicts have no single version
+            blobs[path] = blob
+    return blobs
+
+
+def changed_files(
+    directory: str, since: Optional[str] = None, staged: bool = False
+) -> Dict[str, str]:
+    """
+    Return {path: status} for the files changed below directory
+
+    status is A (added), M (modified) or D (deleted). With staged, the
+    staging area is compared to HEAD; otherwise the working tree,
+    including untracked files that are not ignored, is compared to
+    since.
+    """
+    args = ["diff", "--name-status", "-z", "--no-renames", "--relative"]
+    if staged:
+        args.append("--cached")
+    args.append(since or "HEAD")
+    # Alternating status and path items
+    items = _split_z(_git(directory, *args))
+    changes = {
+        path: status[0] if status[0] in "AD" else "M"
+        for status, path in zip(items[::2], items[1::2])
+    }
+    if not staged:
+        others = _git(
+            directory, "ls-files", "--others", "--exclude-standard", "-z"
+        )
+        for path in _split_z(others):
+            changes[path] = "A"
+    return changes
+
+
+def iter_blobs(directory: str, blobs: Iterable[str]) -> Iterator[bytes]:
+    """
+    Yield the contents of blobs, in order, from one git process
+
+    Only one blob is held in memory at a time.
+    """
+    import threading
+
+    blobs = list(blobs)
+    if not blobs:
+        return
+    try:
+        process = subprocess.Popen(
+            ["git", "-C", directory, "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+    except OSError as e:
+        raise GitError(f"Cannot run git: {e}") from e
+    assert process.stdin is not None and process.stdout is not None
+    stdin, stdout = process.stdin, process.stdout
+
+    def feed() -> None:
+        # From a thread, so that git never blocks on a full stdout pipe
+        try:
+            for blob in blobs:
+                stdin.write(f"{blob}\n".encode())
+            stdin.close()
+        except OSError:
+            pass
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        for blob in blobs:
+            # <object> SP <type> SP <size> LF <contents> LF
+            header = stdout.readline().split()
+            if len(header) != 3:
+                raise GitError(f"Cannot read blob {blob}")
+            data = stdout.read(int(header[2]))
+            stdout.read(1)
+            yield data
+    finally:
+        stdout.close()
+        process.kill()
+        process.wait()
+        writer.join()
+
+
+def _extract(data: bytes, path: str, engine: str) -> Dict[str, int]:
+    """Extract imports from the contents of path, {} if they do not parse"""
+    try:
+        if path.endswith(NOTEBOOK_SUFFIX):
+            return extract_notebook_import_lines(
+                io.BytesIO(data), engine, path
+            )
+        return extract_import_lines(decode_source(data), engine)
+    except (SyntaxError, ValueError) as e:
+        logging.getLogger("midna").warning(f"Syntax error in {path}: {e}")
+        profiling.count("parse failures")
+        return {}
+
+
+def _add_locations(
+    locations: Locations, path: str, imports: Dict[str, int]
+) -> None:
+    for module, line in imports.items():
+        locations.setdefault(module, []).append((path, line))
+
+
+def diff_dependencies(
+    directory: str = ".",
+    since: Optional[str] = None,
+    staged: bool = False,
+    engine: str = "ast",
+    path_filter: Optional[PathFilter] = None,
+) -> DependencyChanges:
+    """
+    Report the third-party imports added or dropped by changed files
+
+    Compares the working tree with since (default HEAD), or with staged
+    the staging area with HEAD. Only changed files are parsed, in both
+    versions; untouched files' imports come from the blob store in
+    .midna/cache, which is updated with any blob it did not have yet.
+    An import counts as added (or dropped) only if no untouched file
+    imports it. Raises GitError outside a git work tree.
+    """
+    logger = logging.getLogger("midna")
+    if path_filter is None:
+        path_filter = PathFilter()
+    accepts = python_path_test(
+        path_filter, path_filter.root_matcher(directory)
+    )
+    base = since or "HEAD"
+
+    with profiling.timer("git"):
+        # Outside a work tree `git diff` would compare paths instead
+        _git(directory, "rev-parse", "--show-toplevel")
+        changed = changed_files(directory, since, staged)
+        changes = {p: status for p, status in changed.items() if accepts(p)}
+        try:
+            before = tree_blobs(directory, base)
+        except GitError:
+            if since:
+                raise
+            before = {}  # No commit yet: everything is new
+        before = {path: blob for path, blob in before.items() if accepts(path)}
+        after = staged_blobs(directory) if staged else {}
+    logger.info(f"{len(changes)} Python files changed since {base}")
+
+    store_path = os.path.join(directory, CACHE_DIR, BLOB_INDEX_FILE)
+    try:
+        store = ImportIndex.load(store_path)
+    except (OSError, ValueError):
+        store = ImportIndex()
+
+    # Keep the store to the blobs of the base tree, parsing new ones
+    current = set(before.values())
+    stale = [blob for blob in store.paths() if blob not in current]
+    for blob in stale:
+        store.remove(blob)
+    unseen = sorted(current - set(store.paths()))
+    # A path for each blob, which tells notebooks from modules
+    blob_paths = {blob: path for path, blob in before.items()}
+    with profiling.timer("parse"):
+        for data, blob in zip(iter_blobs(directory, unseen), unseen):
+            store.add(blob, _extract(data, blob_paths[blob], engine))
+    if unseen or stale:
+        with profiling.timer("cache save"):
+            store.save(store_path)
+
+    # Modules imported by untouched files: every blob of the base tree,
+    # minus blobs only changed files had
+    counts = store.import_counts()
+    untouched = {blob for path, blob in before.items() if path not in changes}
+    for blob in {before[path] for path in changes if path in before}:
+        if blob not in untouched:
+            for module in store.imports_of(blob):
+                counts[module] -= 1
+    kept = {module for module, count in counts.items() if count > 0}
+
+    # Changed files: parse both versions
+    old_paths = sorted(path for path in changes if path in before)
+    new_paths = sorted(p for p, status in changes.items() if status != "D")
+    old: Locations = {}
+    new: Locations = {}
+    with profiling.timer("parse"):
+        old_blobs = [before[path] for path in old_paths]
+        for data, path in zip(iter_blobs(directory, old_blobs), old_paths):
+            _add_locations(old, path, _extract(data, path, engine))
+        if staged:
+            new_blobs = [after[path] for path in new_paths]
+            for data, path in zip(iter_blobs(directory, new_blobs), new_paths):
+                _add_locations(new, path, _extract(data, path, engine))
+        else:
+            for path in new_paths:
+                imports = extract_import_lines_from_file(
+                    os.path.join(directory, path), engine
+                )
+                _add_locations(new, path, imports)
+    store.close()
+    profiling.count("files scanned", len(unseen) + len(changes))
+
+    def third_party(modules: Iterable[str]) -> List[str]:
+        return [
+            module
+            for module in modules
+            if not module.startswith("_")
+            and classify_package(module, directory)[0] == THIRD_PARTY
+        ]
+
+    added = sorted(new.keys() - old.keys() - kept)
+    dropped = sorted(old.keys() - new.keys() - kept)
+    return DependencyChanges(
+        "the staging area" if staged else base,
+        sorted(changes),
+        {module: new[module] for module in third_party(added)},
+        {module: old[module] for module in third_party(dropped)},
+    )
+
+
+def format_changes(changes: DependencyChanges) -> str:
+    """Format added and dropped third-party imports for the terminal"""
+    from .installed import get_installed_index
+
+    installed = get_installed_index()
+    lines = [f"{len(changes.files)} Python files changed ({changes.base})"]
+
+    def describe(module: str, locations: List[Tuple[str, int]]) -> str:
+        providers = installed.distributions_for(module)
+        if providers:
+            provided = ", ".join(f"{n}=={v}" for n, v in providers)
+        else:
+            provided = "not installed"
+        path, line = locations[0]
+        where = f"{path}:{line}" if line else path
+        more = f" and {len(locations) - 1} more" if len(locations) > 1 else ""
+        return f"{module} ({provided}) in {where}{more}"
+
+    for title, mark, found in (
+        ("New third-party imports", "+", changes.added),
+        ("Dropped third-party imports", "-", changes.dropped),
+    ):
+        if found:
+            lines.append(f"\n{title} ({len(found)}):")
+            for module, locations in found.items():
+                lines.append(f"  {mark} {describe(module, locations)}")
+    if not changes.added and not changes.dropped:
+        lines.append("No third-party imports added or dropped.")
+    return "\n".join(lines)
@@ -0,0 +1,294 @@
+"""Index of installed distributions for Midna"""
+
+import csv
+import json
+import logging
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+INDEX_CACHE_FILE = "installed.json"
+
+# Bump when the persisted layout changes
+INDEX_CACHE_VERSION = 2
+
+_NORMALIZE_RE = re.compile(r"[-_.]+")
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a distribution name as described in PEP 503"""
+    return _NORMALIZE_RE.sub("-", name).lower()
+
+
+def _read_metadata(path: str) -> Tuple[str, str]:
+    """Read name and version from a metadata directory's files"""
+    # Only needed for the rare directory without a version in its name
+    try:
+        from importlib.metadata import PathDistribution
+    except ImportError:
+        from importlib_metadata import PathDistribution  # type: ignore
+
+    metadata = PathDistribution(Path(path)).metadata
+    return metadata["Name"] or "", metadata["Version"] or ""
+
+
+def _scan_metadata_dir(directory: str) -> Iterator[Tuple[str, str, str]]:
+    """Yield (name, version, metadata path) for distributions in directory"""
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+
+    for entry in entries:
+        if entry.name.endswith(".dist-info"):
+            stem = entry.name[: -len(".dist-info")]
+        elif entry.name.endswith(".egg-info"):
+            stem = entry.name[: -len(".egg-info")]
+        else:
+            continue
+
+        # name-version[-pyX.Y] is encoded in the directory name, which
+        # saves opening METADATA for almost every distribution
+        parts = stem.split("-")
+        if len(parts) >= 2 and parts[1][:1].isdigit():
+            yield parts[0], parts[1], entry.path
+            continue
+
+        try:
+            name, version = _read_metadata(entry.path)
+        except Exception:
+            continue
+        if name:
+            yield name, version, entry.path
+
+
+def _module_from_path(path: str) -> Optional[str]:
+    """Return the top-level importable name a RECORD path installs"""
+    parts = path.replace("\\", "/").split("/", 1)
+    top = parts[0]
+    if not top or top.startswith(".") or top == "__pycache__":
+        return None
+    if len(parts) > 1:
+        # A package directory, unless it is the metadata or data dir
+        if top.endswith((".dist-info", ".egg-info", ".data")):
+            return None
+        return top
+    if top.endswith((".py", ".pyc", ".so", ".pyd")):
+        # mod.py, _ext.cpython-311-x86_64-linux-gnu.so, ...
+        return top.split(".", 1)[0]
+    return None
+
+
+def top_level_modules(location: str) -> List[str]:
+    """Read the top-level modules a distribution provides from metadata"""
+    try:
+        with open(
+            os.path.join(location, "top_level.txt"), "r", encoding="utf-8"
+        ) as f:
+            return [
+                line.strip().replace("\\", "/").split("/")[0]
+                for line in f
+                if line.strip()
+            ]
+    except OSError:
+        pass
+
+    modules: List[str] = []
+    try:
+        with open(
+            os.path.join(location, "RECORD"), "r", encoding="utf-8"
+        ) as f:
+            for row in csv.reader(f):
+                module = _module_from_path(row[0]) if row else None
+                if module and module not in modules:
+                    modules.append(module)
+    except (OSError, csv.Error):
+        pass
+    return modules
+
+
+def default_search_paths() -> List[str]:
+    """Directories searched for installed distributions (like sys.path)"""
+    return [path or os.getcwd() for path in sys.path if os.path.isdir(path)]
+
+
+class InstalledIndex:
+    """
+    Normalized name -> version map of installed distributions
+
+    Also provides the reverse map from top-level import names to the
+    distributions that install them (yaml -> PyYAML, cv2 -> opencv-python),
+    built from top_level.txt or RECORD on first use.
+    """
+
+    def __init__(
+        self,
+        versions: Dict[str, str],
+        locations: Optional[Dict[str, str]] = None,
+        names: Optional[Dict[str, str]] = None,
+        modules: Optional[Dict[str, List[str]]] = None,
+    ) -> None:
+        self.versions = versions
+        self.locations = locations or {}
+        self.names = names or {}
+        self._modules = modules
+        self._provides: Optional[Dict[str, List[str]]] = None
+
+    @classmethod
+    def build(cls, paths: Optional[Sequence[str]] = None) -> "InstalledIndex":
+        """Scan metadata directories on the given paths (default sys.path)"""
+        versions: Dict[str, str] = {}
+        locations: Dict[str, str] = {}
+        names: Dict[str, str] = {}
+
+        for directory in default_search_paths() if paths is None else paths:
+            for name, version, location in _scan_metadata_dir(directory):
+                key = normalize_name(name)
+                # First match on the path wins, as it does for imports
+                if key not in versions:
+                    versions[key] = version
+                    locations[key] = location
+                    names[key] = name
+
+        return cls(versions, locations, names)
+
+    @property
+    def modules(self) -> Dict[str, List[str]]:
+        """Top-level module name -> normalized distribution names"""
+        if self._modules is None:
+            modules: Dict[str, List[str]] = {}
+            for key, location in self.locations.items():
+                for module in top_level_modules(location):
+                    modules.setdefault(module, []).append(key)
+            self._modules = modules
+        return self._modules
+
+    def modules_of(self, name: str) -> List[str]:
+        """Return the top-level modules a distribution installs"""
+        if self._provides is None:
+            provides: Dict[str, List[str]] = {}
+            for module, keys in self.modules.items():
+                for key in keys:
+                    provides.setdefault(key, []).append(module)
+            self._provides = provides
+        return sorted(self._provides.get(normalize_name(name), []))
+
+    def version(self, name: str) -> Optional[str]:
+        """Return the installed version of a distribution, if any"""
+        return self.versions.get(normalize_name(name))
+
+    def distributions_for(self, module: str) -> List[Tuple[str, str]]:
+        """Return (distribution name, version) pairs providing a module"""
+        return [
+            (self.names.get(key, key), self.versions[key])
+            for key in self.modules.get(module, [])
+        ]
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and normalize_name(name) in self.versions
+
+    def __len__(self) -> int:
+        return len(self.versions)
+
+
+def environment_fingerprint(paths: Sequence[str]) -> Dict[str, object]:
+    """Identify the environment and the state of its search paths"""
+    mtimes: List[List] = []
+    for path in paths:
+        try:
+            mtimes.append([path, os.stat(path).st_mtime_ns])
+        except OSError:
+            mtimes.append([path, 0])
+    return {"prefix": sys.prefix, "paths": mtimes}
+
+
+def _load_persisted(
+    cache_path: str, fingerprint: Dict[str, object]
+) -> Optional[InstalledIndex]:
+    """Load a persisted index if it still matches the environment"""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        not isinstance(data, dict)
+        or data.get("version") != INDEX_CACHE_VERSION
+        or data.get("fingerprint") != fingerprint
+    ):
+        return None
+    return InstalledIndex(
+        data.get("versions", {}),
+        data.get("locations", {}),
+        data.get("names", {}),
+        data.get("modules"),
+    )
+
+
+def _persist(
+    cache_path: str, fingerprint: Dict[str, object], index: InstalledIndex
+) -> None:
+    """Write the index next to the fingerprint it was built from"""
+    logger = logging.getLogger("midna")
+    data = {
+        "version": INDEX_CACHE_VERSION,
+        "fingerprint": fingerprint,
+        "versions": index.versions,
+        "locations": index.locations,
+        "names": index.names,
+        "modules": index.modules,
+    }
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Failed to write installed package cache: {e}")
+
+
+_index: Optional[InstalledIndex] = None
+
+
+def get_installed_index(cache_dir: Optional[str] = None) -> InstalledIndex:
+    """
+    Return the index of installed distributions, built once per run
+
+    With cache_dir, the index (including the module -> distribution
+    map) is also persisted there and reused by later runs until a search
+    path directory's mtime changes (which happens whenever a
+    distribution is installed or removed).
+    """
+    global _index
+    if _index is not None:
+        return _index
+
+    logger = logging.getLogger("midna")
+    paths = default_search_paths()
+
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, INDEX_CACHE_FILE)
+        fingerprint = environment_fingerprint(paths)
+        _index = _load_persisted(cache_path, fingerprint)
+        if _index is not None:
+            logger.debug(f"Loaded {len(_index)} installed packages from cache")
+            return _index
+
+    _index = InstalledIndex.build(paths)
+    logger.debug(f"Found {len(_index)} installed packages")
+
+    if cache_dir is not None:
+        _persist(cache_path, fingerprint, _index)
+
+    return _index
+
+
+def invalidate_installed_index() -> None:
+    """Forget the current index, e.g. after installing or uninstalling"""
+    global _index
+    _index = None
@@ -1,12 +1,32 @@
 """Package installer for Midna"""
 
+import json
 import logging
-import subprocess
-from typing import List
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
 
+from . import runner
+from .installed import invalidate_installed_index
+from .runner import PIP_TIMEOUT, CommandResult, ProgressLine
 
-def install_packages(packages: List[str], dry_run: bool = False) -> int:
-    """Install packages using pip"""
+# Where install_packages_batched builds wheels before installing
+WHEEL_DIR = os.path.join(".midna", "wheels")
+
+# Parallel pip download processes (downloads are network bound)
+DOWNLOAD_WORKERS = 4
+
+
+def install_packages(
+    packages: List[str],
+    dry_run: bool = False,
+    timeout: Optional[float] = PIP_TIMEOUT,
+) -> int:
+    """
+    Install packages using pip
+
+    pip's output is streamed to the log and a progress line while it
+    runs; pip is killed if it takes longer than timeout seconds.
+    """
     logger = logging.getLogger("midna")
 
     if not packages:
@@ -28,22 +48,269 @@ def install_packages(packages: List[str], dry_run: bool = False) -> int:
 
     # Install packages
     cmd = ["pip", "install"] + packages
-    logger.debug(f"Running command: {' '.join(cmd)}")
 
+    # pip is about to change the environment, even if it fails halfway
+    invalidate_installed_index()
+
+    progress = ProgressLine()
     try:
-        result = subprocess.run(
-            cmd, check=True, capture_output=True, shell=False
+        result = runner.run(cmd, timeout, progress.pip_line)
+    except KeyboardInterrupt:
+        logger.warning("Installation interrupted by user")
+        print("\nWARNING: Installation interrupted by user")
+        return 130
+    finally:
+        progress.close()
+
+    if result.timed_out:
+        logger.error(f"Installation timed out after {timeout:g} seconds")
+        print(f"ERROR: Installation timed out after {timeout:g} seconds")
+    elif not result.ok:
+        logger.error(
+            f"Installation failed with exit code {result.returncode}: "
+            f"{result.error()}"
         )
+        print(f"ERROR: Installation failed with exit code {result.returncode}")
+    else:
         logger.info("Installation completed successfully")
         print("Installation completed successfully!")
-        return result.returncode
+    return result.returncode
+
+
+def _run_pip(
+    args: List[str], timeout: Optional[float] = PIP_TIMEOUT
+) -> Tuple[bool, str]:
+    """Run pip with args, returning (success, last line of its errors)"""
+    logger = logging.getLogger("midna")
+    result = runner.run(["pip"] + args, timeout)
+    if result.ok:
+        return True, ""
+    logger.debug(f"pip failed: {result.error()}")
+    return False, result.error()
+
 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Installation failed with exit code {e.returncode}")
-        print(f"ERROR: Installation failed with exit code {e.returncode}")
-        return e.returncode
+def resolve_packages(
+    packages: List[str], timeout: Optional[float] = PIP_TIMEOUT
+) -> Optional[List[str]]:
+    """
+    Resolve packages and their dependencies to pinned requirements once
+
+    Uses `pip install --dry-run --report` (pip 22.2+). Returns None if
+    pip cannot resolve the set or is too old, in which case each package
+    is downloaded together with its dependencies instead.
+    """
+    logger = logging.getLogger("midna")
+    cmd = ["pip", "install", "--dry-run", "--quiet", "--report", "-"]
+    cmd += packages
+
+    result = runner.run(cmd, timeout, keep_stdout=True)
+    if not result.ok:
+        logger.info("Could not resolve packages up front")
+        return None
+
+    try:
+        resolved = []
+        for item in json.loads(result.stdout)["install"]:
+            if item.get("is_direct"):
+                resolved.append(item["download_info"]["url"])
+            else:
+                metadata = item["metadata"]
+                resolved.append(f"{metadata['name']}=={metadata['version']}")
+    except (ValueError, KeyError, TypeError) as e:
+        logger.info(f"Unexpected pip resolution report: {e}")
+        return None
+
+    logger.info(f"Resolved {len(resolved)} distributions to download")
+    return resolved
+
+
+def download_packages(
+    requirements: List[str],
+    wheel_dir: str,
+    no_deps: bool = False,
+    workers: int = DOWNLOAD_WORKERS,
+    timeout: Optional[float] = PIP_TIMEOUT,
+) -> Dict[str, str]:
+    """
+    Download requirements as wheels into wheel_dir, returning failures
+
+    Uses `pip wheel`, which builds sdists into wheels as it goes, so
+    wheel_dir can be installed from without an index (sdists would need
+    their build dependencies from one). Runs in parallel.
+    """
+    logger = logging.getLogger("midna")
+    os.makedirs(wheel_dir, exist_ok=True)
+
+    cmds = []
+    for requirement in requirements:
+        cmd = ["pip", "wheel", "--quiet", "--wheel-dir", wheel_dir]
+        if no_deps:
+            cmd.insert(2, "--no-deps")
+        cmds.append(cmd + [requirement])
+
+    progress = ProgressLine()
+    done = 0
+
+    def report(result: CommandResult) -> None:
+        nonlocal done
+        done += 1
+        progress.update(f"  Downloaded {done}/{len(cmds)}")
+
+    try:
+        results = runner.run_all(cmds, workers, timeout, report)
+    finally:
+        progress.close()
+
+    failures: Dict[str, str] = {}
+    for requirement, result in zip(requirements, results):
+        if not result.ok:
+            error = result.error()
+            logger.warning(f"Failed to download {requirement}: {error}")
+            failures[requirement] = error
+    return failures
+
+
+def install_from_wheelhouse(
+    packages: List[str],
+    find_links: Sequence[str],
+    timeout: Optional[float] = PIP_TIMEOUT,
+) -> Dict[str, str]:
+    """
+    Install packages without an index, returning failed packages
+
+    All packages are installed in one pip run; only if that fails is
+    each package installed on its own, so that one broken package does
+    not take the others down with it.
+    """
+    index_args = ["--no-index"]
+    for location in find_links:
+        index_args += ["--find-links", location]
+
+    ok, error = _run_pip(["install"] + index_args + packages, timeout)
+    if ok:
+        return {}
+    if len(packages) == 1:
+        return {packages[0]: error}
+
+    failures: Dict[str, str] = {}
+    # One at a time: concurrent pip installs into one environment clash
+    for package in packages:
+        ok, error = _run_pip(["install"] + index_args + [package], timeout)
+        if not ok:
+            failures[package] = error
+    return failures
+
+
+def fill_wheelhouse(
+    packages: List[str],
+    wheel_dir: str,
+    workers: int = DOWNLOAD_WORKERS,
+    timeout: Optional[float] = PIP_TIMEOUT,
+) -> Dict[str, str]:
+    """
+    Download packages and their dependencies, returning failed packages
+
+    The set is resolved once and each distribution fetched on its own.
+    A failed distribution may be a dependency of any package, so then
+    (or when the set cannot be resolved) every package is fetched with
+    its dependencies instead, which tells the failures apart.
+    """
+    logger = logging.getLogger("midna")
+    resolved = resolve_packages(packages, timeout)
+    if resolved is not None:
+        print(f"Downloading {len(resolved)} distributions...")
+        if not download_packages(resolved, wheel_dir, True, workers, timeout):
+            return {}
+        logger.info("Downloading each package with its dependencies")
+
+    print(f"Downloading {len(packages)} packages...")
+    return download_packages(
+        packages, wheel_dir, workers=workers, timeout=timeout
+    )
+
+
+def install_packages_batched(
+    packages: List[str],
+    dry_run: bool = False,
+    find_links: Optional[str] = None,
+    wheel_dir: str = WHEEL_DIR,
+    workers: int = DOWNLOAD_WORKERS,
+    retries: int = 1,
+    timeout: Optional[float] = PIP_TIMEOUT,
+) -> int:
+    """
+    Install packages by downloading them first, isolating failures
+
+    The package set is resolved once and every distribution is
+    downloaded into wheel_dir in parallel (see fill_wheelhouse), then
+    installed from there without touching the network. Packages that
+    fail to download or install are reported individually and only
+    they are retried. With find_links, packages are installed from that
+    local wheelhouse only (fully offline). Each pip command is killed
+    after timeout seconds.
+    """
+    logger = logging.getLogger("midna")
+
+    if not packages or dry_run:
+        return install_packages(packages, dry_run, timeout)
+
+    print(f"Installing {len(packages)} packages...")
+    logger.info(f"Starting batch installation of {len(packages)} packages")
+
+    try:
+        failures: Dict[str, str] = {}
+        if find_links:
+            sources = [find_links]
+        else:
+            failures = fill_wheelhouse(packages, wheel_dir, workers, timeout)
+            sources = [wheel_dir]
+
+        # Packages that could not be downloaded are not installed
+        to_install = [p for p in packages if p not in failures]
+        if to_install:
+            # pip is about to change the environment, even if it fails
+            invalidate_installed_index()
+            failures.update(
+                install_from_wheelhouse(to_install, sources, timeout)
+            )
+
+        for attempt in range(retries):
+            if not failures:
+                break
+            retry = [p for p in packages if p in failures]
+            print(f"Retrying {len(retry)} failed packages...")
+            logger.info(f"Retry {attempt + 1}: {', '.join(retry)}")
+            failures = {}
+            if not find_links:
+                failures = download_packages(
+                    retry, wheel_dir, workers=workers, timeout=timeout
+                )
+            to_install = [p for p in retry if p not in failures]
+            if to_install:
+                failures.update(
+                    install_from_wheelhouse(to_install, sources, timeout)
+                )
 
     except KeyboardInterrupt:
         logger.warning("Installation interrupted by user")
         print("\nWARNING: Installation interrupted by user")
         return 130
+
+    for package in packages:
+        if package in failures:
+            print(f"  x {package}: {failures[package]}")
+            logger.error(f"Failed to install {package}: {failures[package]}")
+        else:
+            print(f"  + {package}")
+            logger.info(f"Installed {package}")
+
+    if failures:
+        print(
+            f"ERROR: {len(failures)} of {len(packages)} packages failed "
+            f"to install"
+        )
+        return 1
+
+    logger.info("Installation completed successfully")
+    print("Installation completed successfully!")
+    return 0
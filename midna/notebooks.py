@@ -0,0 +1,409 @@
+"""Jupyter notebook support for Midna
+
+Imports are read from the code cells of .ipynb files. Notebooks are
+read in chunks by a small streaming JSON scanner that keeps only what
+it needs (each cell's type and source, and the kernel language), so
+outputs such as base64 images are skipped without being held in
+memory. IPython magics and shell escapes are replaced before the cells
+are handed to the import extractor.
+"""
+
+import codecs
+import json
+import logging
+import re
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from . import profiling
+from .extractors import extract_import_lines
+
+NOTEBOOK_SUFFIX = ".ipynb"
+
+# Bytes read from a notebook at a time
+CHUNK_SIZE = 1 << 16
+
+# Cell magics whose body is Python code (%%bash, %%html... are not)
+PYTHON_CELL_MAGICS = frozenset(
+    {"capture", "debug", "prun", "python", "python3", "time", "timeit"}
+)
+
+# One JSON token: a structural character or quote, or a scalar
+_TOKEN_RE = re.compile(r'\s*([{}\[\]:,"]|[^\s{}\[\]:,"]+)')
+_STRUCTURAL = frozenset('{}[]:,"')
+
+# Line magics, shell escapes, `x = !cmd` assignments and `obj?` help
+_MAGIC_LINE_RE = re.compile(
+    r"([ \t]*)(?:"
+    r"[%!?]"
+    r"|[\w.]+(?:[ \t]*,[ \t]*[\w.]+)*[ \t]*=[ \t]*[%!]"
+    r"|[\w.]+\?\??[ \t]*$"
+    r")"
+)
+_CELL_MAGIC_RE = re.compile(r"%%(\w*)")
+
+# Where an open string ends, by opening quote
+_STRING_END_RE = {
+    '"': re.compile(r'(?:[^"\\\n]|\\.)*"'),
+    "'": re.compile(r"(?:[^'\\\n]|\\.)*'"),
+    '"""': re.compile(r'(?:[^"\\]|\\.|"(?!""))*"""', re.DOTALL),
+    "'''": re.compile(r"(?:[^'\\]|\\.|'(?!''))*'''", re.DOTALL),
+}
+# What changes the logical line state of a line of Python
+_CODE_RE = re.compile(r"\"\"\"|'''|\"|'|#|[()\[\]{}]|\\$")
+
+
+class NotebookError(ValueError):
+    """A notebook that is not valid JSON"""
+
+
+class _Scanner:
+    """Pull JSON tokens from a binary stream, one chunk at a time"""
+
+    def __init__(self, stream: IO[bytes], chunk_size: int) -> None:
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+
+    def _fill(self) -> bool:
+        """Read the next chunk, dropping what was consumed"""
+        data = self.stream.read(self.chunk_size)
+        profiling.count("bytes read", len(data))
+        try:
+            text = self.decoder.decode(data, final=not data)
+        except UnicodeDecodeError as e:
+            raise NotebookError(f"Invalid UTF-8: {e}") from e
+        self.buf = self.buf[self.pos :] + text
+        self.pos = 0
+        return bool(data)
+
+    def token(self) -> str:
+        """Return the next token, or "" at the end of the stream"""
+        while True:
+            match = _TOKEN_RE.match(self.buf, self.pos)
+            # A scalar may go on in the next chunk
+            if match is not None and (
+                match.end() < len(self.buf) or match.group(1) in _STRUCTURAL
+            ):
+                self.pos = match.end()
+                return match.group(1)
+            if not self._fill():
+                if match is None:
+                    return ""
+                self.pos = match.end()
+                return match.group(1)
+
+    def string(self, keep: bool = True) -> str:
+        """
+        Read the rest of a string whose opening quote was just read
+
+        Without keep the string is skipped: only the current chunk is
+        held in memory, however long it is, and "" is returned.
+        """
+        start = search = self.pos
+        while True:
+            end = self.buf.find('"', search)
+            if end == -1:
+                searched = len(self.buf)
+                if keep:
+                    self.pos = start
+                else:
+                    # Only trailing backslashes matter for what follows
+                    self.pos = searched - _backslashes_before(
+                        self.buf, searched
+                    )
+                offset = self.pos
+                if not self._fill():
+                    raise NotebookError("Unterminated string")
+                start, search = 0, searched - offset
+                continue
+            if _backslashes_before(self.buf, end) % 2:
+                search = end + 1  # escaped quote
+                continue
+
+            self.pos = end + 1
+            if not keep:
+                return ""
+            raw = self.buf[start:end]
+            if "\\" not in raw:
+                return raw
+            try:
+                value: str = json.loads(f'"{raw}"')
+            except ValueError as e:
+                raise NotebookError(f"Invalid string: {e}") from e
+            return value
+
+    def skip(self, token: str) -> None:
+        """Skip the value that starts with token"""
+        if token == '"':
+            self.string(keep=False)
+            return
+        if token not in ("{", "["):
+            if not token or token in "}]:,":
+                raise NotebookError(f"Unexpected {token or 'end'}")
+            return
+        depth = 1
+        while depth:
+            token = self.token()
+            if token == '"':
+                self.string(keep=False)
+            elif token in ("{", "["):
+                depth += 1
+            elif token in ("}", "]"):
+                depth -= 1
+            elif not token:
+                raise NotebookError("Unexpected end")
+
+    def keys(self) -> Iterator[str]:
+        """
+        Yield the keys of an object whose "{" was just read
+
+        The caller must read (or skip) each key's value before asking
+        for the next key.
+        """
+        token = self.token()
+        if token == "}":
+            return
+        while True:
+            if token != '"':
+                raise NotebookError("Expected an object key")
+            key = self.string()
+            if self.token() != ":":
+                raise NotebookError(f"Expected ':' after {key!r}")
+            yield key
+            token = self.token()
+            if token == "}":
+                return
+            if token != ",":
+                raise NotebookError("Expected ',' or '}'")
+            token = self.token()
+
+    def items(self) -> Iterator[str]:
+        """
+        Yield the first token of each item of an array whose "[" was
+        just read
+
+        The caller must read (or skip) each item before asking for the
+        next one.
+        """
+        token = self.token()
+        if token == "]":
+            return
+        while True:
+            yield token
+            token = self.token()
+            if token == "]":
+                return
+            if token != ",":
+                raise NotebookError("Expected ',' or ']'")
+            token = self.token()
+
+
+def _backslashes_before(text: str, end: int) -> int:
+    """Count the backslashes right before text[end]"""
+    count = 0
+    while end > count and text[end - count - 1] == "\\":
+        count += 1
+    return count
+
+
+def _text(scanner: _Scanner, token: str) -> str:
+    """Read a cell source: a string or a list of lines"""
+    if token == '"':
+        return scanner.string()
+    if token != "[":
+        scanner.skip(token)
+        return ""
+    lines: List[str] = []
+    for token in scanner.items():
+        if token == '"':
+            lines.append(scanner.string())
+        else:
+            scanner.skip(token)
+    return "".join(lines)
+
+
+def _cells(scanner: _Scanner, token: str) -> Iterator[str]:
+    """Yield the sources of the code cells of a list of cells"""
+    if token != "[":
+        scanner.skip(token)
+        return
+    for token in scanner.items():
+        if token != "{":
+            scanner.skip(token)
+            continue
+        cell_type: Optional[str] = None
+        source: Optional[str] = None
+        for key in scanner.keys():
+            token = scanner.token()
+            if key == "cell_type" and token == '"':
+                cell_type = scanner.string()
+            # "input" is nbformat 3's name for the source of code cells
+            elif key in ("source", "input") and cell_type in (None, "code"):
+                source = _text(scanner, token)
+            else:
+                scanner.skip(token)
+        if cell_type == "code" and source:
+            yield source
+
+
+def _language(scanner: _Scanner) -> Optional[str]:
+    """Read the kernel language from notebook metadata just opened"""
+    language: Optional[str] = None
+    for key in scanner.keys():
+        token = scanner.token()
+        if key in ("kernelspec", "language_info") and token == "{":
+            wanted = "language" if key == "kernelspec" else "name"
+            for inner in scanner.keys():
+                token = scanner.token()
+                if inner == wanted and token == '"':
+                    # language_info is the more precise of the two
+                    name = scanner.string()
+                    if language is None or key == "language_info":
+                        language = name
+                else:
+                    scanner.skip(token)
+        else:
+            scanner.skip(token)
+    return language
+
+
+def read_code_cells(
+    stream: IO[bytes], chunk_size: int = CHUNK_SIZE
+) -> List[str]:
+    """
+    Return the sources of a notebook's code cells, in order
+
+    stream is a binary file object, read chunk_size bytes at a time;
+    outputs and markdown cells are skipped without being kept. Returns
+    [] for notebooks whose kernel is not Python. Raises NotebookError if
+    the stream is not a JSON object.
+    """
+    scanner = _Scanner(stream, chunk_size)
+    if scanner.token() != "{":
+        raise NotebookError("Not a notebook: expected a JSON object")
+
+    sources: List[str] = []
+    language: Optional[str] = None
+    for key in scanner.keys():
+        token = scanner.token()
+        if key == "cells":
+            sources.extend(_cells(scanner, token))
+        elif key == "worksheets" and token == "[":  # nbformat 3
+            for token in scanner.items():
+                if token != "{":
+                    scanner.skip(token)
+                    continue
+                for inner in scanner.keys():
+                    token = scanner.token()
+                    if inner == "cells":
+                        sources.extend(_cells(scanner, token))
+                    else:
+                        scanner.skip(token)
+        elif key == "metadata" and token == "{":
+            language = _language(scanner)
+        else:
+            scanner.skip(token)
+
+    if language is not None and not language.lower().startswith("python"):
+        return []
+    return sources
+
+
+def _scan_line(line: str, depth: int, quote: str) -> Tuple[int, str, bool]:
+    """
+    Follow the brackets and strings of one line of Python
+
+    Returns the bracket depth and open triple quote after the line, and
+    whether it ends with a backslash continuation.
+    """
+    pos = 0
+    while True:
+        if quote:
+            match = _STRING_END_RE[quote].match(line, pos)
+            if match is None:
+                # Single-quoted strings end with the line
+                return depth, quote if len(quote) == 3 else "", False
+            pos = match.end()
+            quote = ""
+        match = _CODE_RE.search(line, pos)
+        if match is None:
+            return depth, "", False
+        token = match.group()
+        pos = match.end()
+        if token in _STRING_END_RE:
+            quote = token
+        elif token == "#":
+            return depth, "", False
+        elif token in ("(", "[", "{"):
+            depth += 1
+        elif token in (")", "]", "}"):
+            depth = max(depth - 1, 0)
+        else:
+            return depth, "", True
+
+
+def strip_magics(source: str) -> str:
+    """
+    Replace IPython syntax in a cell so that it parses as Python
+
+    Line magics, shell escapes (`!pip install x`, `files = !ls`) and
+    help requests that start a statement become `pass` at the same
+    indentation, so line numbers and blocks are kept. Cells run by a
+    cell magic other than a Python one (%%time...) become "".
+    """
+    if "\r" in source:
+        source = source.replace("\r\n", "\n").replace("\r", "\n")
+
+    lines = source.splitlines(keepends=True)
+    if lines:
+        match = _CELL_MAGIC_RE.match(lines[0])
+        if match is not None:
+            if match.group(1) not in PYTHON_CELL_MAGICS:
+                return ""
+            lines[0] = "\n"
+
+    depth, quote, continued = 0, "", False
+    for index, line in enumerate(lines):
+        if not (depth or quote or continued):
+            match = _MAGIC_LINE_RE.match(line)
+            if match is not None:
+                lines[index] = f"{match.group(1)}pass\n"
+                continue
+        depth, quote, continued = _scan_line(line, depth, quote)
+    return "".join(lines)
+
+
+def extract_notebook_import_lines(
+    stream: IO[bytes], engine: str = "ast", label: str = "notebook"
+) -> Dict[str, int]:
+    """
+    Map the imports of a notebook's code cells to the first line of each
+
+    Lines count through the code cells in order, as if they were one
+    script. A cell that does not parse is logged (as a syntax error in
+    label) and skipped; the other cells are still read.
+    """
+    logger = logging.getLogger("midna")
+    imports: Dict[str, int] = {}
+    offset = 0
+
+    for number, cell in enumerate(read_code_cells(stream), 1):
+        source = strip_magics(cell)
+        if "import" in source:
+            try:
+                with profiling.timer("parse"):
+                    found = extract_import_lines(source, engine)
+            except SyntaxError as e:
+                logger.warning(
+                    f"Syntax error in {label} (code cell {number}): {e}"
+                )
+                profiling.count("parse failures")
+                found = {}
+            for name, line in found.items():
+                if name not in imports:
+                    imports[name] = line + offset
+        offset += cell.count("\n") + (not cell.endswith("\n"))
+
+    return imports
@@ -1,21 +1,13 @@
 """Package classification for Midna"""
 
-import importlib.util
+import importlib
+import os
 import sys
-from pathlib import Path
-from typing import List, Set, Tuple
-
-try:
-    from importlib.metadata import distribution
-except ImportError:
-    from importlib_metadata import distribution  # type: ignore
-
-# Standard library modules in Python 3
-STDLIB_MODULES = {
-    name.split(".")[0]
-    for name in list(sys.builtin_module_names) + list(sys.modules)
-    if name.split(".")[0] not in {"test", "pip", "setuptools"}
-}
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .installed import get_installed_index
+
+_stdlib_modules: Optional[FrozenSet[str]] = None
 
 # Common test and internal modules to ignore
 IGNORED_MODULES = {
@@ -30,94 +22,190 @@ IGNORED_MODULES = {
 }
 
 
+def stdlib_modules() -> FrozenSet[str]:
+    """
+    Return the standard library module names, built on first use
+
+    This is a static table, so lookups never touch the filesystem or
+    depend on what happens to be imported already.
+    """
+    global _stdlib_modules
+    if _stdlib_modules is None:
+        if sys.version_info >= (3, 10):
+            names = frozenset(sys.stdlib_module_names)
+        else:
+            from ._stdlib_table import STDLIB_MODULE_NAMES as names
+        _stdlib_modules = names | frozenset(sys.builtin_module_names)
+    return _stdlib_modules
+
+
+def __getattr__(name: str) -> Any:
+    # STDLIB_MODULES used to be built at import time; keep it available
+    if name == "STDLIB_MODULES":
+        return stdlib_modules()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def is_stdlib_package(package_name: str) -> bool:
     """Check if a package is part of Python's standard library"""
-    # Check if it's in our known stdlib modules
-    if package_name in STDLIB_MODULES:
-        return True
+    return package_name in stdlib_modules()
 
-    # Check if it's a built-in module
-    if package_name in sys.builtin_module_names:
-        return True
 
-    # Check if it's in standard library paths
-    try:
-        spec = importlib.util.find_spec(package_name)
-        if spec and spec.origin:
-            return (
-                "stdlib" in str(spec.origin).lower()
-                or "python" in str(spec.origin).lower()
-            )
-    except (ImportError, AttributeError):
-        pass
+class ProjectModules:
+    """
+    Names of the top-level modules and packages a project defines
 
-    return False
+    Filled in by midna.discovery.iter_python_files during its walk (or by
+    scan_project_modules), so that telling project imports apart is a
+    set lookup: modules (.py and .pyi), regular and namespace (PEP 420)
+    packages at the project root or below src/, and the project root
+    itself if it is a package.
+    """
 
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self.names: Set[str] = set(names)
+
+    def add(self, name: str) -> None:
+        """Add a top-level file or directory name"""
+        if name.endswith((".py", ".pyi")):
+            name = name.rsplit(".", 1)[0]
+        if name.isidentifier():
+            self.names.add(name)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.names
+
+    def __len__(self) -> int:
+        return len(self.names)
 
-def is_project_package(package_name: str, project_root: str) -> bool:
-    """Check if a package is part of the current project"""
-    if package_name in IGNORED_MODULES:
-        return True
 
-    project_path = Path(project_root).resolve()
+# Project root -> its modules, for callers that did not walk the project
+_project_modules: Dict[str, ProjectModules] = {}
 
-    # Look for the package in different possible locations
-    possible_locations = [
-        project_path / package_name / "__init__.py",
-        project_path / f"{package_name}.py",
-        project_path.parent / package_name / "__init__.py",
-        project_path.parent / f"{package_name}.py",
-    ]
 
-    return any(loc.exists() for loc in possible_locations)
+def get_project_modules(project_root: str) -> ProjectModules:
+    """Return the modules a project defines, listed once per run"""
+    key = os.path.realpath(project_root)
+    modules = _project_modules.get(key)
+    if modules is None:
+        from .discovery import scan_project_modules
+
+        modules = _project_modules[key] = scan_project_modules(project_root)
+    return modules
+
+
+def invalidate_project_modules() -> None:
+    """Forget the listed project modules, e.g. after files were added"""
+    _project_modules.clear()
+
+
+def is_project_package(
+    package_name: str,
+    project_root: str,
+    project_modules: Optional[ProjectModules] = None,
+) -> bool:
+    """
+    Check if a package is part of the current project
+
+    project_modules defaults to the project root's listed modules.
+    """
+    if package_name in IGNORED_MODULES:
+        return True
+    if project_modules is None:
+        project_modules = get_project_modules(project_root)
+    return package_name in project_modules
 
 
 def get_package_version(package_name: str) -> str:
     """Get the installed version of a package"""
+    # Try the installed distribution index first
+    version = get_installed_index().version(package_name)
+    if version is not None:
+        return version
+
     try:
-        # Try getting version from importlib.metadata first
-        return str(distribution(package_name).version)
-    except ImportError:
-        try:
-            # Try importing the package and checking __version__
-            module = importlib.import_module(package_name)
-            if hasattr(module, "__version__"):
-                return str(module.__version__)
-            elif hasattr(module, "VERSION"):
-                return str(module.VERSION)
-        except (ImportError, AttributeError):
-            pass
+        # Try importing the package and checking __version__
+        module = importlib.import_module(package_name)
+        if hasattr(module, "__version__"):
+            return str(module.__version__)
+        elif hasattr(module, "VERSION"):
+            return str(module.VERSION)
+    except (ImportError, AttributeError):
+        pass
     return ""
 
 
+# Kinds returned by classify_package
+STDLIB = "stdlib"
+PROJECT = "project"
+THIRD_PARTY = "third_party"
+INVALID = "invalid"
+
+
+def classify_package(
+    package: str,
+    project_root: str,
+    project_modules: Optional[ProjectModules] = None,
+) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Classify a single imported package name
+
+    Returns (kind, distributions) where kind is one of STDLIB, PROJECT,
+    THIRD_PARTY or INVALID, and distributions lists the installed
+    (distribution_name, version) pairs providing a third-party import
+    (empty if it is not installed). project_modules is what the project
+    defines (see ProjectModules), listed from project_root if not given.
+    """
+    # Skip empty or invalid package names
+    if not package or package.startswith("."):
+        return INVALID, []
+
+    # Import names are case-sensitive (PIL), the checks below are not
+    top_level = package.split(".")[0]
+    base_package = top_level.lower()
+
+    if is_stdlib_package(base_package):
+        return STDLIB, []
+    if is_project_package(top_level, project_root, project_modules):
+        return PROJECT, []
+
+    # Map the import name to the distribution(s) that provide it,
+    # e.g. yaml -> PyYAML, falling back to a distribution that
+    # happens to share the import name
+    installed = get_installed_index()
+    distributions = installed.distributions_for(top_level)
+    if not distributions:
+        version = installed.version(base_package)
+        if version is not None:
+            distributions = [(base_package, version)]
+    return THIRD_PARTY, distributions
+
+
 def classify_packages(
-    packages: Set[str], project_root: str
+    packages: Set[str],
+    project_root: str,
+    project_modules: Optional[ProjectModules] = None,
 ) -> Tuple[List[str], List[str], List[Tuple[str, str]]]:
     """
     Classify packages into stdlib, project, and third-party packages
     Returns: (stdlib_packages, project_packages, third_party_packages)
-    third_party_packages is a list of (name, version) tuples
+    third_party_packages is a list of (distribution_name, version) tuples
     """
     stdlib_packages: List[str] = []
     project_packages: List[str] = []
     third_party_packages: List[Tuple[str, str]] = []
 
     for package in packages:
-        # Skip empty or invalid package names
-        if not package or package.startswith("."):
-            continue
-
-        # Normalize the package name
-        base_package = package.split(".")[0].lower()
-
-        if is_stdlib_package(base_package):
+        kind, distributions = classify_package(
+            package, project_root, project_modules
+        )
+        if kind == STDLIB:
             stdlib_packages.append(package)
-        elif is_project_package(base_package, project_root):
+        elif kind == PROJECT:
             project_packages.append(package)
         else:
-            version = get_package_version(base_package)
-            if version:  # Only include if it's an installed package
-                third_party_packages.append((base_package, version))
+            # Only include installed packages
+            third_party_packages.extend(distributions)
 
     return (
         sorted(set(stdlib_packages)),  # Remove duplicates
@@ -2,14 +2,20 @@
 
 import logging
 import os
+import re
 import sys
 from typing import List
 
+from .pep508 import InvalidRequirement, parse_requirement
+from .requirements import apply_constraints, load_requirements, strip_comment
+
 if sys.version_info >= (3, 11):
     from tomllib import load as _toml_load
 else:
     from tomli import load as _toml_load
 
+_EGG_RE = re.compile(r"#egg=([A-Za-z0-9][A-Za-z0-9._-]*)")
+
 
 def read_requirements(file_path: str) -> List[str]:
     """Read and parse requirements from a file"""
@@ -28,52 +34,17 @@ def read_requirements(file_path: str) -> List[str]:
             logger.warning(f"Failed to read {file_path}: {e}")
             # Fall back to treating it as a regular text file
 
-    # Handle regular requirements files
+    # Handle regular requirements files, with their -r and -c includes
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+        loaded = load_requirements(file_path)
     except Exception as e:
         logger.error(f"Error reading requirements file: {e}")
         raise
 
-    packages = []
-    for line_num, line in enumerate(lines, 1):
-        line = line.strip()
-
-        # Skip empty lines and comments
-        if not line or line.startswith("#"):
-            continue
-
-        # Handle -r includes (recursive requirements)
-        if line.startswith("-r "):
-            include_file = line[3:].strip()
-            if not os.path.isabs(include_file):
-                # Make relative path relative to current requirements file
-                include_file = os.path.join(
-                    os.path.dirname(file_path), include_file
-                )
-
-            logger.info(f"Found include: {include_file}")
-            try:
-                included_packages = read_requirements(include_file)
-                packages.extend(included_packages)
-            except FileNotFoundError:
-                logger.warning(f"Included file not found: {include_file}")
-                msg = (
-                    f"WARNING: Included requirements file not found: "
-                    f"{include_file}"
-                )
-                print(msg)
-            continue
-
-        # Skip other pip options
-        if line.startswith("-"):
-            logger.debug(f"Skipping pip option at line {line_num}: {line}")
-            continue
-
-        packages.append(line)
-        logger.debug(f"Added package: {line}")
+    for include_file in loaded.missing:
+        print(f"WARNING: Included requirements file not found: {include_file}")
 
+    packages = apply_constraints(loaded)
     logger.info(f"Found {len(packages)} packages in {file_path}")
     return packages
 
@@ -126,19 +97,17 @@ def parse_toml_requirements(file_path: str) -> List[str]:
 
 def parse_package_name(package_spec: str) -> str:
     """Extract package name from package specification"""
-    import re
+    package_spec = strip_comment(package_spec)
 
-    # Remove comments
-    if "#" in package_spec:
-        package_spec = package_spec.split("#")[0].strip()
-
-    # Extract package name (everything before version specifiers)
-    # Handle cases like: package>=1.0, package==1.0, package[extra]>=1.0
-    pattern = r"^([a-zA-Z0-9_-]+(?:\[[a-zA-Z0-9_,-]+\])?)"
-    match = re.match(pattern, package_spec)
-
-    if match:
-        return match.group(1).split("[")[0]  # Remove extras
+    try:
+        return parse_requirement(package_spec).name
+    except InvalidRequirement:
+        pass
+
+    # Not PEP 508: a URL or path, possibly naming its project with #egg=
+    egg = _EGG_RE.search(package_spec)
+    if egg:
+        return egg.group(1)
 
     # Fallback: split on common version specifiers
     for separator in [">=", "<=", "==", "!=", ">", "<", "~="]:
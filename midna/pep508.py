@@ -0,0 +1,137 @@
+"""PEP 508 requirement specifier parser for Midna"""
+
+import re
+from typing import Dict, Tuple
+
+from .installed import normalize_name
+
+# Parsed specs kept for reuse; the cache is dropped when it gets this big
+CACHE_SIZE = 65536
+
+_NAME = r"[A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?"
+_CLAUSE = r"(?:===|==|!=|<=|>=|~=|<|>)\s*[A-Za-z0-9_.*+!-]+"
+_CLAUSES = rf"{_CLAUSE}(?:\s*,\s*{_CLAUSE})*"
+
+# name [extras] (@ url | specifier) ; marker
+_REQUIREMENT_RE = re.compile(
+    rf"""
+    \s*(?P<name>{_NAME})
+    \s*(?:\[(?P<extras>[^\]]*)\])?
+    \s*(?:
+        @\s*(?P<url>\S+)(?:\s+;\s*(?P<url_marker>\S.*?))?
+      | (?:\(\s*(?P<parenthesized>{_CLAUSES})\s*\)|(?P<specifier>{_CLAUSES}))?
+        \s*(?:;\s*(?P<marker>\S.*?))?
+    )
+    \s*$
+    """,
+    re.VERBOSE,
+)
+_EXTRA_RE = re.compile(_NAME)
+_SPACE_RE = re.compile(r"\s+")
+
+
+class InvalidRequirement(ValueError):
+    """A requirement specifier that does not follow PEP 508"""
+
+
+class Requirement:
+    """
+    A parsed requirement specifier
+
+    Instances are shared between everyone who parses the same string and
+    must not be modified. specifier has its whitespace and parentheses
+    removed (">=2.0,<3"); url, marker and specifier are "" when absent.
+    """
+
+    __slots__ = ("name", "key", "extras", "specifier", "url", "marker")
+
+    def __init__(
+        self,
+        name: str,
+        extras: Tuple[str, ...] = (),
+        specifier: str = "",
+        url: str = "",
+        marker: str = "",
+    ) -> None:
+        self.name = name
+        # The PEP 503 normalized name, for comparing and looking up
+        self.key = normalize_name(name)
+        self.extras = extras
+        self.specifier = specifier
+        self.url = url
+        self.marker = marker
+
+    def __str__(self) -> str:
+        text = self.name
+        if self.extras:
+            text += f"[{','.join(self.extras)}]"
+        if self.url:
+            text += f" @ {self.url}"
+            if self.marker:
+                text += " "
+        else:
+            text += self.specifier
+        if self.marker:
+            text += f"; {self.marker}"
+        return text
+
+    def __repr__(self) -> str:
+        return f"Requirement({str(self)!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Requirement):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __hash__(self) -> int:
+        return hash(self._fields())
+
+    def _fields(self) -> Tuple[str, Tuple[str, ...], str, str, str]:
+        return (self.key, self.extras, self.specifier, self.url, self.marker)
+
+
+_cache: Dict[str, Requirement] = {}
+
+
+def parse_requirement(spec: str) -> Requirement:
+    """
+    Parse a PEP 508 requirement specifier such as "foo[bar]>=1.0; marker"
+
+    Results are memoized, so parsing the same string again is a dict
+    lookup. Raises InvalidRequirement if spec is not a valid specifier.
+    """
+    requirement = _cache.get(spec)
+    if requirement is not None:
+        return requirement
+
+    match = _REQUIREMENT_RE.match(spec)
+    if match is None:
+        raise InvalidRequirement(f"Invalid requirement: {spec!r}")
+    name, extras, url, url_marker, parenthesized, specifier, marker = (
+        match.groups()
+    )
+
+    extra_names: Tuple[str, ...] = ()
+    if extras is not None:
+        extra_names = tuple(e.strip() for e in extras.split(","))
+        if extra_names == ("",):
+            extra_names = ()
+        elif not all(_EXTRA_RE.fullmatch(e) for e in extra_names):
+            raise InvalidRequirement(f"Invalid extras: {spec!r}")
+
+    specifier = parenthesized or specifier or ""
+    if " " in specifier or "\t" in specifier:
+        specifier = _SPACE_RE.sub("", specifier)
+
+    requirement = Requirement(
+        name, extra_names, specifier, url or "", url_marker or marker or ""
+    )
+    if len(_cache) >= CACHE_SIZE:
+        _cache.clear()
+    _cache[spec] = requirement
+    return requirement
+
+
+def clear_cache() -> None:
+    """Forget every parsed specifier"""
+    _cache.clear()
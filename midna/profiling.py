@@ -0,0 +1,162 @@
+"""Phase timers and counters for Midna (--timings, --profile)"""
+
+import json
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Everything below is a no-op until enable() is called, so instrumented
+# code pays one global lookup per call when profiling is off
+_enabled = False
+
+# Timer name -> [seconds, calls]
+timings: Dict[str, list] = {}
+counters: Dict[str, float] = {}
+
+
+class _Timer:
+    """Adds the time spent in a with block to a named timer"""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        add_time(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    """Stand-in for _Timer while profiling is disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enable() -> None:
+    """Start recording timers and counters"""
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    """Stop recording (what was recorded so far is kept)"""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    """Check whether timers and counters are being recorded"""
+    return _enabled
+
+
+def reset() -> None:
+    """Forget all recorded timers and counters"""
+    timings.clear()
+    counters.clear()
+
+
+def timer(name: str) -> Any:
+    """Return a context manager that times its block under name"""
+    return _Timer(name) if _enabled else _NULL_TIMER
+
+
+def add_time(name: str, seconds: float, calls: int = 1) -> None:
+    """Add seconds (spent in calls calls) to a named timer"""
+    if _enabled:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += calls
+
+
+def count(name: str, value: float = 1) -> None:
+    """Add value to a named counter"""
+    if _enabled:
+        counters[name] = counters.get(name, 0) + value
+
+
+def timed_iter(name: str, iterable: Iterable[T]) -> Iterator[T]:
+    """Time how long iterable takes to produce its items (not their use)"""
+    if not _enabled:
+        return iter(iterable)
+    return _timed_iter(name, iter(iterable))
+
+
+def _timed_iter(name: str, iterator: Iterator[T]) -> Iterator[T]:
+    elapsed = 0.0
+    items = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+            items += 1
+            yield item
+    finally:
+        add_time(name, elapsed, items)
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return the recorded timers and counters as plain data"""
+    return {
+        "timings": {
+            name: {"seconds": round(seconds, 6), "calls": calls}
+            for name, (seconds, calls) in timings.items()
+        },
+        "counters": dict(counters),
+    }
+
+
+def merge(data: Dict[str, Any]) -> None:
+    """Add a snapshot (e.g. from a worker process) to the current totals"""
+    for name, entry in data.get("timings", {}).items():
+        add_time(name, entry["seconds"], entry["calls"])
+    for name, value in data.get("counters", {}).items():
+        count(name, value)
+
+
+def format_table(data: Optional[Dict[str, Any]] = None) -> str:
+    """Format a snapshot as a human-readable table"""
+    if data is None:
+        data = snapshot()
+
+    lines = [f"{'Phase':<28} {'Time (s)':>10} {'Calls':>8}"]
+    phases = sorted(
+        data["timings"].items(), key=lambda item: -item[1]["seconds"]
+    )
+    for name, entry in phases:
+        lines.append(
+            f"{name:<28} {entry['seconds']:>10.3f} {entry['calls']:>8}"
+        )
+
+    if data["counters"]:
+        lines.append("")
+        lines.append(f"{'Counter':<28} {'Value':>10}")
+        for name, value in sorted(data["counters"].items()):
+            lines.append(f"{name:<28} {value:>10g}")
+    return "\n".join(lines)
+
+
+def write_json(path: str, data: Optional[Dict[str, Any]] = None) -> None:
+    """Write a snapshot as JSON"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot() if data is None else data, f, indent=2)
+        f.write("\n")
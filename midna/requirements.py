@@ -0,0 +1,315 @@
+"""Requirements file graph loader for Midna
+
+Loads a requirements file together with everything it includes with
+-r (requirements) and -c (constraints). Each file is parsed once per
+process and reused while its mtime and size are unchanged, so a file
+included from many places (or loaded again later) costs one parse.
+Include cycles are reported instead of recursed into. Constraints are
+applied by adding their version specifiers to the requirements they
+name (see apply_constraints).
+"""
+
+import logging
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from .pep508 import InvalidRequirement, Requirement, parse_requirement
+
+# A comment starts at a # at the line start or after whitespace
+_COMMENT_RE = re.compile(r"(?:^|\s)#")
+
+# -r FILE, -rFILE, --requirement FILE, --requirement=FILE (same for -c)
+_INCLUDE_RE = re.compile(
+    r"(?:-(?P<short>[rc])|--(?P<long>requirement|constraint)[=\s])\s*(.+)"
+)
+
+
+class RequirementRecord:
+    """One requirement line and where it was found"""
+
+    __slots__ = ("requirement", "source", "line", "text")
+
+    def __init__(
+        self,
+        requirement: Optional[Requirement],
+        source: str = "",
+        line: int = 0,
+        text: str = "",
+    ) -> None:
+        # None for lines that are not PEP 508 specifiers (paths, URLs)
+        self.requirement = requirement
+        self.source = source
+        self.line = line
+        self.text = text
+
+    @property
+    def name(self) -> str:
+        return self.requirement.name if self.requirement else ""
+
+    @property
+    def specifier(self) -> str:
+        return self.requirement.specifier if self.requirement else ""
+
+    @property
+    def extras(self) -> Tuple[str, ...]:
+        return self.requirement.extras if self.requirement else ()
+
+    @property
+    def marker(self) -> str:
+        return self.requirement.marker if self.requirement else ""
+
+    def __repr__(self) -> str:
+        return (
+            f"RequirementRecord({self.text!r}, source={self.source!r}, "
+            f"line={self.line})"
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, RequirementRecord):
+            return NotImplemented
+        return all(
+            getattr(self, field) == getattr(other, field)
+            for field in self.__slots__
+        )
+
+
+class Include:
+    """A -r or -c line, with the path resolved against its file"""
+
+    __slots__ = ("path", "constraint", "line")
+
+    def __init__(self, path: str, constraint: bool, line: int) -> None:
+        self.path = path
+        self.constraint = constraint
+        self.line = line
+
+
+# A file's requirements and includes, in the order they appear
+Entries = List[Union[RequirementRecord, Include]]
+
+
+class LoadedRequirements:
+    """The result of load_requirements()"""
+
+    def __init__(self) -> None:
+        self.requirements: List[RequirementRecord] = []
+        self.constraints: List[RequirementRecord] = []
+        # Every file read, in the order first reached
+        self.files: List[str] = []
+        # Included files that do not exist
+        self.missing: List[str] = []
+        # Include chains that lead back to a file being read
+        self.cycles: List[List[str]] = []
+
+
+def parse_requirement_line(
+    text: str, source: str = "", line: int = 0
+) -> RequirementRecord:
+    """
+    Parse a requirement line from a requirements file
+
+    Per-requirement options such as --hash are ignored. Lines that are
+    not PEP 508 specifiers (paths, URLs) get no requirement; their text
+    is still available.
+    """
+    spec = text.split(" --", 1)[0] if " --" in text else text
+    try:
+        requirement: Optional[Requirement] = parse_requirement(spec)
+    except InvalidRequirement:
+        requirement = None
+    return RequirementRecord(requirement, source, line, text)
+
+
+def strip_comment(line: str) -> str:
+    """Remove a trailing # comment (a # inside a URL is not one)"""
+    if "#" in line:
+        return _COMMENT_RE.split(line, maxsplit=1)[0]
+    return line
+
+
+def _logical_lines(content: str) -> Iterator[Tuple[int, str]]:
+    """Yield (line number, line) with continuations joined, no comments"""
+    pending = ""
+    start = 0
+    for number, line in enumerate(content.splitlines(), 1):
+        if not pending:
+            start = number
+        if line.endswith("\\"):
+            pending += line[:-1]
+            continue
+        line = pending + line
+        pending = ""
+        line = strip_comment(line).strip()
+        if line:
+            yield start, line
+    if pending.strip():
+        yield start, pending.strip()
+
+
+def _parse_file(path: str, base: str) -> Entries:
+    """
+    Parse one requirements file, without following its includes
+
+    Included paths are resolved against the directory base.
+    """
+    logger = logging.getLogger("midna")
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    entries: Entries = []
+    for number, line in _logical_lines(content):
+        include = _INCLUDE_RE.fullmatch(line) if line[0] == "-" else None
+        if include:
+            kind = include.group("short") or include.group("long")[0]
+            target = include.group(3).strip()
+            if not os.path.isabs(target):
+                # Relative to the including file as it was named (not
+                # where a symlink to it points), as in pip
+                target = os.path.join(base, target)
+            entries.append(Include(target, kind == "c", number))
+        elif line.startswith("-"):
+            logger.debug(f"Skipping pip option at {path}:{number}: {line}")
+        else:
+            entries.append(parse_requirement_line(line, path, number))
+    return entries
+
+
+# (real path, include base) -> (mtime_ns, size, entries) of every file
+# parsed so far
+_parsed: Dict[Tuple[str, str], Tuple[int, int, Entries]] = {}
+
+
+def parse_requirements_file(path: str) -> Entries:
+    """
+    Return a file's requirements and includes, parsing it at most once
+
+    Includes are resolved against the directory of path as given, so a
+    file reached through symlinks in different directories is parsed
+    once per directory. The parse is reused while the file's mtime and
+    size are unchanged. Raises FileNotFoundError (or another OSError) if
+    it cannot be read.
+    """
+    real = os.path.realpath(path)
+    key = (real, os.path.dirname(path))
+    stat = os.stat(real)
+    cached = _parsed.get(key)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        entries = cached[2]
+    else:
+        entries = _parse_file(real, key[1])
+        _parsed[key] = (stat.st_mtime_ns, stat.st_size, entries)
+
+    if real == path:
+        return entries
+    # Report the path as it was given, not the resolved one
+    return [_with_source(entry, path) for entry in entries]
+
+
+def _with_source(
+    entry: Union[RequirementRecord, Include], path: str
+) -> Union[RequirementRecord, Include]:
+    if isinstance(entry, Include):
+        return entry
+    return RequirementRecord(entry.requirement, path, entry.line, entry.text)
+
+
+def clear_cache() -> None:
+    """Forget every parsed file"""
+    _parsed.clear()
+
+
+def load_requirements(path: str) -> LoadedRequirements:
+    """
+    Load a requirements file and everything it includes
+
+    Requirements from files reached only through -c end up in
+    constraints. A file reached twice (a diamond of includes) is read
+    once; an include that leads back to a file still being read is
+    recorded in cycles and skipped. Missing includes are recorded in
+    missing; a missing top-level file raises FileNotFoundError.
+    """
+    logger = logging.getLogger("midna")
+    result = LoadedRequirements()
+    reading: List[str] = []
+    done: Set[Tuple[str, bool]] = set()
+
+    def visit(file_path: str, constraint: bool, top: bool = False) -> None:
+        real = os.path.realpath(file_path)
+        if real in reading:
+            chain = reading[reading.index(real) :] + [real]
+            logger.warning(f"Requirements include cycle: {' -> '.join(chain)}")
+            result.cycles.append(chain)
+            return
+        if (real, constraint) in done:
+            return
+
+        try:
+            entries = parse_requirements_file(file_path)
+        except FileNotFoundError:
+            if top:
+                raise
+            logger.warning(f"Included file not found: {file_path}")
+            result.missing.append(file_path)
+            return
+
+        result.files.append(file_path)
+        reading.append(real)
+        for entry in entries:
+            if isinstance(entry, Include):
+                logger.info(f"Found include: {entry.path}")
+                visit(entry.path, constraint or entry.constraint)
+            elif constraint:
+                result.constraints.append(entry)
+            else:
+                result.requirements.append(entry)
+        reading.pop()
+        done.add((real, constraint))
+
+    visit(path, False, top=True)
+    return result
+
+
+def apply_constraints(loaded: LoadedRequirements) -> List[str]:
+    """
+    Return the requirement lines of loaded with its constraints applied
+
+    The version specifiers of constraints are added to the requirements
+    for the same project ("flask>=2" and "flask<3" give "flask>=2,<3"),
+    so that installs are pinned and checks compare against them. Like
+    in pip, constraints never add requirements. Constraints with a
+    marker or a URL, and requirements that are paths or URLs, are left
+    as they are.
+    """
+    specifiers: Dict[str, List[str]] = {}
+    for record in loaded.constraints:
+        constraint = record.requirement
+        if (
+            constraint is not None
+            and constraint.specifier
+            and not (constraint.marker or constraint.url)
+        ):
+            specifiers.setdefault(constraint.key, []).append(
+                constraint.specifier
+            )
+
+    lines: List[str] = []
+    for record in loaded.requirements:
+        requirement = record.requirement
+        extra = specifiers.get(requirement.key) if requirement else None
+        if requirement is None or requirement.url or not extra:
+            lines.append(record.text)
+            continue
+        clauses = [requirement.specifier] if requirement.specifier else []
+        line = str(
+            Requirement(
+                requirement.name,
+                requirement.extras,
+                ",".join(clauses + extra),
+                marker=requirement.marker,
+            )
+        )
+        # Keep per-requirement options such as --hash
+        _, options, rest = record.text.partition(" --")
+        lines.append(line + options + rest)
+    return lines
@@ -0,0 +1,253 @@
+"""Asynchronous subprocess runner for Midna's pip commands
+
+Output is read line by line as the command produces it, sent to the
+logger (and an optional callback, e.g. a ProgressLine) and dropped,
+except for a short stderr tail used in error messages. Commands are
+killed once they exceed their timeout, and run_all runs independent
+commands concurrently, at most `concurrency` at a time.
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional, Sequence, TextIO
+
+from . import profiling
+
+# Seconds a single pip command may run before it is killed
+PIP_TIMEOUT = 1800.0
+
+# Commands run at the same time by run_all
+CONCURRENCY = 4
+
+# Lines of stderr kept for error messages (all lines are logged)
+TAIL_LINES = 20
+
+# Exit codes reported for a killed or missing command, as in the shell
+TIMEOUT_EXIT_CODE = 124
+NOT_FOUND_EXIT_CODE = 127
+
+_READ_SIZE = 1 << 16
+
+# Called with ("stdout" or "stderr", line) for every line of output
+LineCallback = Callable[[str, str], None]
+
+
+class CommandResult:
+    """Exit status, kept output and duration of one command"""
+
+    __slots__ = (
+        "cmd",
+        "returncode",
+        "stdout",
+        "stderr_tail",
+        "elapsed",
+        "timed_out",
+    )
+
+    def __init__(self, cmd: Sequence[str]) -> None:
+        self.cmd = list(cmd)
+        self.returncode = 0
+        self.stdout = ""
+        self.stderr_tail: Deque[str] = deque(maxlen=TAIL_LINES)
+        self.elapsed = 0.0
+        self.timed_out = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    def error(self) -> str:
+        """Return the last line written to stderr, or the exit status"""
+        if self.timed_out:
+            return f"timed out after {self.elapsed:.0f}s"
+        for line in reversed(self.stderr_tail):
+            if line.strip():
+                return line.strip()
+        return f"exit code {self.returncode}"
+
+
+class ProgressLine:
+    """One status line rewritten in place on a terminal, silent elsewhere"""
+
+    WIDTH = 78
+
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream = sys.stdout if stream is None else stream
+        self.enabled = self.stream.isatty()
+        self._shown = 0
+
+    def update(self, text: str) -> None:
+        """Replace the status line with text"""
+        if not self.enabled:
+            return
+        text = text[: self.WIDTH]
+        self.stream.write("\r" + text.ljust(self._shown))
+        self.stream.flush()
+        self._shown = len(text)
+
+    def pip_line(self, stream: str, line: str) -> None:
+        """LineCallback showing each non-empty output line"""
+        if line.strip():
+            self.update(f"  {line.strip()}")
+
+    def close(self) -> None:
+        """Erase the status line"""
+        if self._shown:
+            self.stream.write("\r" + " " * self._shown + "\r")
+            self.stream.flush()
+            self._shown = 0
+
+
+async def _pump(
+    stream: Optional[asyncio.StreamReader],
+    name: str,
+    result: CommandResult,
+    on_line: Optional[LineCallback],
+    keep: bool,
+) -> None:
+    """Read a pipe to the end, handling one line at a time"""
+    if stream is None:
+        return
+    logger = logging.getLogger("midna")
+    kept: List[str] = []
+
+    def emit(raw: bytes) -> None:
+        line = raw.decode("utf-8", "replace").rstrip("\r")
+        logger.debug(f"{result.cmd[0]} {name}: {line}")
+        if on_line is not None:
+            on_line(name, line)
+        if name == "stderr":
+            result.stderr_tail.append(line)
+        elif keep:
+            kept.append(line)
+
+    # Split lines ourselves so that no line is too long to read
+    pending = bytearray()
+    while True:
+        chunk = await stream.read(_READ_SIZE)
+        if not chunk:
+            break
+        pending += chunk
+        end = pending.rfind(b"\n")
+        if end == -1:
+            continue
+        for raw in bytes(pending[:end]).split(b"\n"):
+            emit(raw)
+        del pending[: end + 1]
+    if pending:
+        emit(bytes(pending))
+    if keep:
+        result.stdout = "\n".join(kept)
+
+
+async def _run(
+    result: CommandResult,
+    timeout: Optional[float],
+    on_line: Optional[LineCallback],
+    keep_stdout: bool,
+) -> None:
+    logger = logging.getLogger("midna")
+    logger.debug(f"Running command: {' '.join(result.cmd)}")
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *result.cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except OSError as e:
+        result.returncode = NOT_FOUND_EXIT_CODE
+        result.stderr_tail.append(f"Cannot run {result.cmd[0]}: {e}")
+        return
+
+    async def finish() -> int:
+        await asyncio.gather(
+            _pump(process.stdout, "stdout", result, on_line, keep_stdout),
+            _pump(process.stderr, "stderr", result, on_line, False),
+        )
+        return await process.wait()
+
+    try:
+        result.returncode = await asyncio.wait_for(finish(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Killed after {timeout:g}s: {' '.join(result.cmd)}")
+        result.timed_out = True
+        result.returncode = TIMEOUT_EXIT_CODE
+    finally:
+        # Also reached when cancelled (Ctrl+C): never leave pip running
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+
+async def run_command(
+    cmd: Sequence[str],
+    timeout: Optional[float] = PIP_TIMEOUT,
+    on_line: Optional[LineCallback] = None,
+    keep_stdout: bool = False,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> CommandResult:
+    """
+    Run cmd, streaming its output, and return its result
+
+    stdout is only kept (in result.stdout) with keep_stdout. A command
+    still running after timeout seconds is killed and reported with
+    TIMEOUT_EXIT_CODE. With semaphore, waits for a free slot first.
+    """
+    result = CommandResult(cmd)
+    start = time.perf_counter()
+    try:
+        if semaphore is None:
+            await _run(result, timeout, on_line, keep_stdout)
+        else:
+            async with semaphore:
+                start = time.perf_counter()
+                await _run(result, timeout, on_line, keep_stdout)
+    finally:
+        result.elapsed = time.perf_counter() - start
+        profiling.add_time("subprocess", result.elapsed)
+    return result
+
+
+def run(
+    cmd: Sequence[str],
+    timeout: Optional[float] = PIP_TIMEOUT,
+    on_line: Optional[LineCallback] = None,
+    keep_stdout: bool = False,
+) -> CommandResult:
+    """Run one command to completion (see run_command)"""
+    return asyncio.run(run_command(cmd, timeout, on_line, keep_stdout))
+
+
+def run_all(
+    cmds: Sequence[Sequence[str]],
+    concurrency: int = CONCURRENCY,
+    timeout: Optional[float] = PIP_TIMEOUT,
+    on_done: Optional[Callable[[CommandResult], None]] = None,
+) -> List[CommandResult]:
+    """
+    Run independent commands concurrently, returning results in order
+
+    At most concurrency commands run at a time; on_done is called as
+    each one finishes.
+    """
+
+    async def run_one(
+        cmd: Sequence[str], semaphore: asyncio.Semaphore
+    ) -> CommandResult:
+        result = await run_command(cmd, timeout, semaphore=semaphore)
+        if on_done is not None:
+            on_done(result)
+        return result
+
+    async def main() -> List[CommandResult]:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        return list(
+            await asyncio.gather(*(run_one(cmd, semaphore) for cmd in cmds))
+        )
+
+    return asyncio.run(main())
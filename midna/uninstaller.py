@@ -1,13 +1,19 @@
 """Package uninstaller for Midna"""
 
 import logging
-import subprocess
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
+from . import runner
+from .installed import get_installed_index, invalidate_installed_index
 from .parser import parse_package_name, read_requirements
+from .runner import PIP_TIMEOUT, ProgressLine
 
 
-def uninstall_packages(requirements_file: str, dry_run: bool = False) -> int:
+def uninstall_packages(
+    requirements_file: str,
+    dry_run: bool = False,
+    timeout: Optional[float] = PIP_TIMEOUT,
+) -> int:
     """Uninstall packages from a requirements file using pip"""
     logger = logging.getLogger("midna")
 
@@ -20,10 +26,14 @@ def uninstall_packages(requirements_file: str, dry_run: bool = False) -> int:
 
     # Only uninstall packages that are actually installed
     found_packages, _ = _check_package_list_to_uninstall(packages)
-    return _uninstall_package_list(found_packages, dry_run)
+    return _uninstall_package_list(found_packages, dry_run, timeout)
 
 
-def _uninstall_package_list(packages: List[str], dry_run: bool = False) -> int:
+def _uninstall_package_list(
+    packages: List[str],
+    dry_run: bool = False,
+    timeout: Optional[float] = PIP_TIMEOUT,
+) -> int:
     """Internal function to uninstall a list of packages"""
     logger = logging.getLogger("midna")
 
@@ -50,25 +60,35 @@ def _uninstall_package_list(packages: List[str], dry_run: bool = False) -> int:
 
     # Uninstall packages
     cmd = ["pip", "uninstall", "-y"] + package_names
-    logger.debug(f"Running command: {' '.join(cmd)}")
 
-    try:
-        result = subprocess.run(
-            cmd, check=True, capture_output=True, shell=False
-        )
-        logger.info("Uninstallation completed successfully")
-        print("Uninstallation completed successfully!")
-        return result.returncode
-
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Uninstallation failed with exit code {e.returncode}")
-        print(f"ERROR: Uninstallation failed with exit code {e.returncode}")
-        return e.returncode
+    # pip is about to change the environment, even if it fails halfway
+    invalidate_installed_index()
 
+    progress = ProgressLine()
+    try:
+        result = runner.run(cmd, timeout, progress.pip_line)
     except KeyboardInterrupt:
         logger.warning("Uninstallation interrupted by user")
         print("\nWARNING: Uninstallation interrupted by user")
         return 130
+    finally:
+        progress.close()
+
+    if result.timed_out:
+        logger.error(f"Uninstallation timed out after {timeout:g} seconds")
+        print(f"ERROR: Uninstallation timed out after {timeout:g} seconds")
+    elif not result.ok:
+        logger.error(
+            f"Uninstallation failed with exit code {result.returncode}: "
+            f"{result.error()}"
+        )
+        print(
+            f"ERROR: Uninstallation failed with exit code {result.returncode}"
+        )
+    else:
+        logger.info("Uninstallation completed successfully")
+        print("Uninstallation completed successfully!")
+    return result.returncode
 
 
 def check_packages_to_uninstall(
@@ -93,40 +113,14 @@ def _check_package_list_to_uninstall(
     """Check which packages in a list are installed."""
     logger = logging.getLogger("midna")
 
-    try:
-        # Get list of installed packages
-        result = subprocess.run(
-            ["pip", "list", "--format=freeze"],
-            capture_output=True,
-            text=True,
-            check=True,
-            shell=False,
-        )
-
-        installed_raw = (
-            result.stdout.strip().split("\n") if result.stdout.strip() else []
-        )
-        installed_packages = set()
-
-        for package in installed_raw:
-            if "==" in package:
-                name = package.split("==")[0].lower()
-                installed_packages.add(name)
-
-        logger.debug(f"Found {len(installed_packages)} installed packages")
-
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to get installed packages: {e}")
-        print("ERROR: Failed to check installed packages")
-        raise
+    installed = get_installed_index()
+    logger.debug(f"Found {len(installed)} installed packages")
 
     found_packages = []
     not_found_packages = []
 
     for package in packages:
-        package_name = parse_package_name(package).lower()
-
-        if package_name in installed_packages:
+        if parse_package_name(package) in installed:
             found_packages.append(package)
             logger.debug(f"Found for uninstall: {package}")
         else:
@@ -0,0 +1,250 @@
+"""PEP 440 versions and specifiers for Midna
+
+Enough of PEP 440 to decide whether an installed version satisfies a
+requirement's specifier, without depending on packaging. Parsed versions
+and specifiers are memoized, since the same strings come up for every
+check.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+_VERSION_RE = re.compile(
+    r"""
+    v?
+    (?:(?P<epoch>[0-9]+)!)?
+    (?P<release>[0-9]+(?:\.[0-9]+)*)
+    (?:
+        [-_.]?(?P<pre_l>a|b|c|rc|alpha|beta|pre|preview)
+        [-_.]?(?P<pre_n>[0-9]+)?
+    )?
+    (?:
+        -(?P<post_n1>[0-9]+)
+      | [-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>[0-9]+)?
+    )?
+    (?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>[0-9]+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+_CLAUSE_RE = re.compile(r"\s*(===|==|!=|<=|>=|~=|<|>)\s*([^,\s]+)\s*")
+
+_PRE_RANK = {"a": 1, "alpha": 1, "b": 2, "beta": 2}  # everything else: rc
+
+# Sorts after every int, for versions without a dev part
+_INFINITY = float("inf")
+
+LocalPart = Tuple[int, int, str]
+
+
+class InvalidVersion(ValueError):
+    """A version string that does not follow PEP 440"""
+
+
+class Version:
+    """A parsed PEP 440 version, ordered as PEP 440 orders them"""
+
+    __slots__ = ("epoch", "release", "pre", "post", "dev", "local", "key")
+
+    def __init__(self, text: str) -> None:
+        match = _VERSION_RE.fullmatch(text.strip())
+        if match is None:
+            raise InvalidVersion(f"Invalid version: {text!r}")
+
+        self.epoch = int(match.group("epoch") or 0)
+        release = match.group("release").split(".")
+        self.release = tuple(int(part) for part in release)
+
+        # (rank, number): 1 alpha, 2 beta, 3 release candidate
+        pre_l = match.group("pre_l")
+        self.pre: Optional[Tuple[int, int]] = None
+        if pre_l:
+            rank = _PRE_RANK.get(pre_l.lower(), 3)
+            self.pre = (rank, int(match.group("pre_n") or 0))
+
+        post = match.group("post_n1") or match.group("post_n2")
+        has_post = post is not None or match.group("post_l") is not None
+        self.post: Optional[int] = int(post or 0) if has_post else None
+
+        has_dev = match.group("dev_l") is not None
+        self.dev: Optional[int] = (
+            int(match.group("dev_n") or 0) if has_dev else None
+        )
+
+        local = match.group("local")
+        self.local: Tuple[str, ...] = (
+            tuple(re.split(r"[-_.]", local.lower())) if local else ()
+        )
+        self.key = self._key()
+
+    def _key(self) -> Tuple[object, ...]:
+        release = list(self.release)
+        while len(release) > 1 and release[-1] == 0:
+            release.pop()
+
+        # 1.0.dev0 < 1.0a1 < 1.0 < 1.0.post1
+        if self.pre is not None:
+            pre = self.pre
+        elif self.post is None and self.dev is not None:
+            pre = (0, 0)
+        else:
+            pre = (4, 0)
+        post = -1 if self.post is None else self.post
+        dev = _INFINITY if self.dev is None else self.dev
+        # Numeric local parts sort after alphanumeric ones
+        local: List[LocalPart] = [
+            (1, int(part), "") if part.isdigit() else (0, 0, part)
+            for part in self.local
+        ]
+        return (self.epoch, tuple(release), pre, post, dev, tuple(local))
+
+    @property
+    def public(self) -> "Version":
+        """The version without its local part"""
+        if not self.local:
+            return self
+        text = str(self)
+        return parse_version(text.split("+", 1)[0])
+
+    @property
+    def is_prerelease(self) -> bool:
+        return self.pre is not None or self.dev is not None
+
+    def __str__(self) -> str:
+        text = f"{self.epoch}!" if self.epoch else ""
+        text += ".".join(str(p) for p in self.release)
+        if self.pre is not None:
+            text += ("a", "b", "rc")[self.pre[0] - 1] + str(self.pre[1])
+        if self.post is not None:
+            text += f".post{self.post}"
+        if self.dev is not None:
+            text += f".dev{self.dev}"
+        if self.local:
+            text += "+" + ".".join(self.local)
+        return text
+
+    def __repr__(self) -> str:
+        return f"Version({str(self)!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __lt__(self, other: "Version") -> bool:
+        return self.key < other.key
+
+    def __le__(self, other: "Version") -> bool:
+        return self.key <= other.key
+
+    def __gt__(self, other: "Version") -> bool:
+        return self.key > other.key
+
+    def __ge__(self, other: "Version") -> bool:
+        return self.key >= other.key
+
+
+_versions: Dict[str, Version] = {}
+
+
+def parse_version(text: str) -> Version:
+    """Parse a PEP 440 version, raising InvalidVersion if it is not one"""
+    version = _versions.get(text)
+    if version is None:
+        version = _versions[text] = Version(text)
+    return version
+
+
+# (operator, version text) pairs of a specifier such as ">=1.0,<2"
+Clauses = Tuple[Tuple[str, str], ...]
+
+_specifiers: Dict[str, Clauses] = {}
+
+
+def parse_specifier(specifier: str) -> Clauses:
+    """Split a specifier into (operator, version) clauses, memoized"""
+    clauses = _specifiers.get(specifier)
+    if clauses is not None:
+        return clauses
+
+    parsed = []
+    for clause in specifier.split(","):
+        if not clause.strip():
+            continue
+        match = _CLAUSE_RE.fullmatch(clause)
+        if match is None:
+            raise InvalidVersion(f"Invalid specifier: {specifier!r}")
+        parsed.append((match.group(1), match.group(2)))
+    clauses = _specifiers[specifier] = tuple(parsed)
+    return clauses
+
+
+def _prefix_match(version: Version, prefix: str) -> bool:
+    """Whether version matches a "==1.2.*" style prefix"""
+    spec = parse_version(prefix)
+    if version.epoch != spec.epoch:
+        return False
+    length = len(spec.release)
+    release = version.release + (0,) * (length - len(version.release))
+    if release[:length] != spec.release:
+        return False
+    # ==1.0rc1.* style prefixes also fix the pre-release part
+    return spec.pre is None or version.pre == spec.pre
+
+
+def _same_release(version: Version, spec: Version) -> bool:
+    """Whether two versions share epoch and release (1.0 == 1.0.0)"""
+    return version.key[:2] == spec.key[:2]
+
+
+def _clause_contains(version: Version, operator: str, text: str) -> bool:
+    if operator == "===":
+        return str(version) == text
+    if operator in ("==", "!=") and text.endswith(".*"):
+        matched = _prefix_match(version, text[:-2])
+        return matched if operator == "==" else not matched
+
+    spec = parse_version(text)
+    if operator in ("==", "!="):
+        # Without a local part in the specifier, the local part is ignored
+        candidate = version if spec.local else version.public
+        return (candidate == spec) == (operator == "==")
+    if operator == "~=":
+        prefix = ".".join(str(p) for p in spec.release[:-1])
+        if spec.epoch:
+            prefix = f"{spec.epoch}!{prefix}"
+        return version >= spec and _prefix_match(version, prefix)
+    if operator == ">=":
+        return version.public >= spec
+    if operator == "<=":
+        return version.public <= spec
+    if operator == ">":
+        if not version.public > spec:
+            return False
+        # >1.7 does not match 1.7.post1 (unless asked for a post-release)
+        post = version.post is not None and spec.post is None
+        return not (post and _same_release(version, spec))
+    # operator == "<"
+    if not version.public < spec:
+        return False
+    # <3 does not match 3.0a1 (unless asked for a pre-release)
+    pre = version.is_prerelease and not spec.is_prerelease
+    return not (pre and _same_release(version, spec))
+
+
+def satisfies(version: Union[str, Version], specifier: str) -> bool:
+    """
+    Whether an installed version is allowed by a specifier
+
+    Pre-releases are accepted, as pip does for installed versions.
+    Raises InvalidVersion if the version or specifier is not PEP 440.
+    """
+    if isinstance(version, str):
+        version = parse_version(version)
+    return all(
+        _clause_contains(version, operator, text)
+        for operator, text in parse_specifier(specifier)
+    )
@@ -0,0 +1,459 @@
+"""Watch mode for Midna - keep a project's imports warm and answer queries
+
+`midna watch` scans the project once, then keeps the per-file import
+map and the installed distribution index in memory. Changed files are
+re-parsed as they change (found by polling mtimes, or via inotify when
+the optional inotify_simple package is installed). Queries such as
+"what's missing?" are answered over a Unix socket without rescanning:
+
+    midna watch &
+    midna query missing
+"""
+
+import json
+import logging
+import os
+import time
+from argparse import ArgumentParser
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .discovery import extract_imports_from_file, iter_python_files
+from .ignore import PathFilter
+from .import_index import ImportIndex
+from .installed import (
+    default_search_paths,
+    environment_fingerprint,
+    get_installed_index,
+    invalidate_installed_index,
+)
+from .package_classifier import (
+    THIRD_PARTY,
+    ProjectModules,
+    classify_package,
+)
+
+try:
+    from inotify_simple import INotify, flags  # type: ignore
+except ImportError:
+    INotify = None
+
+# Socket location, relative to the watched project root
+SOCKET_PATH = os.path.join(".midna", "watch.sock")
+
+# Seconds between mtime polls (with inotify: between index checks)
+POLL_INTERVAL = 1.0
+
+# With inotify, a full rescan still runs every this many intervals to
+# catch directories that were not being watched yet
+INOTIFY_RESCAN_INTERVALS = 30
+
+QUERIES = ("missing", "packages", "imports", "status", "stop")
+
+# Largest request accepted from a client
+MAX_REQUEST = 1 << 16
+
+
+class ProjectState:
+    """
+    In-memory import map of a project, updated incrementally
+
+    files maps each Python file to the (mtime_ns, size) it had when its
+    imports (kept in index) were extracted; refresh() only re-parses
+    files whose signature changed.
+    """
+
+    def __init__(
+        self,
+        directory: str = ".",
+        engine: str = "ast",
+        path_filter: Optional[PathFilter] = None,
+    ) -> None:
+        self.directory = directory
+        self.engine = engine
+        self.path_filter = path_filter
+        self.files: Dict[str, Tuple[int, int]] = {}
+        self.index = ImportIndex()
+        self.project_modules = ProjectModules()
+        self.refreshes = 0
+        self.parsed = 0
+        self.started = time.time()
+        self._classified: Dict[str, Tuple[str, List[Tuple[str, str]]]] = {}
+        self._index_fingerprint: Optional[Dict[str, object]] = None
+
+    def refresh(self) -> int:
+        """Re-parse new and changed files, forget deleted ones"""
+        logger = logging.getLogger("midna")
+        seen: Dict[str, Tuple[int, int]] = {}
+        changed = 0
+        modules = ProjectModules()
+
+        for file_path in iter_python_files(
+            self.directory, self.path_filter, modules
+        ):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            seen[file_path] = signature
+            if self.files.get(file_path) != signature:
+                self.index.add(
+                    file_path,
+                    extract_imports_from_file(file_path, self.engine),
+                )
+                changed += 1
+
+        for file_path in self.files.keys() - seen.keys():
+            self.index.remove(file_path)
+            changed += 1
+
+        self.files = seen
+        if modules.names != self.project_modules.names:
+            # A project module appeared or went away
+            self.project_modules = modules
+            self._classified.clear()
+        self.refreshes += 1
+        self.parsed += changed
+        if changed:
+            logger.info(f"Updated imports for {changed} changed files")
+        self.refresh_index()
+        if changed:
+            self._classified.clear()
+        return changed
+
+    def refresh_index(self) -> bool:
+        """Rebuild the installed index if site-packages changed"""
+        fingerprint = environment_fingerprint(default_search_paths())
+        if fingerprint == self._index_fingerprint:
+            return False
+
+        if self._index_fingerprint is not None:
+            logging.getLogger("midna").info("Installed packages changed")
+        self._index_fingerprint = fingerprint
+        invalidate_installed_index()
+        get_installed_index()
+        self._classified.clear()
+        return True
+
+    def all_imports(self) -> Set[str]:
+        """Return every import in the project"""
+        return self.index.modules()
+
+    def classified(self) -> Dict[str, Tuple[str, List[Tuple[str, str]]]]:
+        """Classify every import, reusing results until something changes"""
+        for name in self.all_imports():
+            if name not in self._classified and not name.startswith("_"):
+                self._classified[name] = classify_package(
+                    name, self.directory, self.project_modules
+                )
+        return self._classified
+
+    def query(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer a client request"""
+        query = request.get("query")
+        if request.get("refresh"):
+            self.refresh()
+
+        if query == "missing":
+            missing = {
+                name
+                for name, (kind, distributions) in self.classified().items()
+                if kind == THIRD_PARTY and not distributions
+            }
+            return {
+                "missing": {
+                    name: sorted(
+                        os.path.relpath(path, self.directory)
+                        for path in self.index.files_importing(name)
+                    )
+                    for name in sorted(missing)
+                }
+            }
+        if query == "packages":
+            packages = {
+                package
+                for kind, distributions in self.classified().values()
+                for package in distributions
+            }
+            return {"packages": sorted(packages)}
+        if query == "imports":
+            return {"imports": sorted(self.all_imports())}
+        if query == "status":
+            return {
+                "directory": os.path.abspath(self.directory),
+                "files": len(self.files),
+                "refreshes": self.refreshes,
+                "parsed": self.parsed,
+                "uptime": round(time.time() - self.started, 3),
+            }
+        return {"error": f"Unknown query: {query!r}"}
+
+
+def _read_request(conn: Any) -> Dict[str, Any]:
+    """Read one newline-terminated JSON request from a connection"""
+    data = b""
+    while not data.endswith(b"\n") and len(data) < MAX_REQUEST:
+        block = conn.recv(4096)
+        if not block:
+            break
+        data += block
+    request = json.loads(data.decode("utf-8") or "{}")
+    if not isinstance(request, dict):
+        raise ValueError("request must be a JSON object")
+    return request
+
+
+def _watched_dirs(state: ProjectState) -> Set[str]:
+    """Directories holding the project's Python files, and their parents"""
+    root = os.path.normpath(state.directory)
+    dirs = {root}
+    for file_path in state.files:
+        directory = os.path.dirname(file_path)
+        while directory not in dirs and len(directory) > len(root):
+            dirs.add(directory)
+            directory = os.path.dirname(directory)
+    return dirs
+
+
+def serve(
+    state: ProjectState,
+    socket_path: str = SOCKET_PATH,
+    interval: float = POLL_INTERVAL,
+) -> None:
+    """Answer queries on socket_path until a "stop" query arrives"""
+    import selectors
+    import socket
+
+    logger = logging.getLogger("midna")
+
+    if os.path.exists(socket_path):
+        try:
+            send_query("status", socket_path, timeout=1.0)
+        except OSError:
+            os.unlink(socket_path)  # left behind by a crashed watcher
+        else:
+            raise RuntimeError(f"Already watching (socket {socket_path})")
+
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    server.setblocking(False)
+
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ, "client")
+
+    notifier = None
+    watched: Set[str] = set()
+    mask = 0
+    if INotify is not None:
+        notifier = INotify()
+        mask = (
+            flags.CREATE
+            | flags.MODIFY
+            | flags.CLOSE_WRITE
+            | flags.DELETE
+            | flags.MOVED_FROM
+            | flags.MOVED_TO
+        )
+        selector.register(notifier.fd, selectors.EVENT_READ, "inotify")
+        logger.info("Watching for changes with inotify")
+
+    def watch_new_dirs() -> None:
+        if notifier is None:
+            return
+        for directory in _watched_dirs(state) - watched:
+            try:
+                notifier.add_watch(directory, mask)
+            except OSError as e:
+                logger.debug(f"Cannot watch {directory}: {e}")
+            watched.add(directory)
+
+    watch_new_dirs()
+    ticks = 0
+    running = True
+    try:
+        while running:
+            dirty = False
+            for key, _ in selector.select(interval):
+                if key.data == "inotify":
+                    assert notifier is not None
+                    notifier.read(timeout=0)
+                    dirty = True
+                    continue
+
+                conn, _ = server.accept()
+                with conn:
+                    conn.setblocking(True)
+                    conn.settimeout(5.0)
+                    try:
+                        request = _read_request(conn)
+                        if request.get("query") == "stop":
+                            running = False
+                            response: Dict[str, Any] = {"stopped": True}
+                        else:
+                            start = time.perf_counter()
+                            response = state.query(request)
+                            elapsed = time.perf_counter() - start
+                            response["elapsed_ms"] = round(elapsed * 1e3, 3)
+                    except (OSError, ValueError) as e:
+                        response = {"error": str(e)}
+                    try:
+                        conn.sendall(json.dumps(response).encode() + b"\n")
+                    except OSError as e:
+                        logger.debug(f"Client went away: {e}")
+
+            ticks += 1
+            if notifier is None or ticks % INOTIFY_RESCAN_INTERVALS == 0:
+                dirty = True
+            if dirty:
+                state.refresh()
+                watch_new_dirs()
+            else:
+                state.refresh_index()
+    finally:
+        selector.close()
+        server.close()
+        if notifier is not None:
+            notifier.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+
+
+def send_query(
+    query: str,
+    socket_path: str = SOCKET_PATH,
+    refresh: bool = False,
+    timeout: float = 5.0,
+) -> Dict[str, Any]:
+    """Send a query to a running watcher and return its response"""
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        request = {"query": query, "refresh": refresh}
+        client.sendall(json.dumps(request).encode() + b"\n")
+        data = b""
+        while not data.endswith(b"\n"):
+            block = client.recv(65536)
+            if not block:
+                break
+            data += block
+    response: Dict[str, Any] = json.loads(data.decode("utf-8"))
+    return response
+
+
+def _add_socket_option(parser: ArgumentParser) -> None:
+    parser.add_argument(
+        "--socket",
+        default=SOCKET_PATH,
+        help=f"Socket path (default: {SOCKET_PATH})",
+        metavar="PATH",
+    )
+
+
+def main(argv: List[str]) -> int:
+    """Entry point for `midna watch`"""
+    from .logger import setup_logging
+
+    parser = ArgumentParser(
+        prog="midna watch",
+        description=(
+            "Keep the project's imports in memory, update them as files "
+            "change and answer `midna query` requests."
+        ),
+    )
+    _add_socket_option(parser)
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=POLL_INTERVAL,
+        help=f"Seconds between checks (default: {POLL_INTERVAL})",
+        metavar="S",
+    )
+    parser.add_argument(
+        "--engine", choices=["ast", "fast", "pyc"], default="ast"
+    )
+    parser.add_argument("--include", action="append", default=[])
+    parser.add_argument("--exclude", action="append", default=[])
+    parser.add_argument("--no-ignore", action="store_true")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    args = parser.parse_args(argv)
+
+    setup_logging(args.verbose)
+    state = ProjectState(
+        ".",
+        engine=args.engine,
+        path_filter=PathFilter(
+            include=args.include,
+            exclude=args.exclude,
+            use_ignore_files=not args.no_ignore,
+        ),
+    )
+    state.refresh()
+    print(
+        f"Watching {len(state.files)} Python files, "
+        f"listening on {args.socket}",
+        flush=True,
+    )
+
+    try:
+        serve(state, args.socket, args.interval)
+    except KeyboardInterrupt:
+        pass
+    except (OSError, RuntimeError) as e:
+        print(f"ERROR: {e}")
+        return 1
+    print("Stopped watching")
+    return 0
+
+
+def query_main(argv: List[str]) -> int:
+    """Entry point for `midna query`"""
+    parser = ArgumentParser(
+        prog="midna query", description="Ask a running `midna watch`."
+    )
+    parser.add_argument("query", choices=QUERIES)
+    _add_socket_option(parser)
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Rescan changed files before answering",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the raw JSON response"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        response = send_query(args.query, args.socket, args.refresh)
+    except OSError as e:
+        print(f"ERROR: No watcher on {args.socket} ({e})")
+        print("Tip: start one with 'midna watch'")
+        return 2
+
+    if args.json or "error" in response:
+        print(json.dumps(response, indent=2))
+        return 1 if "error" in response else 0
+
+    if args.query == "missing":
+        missing = response["missing"]
+        for name, files in missing.items():
+            print(f"  - {name} (imported by {', '.join(files)})")
+        if not missing:
+            print("No missing packages")
+        # Non-zero exit lets pre-commit hooks fail on missing packages
+        return 1 if missing else 0
+    if args.query == "packages":
+        for name, version in response["packages"]:
+            print(f"  + {name}=={version}" if version else f"  + {name}")
+    elif args.query == "imports":
+        for name in response["imports"]:
+            print(name)
+    else:
+        for field, value in response.items():
+            print(f"{field}: {value}")
+    return 0
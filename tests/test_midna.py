@@ -1,13 +1,45 @@
 import os
+import shutil
 import subprocess
 import sys
+import tarfile
 import tempfile
+import time
 import unittest
 import unittest.mock
 import importlib.metadata
-from unittest.mock import Mock
+import importlib.util
+import io
+import py_compile
+import json
+import sysconfig
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-from midna import checker, installer, parser, uninstaller
+from midna import (
+    archives,
+    bytecode,
+    cache,
+    checker,
+    discovery,
+    environments,
+    explain,
+    extractors,
+    ignore,
+    import_index,
+    incremental,
+    installed,
+    installer,
+    notebooks,
+    package_classifier,
+    parser,
+    pep508,
+    profiling,
+    requirements,
+    runner,
+    uninstaller,
+    versions,
+    watch,
+)
 
 
 class TestMidnaFunctionality(unittest.TestCase):
@@ -47,6 +79,17 @@ class TestMidnaFunctionality(unittest.TestCase):
         self.assertEqual(parser.parse_package_name("pandas"), "pandas")
         self.assertEqual(parser.parse_package_name("scipy<=1.5.0"), "scipy")
 
+    def test_parse_package_name_markers_and_urls(self) -> None:
+        names = {
+            "zope.interface>=5": "zope.interface",
+            'pywin32; sys_platform == "win32"': "pywin32",
+            "pip @ https://example.invalid/pip.zip#sha1=abc": "pip",
+            "git+https://example.invalid/repo.git#egg=tool": "tool",
+            "requests>=2.25.0  # web": "requests",
+        }
+        for spec, name in names.items():
+            self.assertEqual(parser.parse_package_name(spec), name)
+
     def test_check_installed_packages(self) -> None:
         # Test with an empty list
         missing, installed = checker.check_installed_packages([])
@@ -54,6 +97,237 @@ class TestMidnaFunctionality(unittest.TestCase):
         self.assertIsInstance(installed, list)
 
 
+class TestMidnaRequirements(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+        requirements.clear_cache()
+
+    def tearDown(self) -> None:
+        requirements.clear_cache()
+        self._tmp.cleanup()
+
+    def _write(self, name: str, content: str) -> str:
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_records_keep_source_and_line(self) -> None:
+        path = self._write(
+            "requirements.txt",
+            "# web\n"
+            "requests[socks, security] >= 2.25  # pinned\n"
+            "--index-url https://example.invalid/simple\n"
+            'pywin32; sys_platform == "win32"\n'
+            "numpy \\\n"
+            "  ==1.26.0\n",
+        )
+        loaded = requirements.load_requirements(path)
+        records = loaded.requirements
+
+        self.assertEqual(
+            [r.name for r in records], ["requests", "pywin32", "numpy"]
+        )
+        self.assertEqual(records[0].extras, ("socks", "security"))
+        self.assertEqual(records[0].specifier, ">=2.25")
+        self.assertEqual(records[1].marker, 'sys_platform == "win32"')
+        self.assertEqual(records[2].specifier, "==1.26.0")
+        self.assertEqual([r.line for r in records], [2, 4, 5])
+        self.assertTrue(all(r.source == path for r in records))
+
+    def test_diamond_is_parsed_once(self) -> None:
+        path = self._write("top.txt", "-r left.txt\n--requirement=right.txt\n")
+        self._write("left.txt", "-r common.txt\nflask\n")
+        self._write("right.txt", "-rcommon.txt\ndjango\n")
+        self._write("common.txt", "requests\n")
+
+        with unittest.mock.patch.object(
+            requirements, "_parse_file", wraps=requirements._parse_file
+        ) as parse:
+            loaded = requirements.load_requirements(path)
+            requirements.load_requirements(path)
+
+        self.assertEqual(parse.call_count, 4)
+        self.assertEqual(
+            [r.name for r in loaded.requirements],
+            ["requests", "flask", "django"],
+        )
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "no symlinks")
+    def test_includes_resolve_against_the_symlink(self) -> None:
+        shared = self._write("shared/base.txt", "-r extra.txt\nflask\n")
+        self._write("shared/extra.txt", "django\n")
+        self._write("app/extra.txt", "requests\n")
+        path = os.path.join(self.root, "app", "requirements.txt")
+        try:
+            os.symlink(shared, path)
+        except OSError:
+            self.skipTest("cannot create symlinks")
+
+        loaded = requirements.load_requirements(path)
+        direct = requirements.load_requirements(shared)
+
+        self.assertEqual(
+            [r.name for r in loaded.requirements], ["requests", "flask"]
+        )
+        self.assertEqual(
+            [r.name for r in direct.requirements], ["django", "flask"]
+        )
+
+    def test_changed_file_is_parsed_again(self) -> None:
+        path = self._write("requirements.txt", "flask\n")
+        requirements.load_requirements(path)
+        with open(path, "w") as f:
+            f.write("flask\ndjango\n")
+        os.utime(path, ns=(0, 0))
+
+        loaded = requirements.load_requirements(path)
+        self.assertEqual(len(loaded.requirements), 2)
+
+    def test_cycle_is_reported(self) -> None:
+        path = self._write("a.txt", "-r b.txt\nflask\n")
+        self._write("b.txt", "-r a.txt\ndjango\n")
+
+        loaded = requirements.load_requirements(path)
+
+        self.assertEqual(
+            [r.name for r in loaded.requirements], ["django", "flask"]
+        )
+        self.assertEqual(len(loaded.cycles), 1)
+        self.assertEqual(
+            [os.path.basename(p) for p in loaded.cycles[0]],
+            ["a.txt", "b.txt", "a.txt"],
+        )
+
+    def test_constraints_are_kept_apart(self) -> None:
+        path = self._write(
+            "requirements.txt", "-c constraints.txt\n-r missing.txt\nflask\n"
+        )
+        self._write("constraints.txt", "-r pins.txt\nflask<3\n")
+        self._write("pins.txt", "jinja2==3.1.2\n")
+
+        loaded = requirements.load_requirements(path)
+
+        self.assertEqual([r.name for r in loaded.requirements], ["flask"])
+        self.assertEqual(
+            [r.text for r in loaded.constraints],
+            ["jinja2==3.1.2", "flask<3"],
+        )
+        self.assertEqual(
+            loaded.missing, [os.path.join(self.root, "missing.txt")]
+        )
+        # Constraints pin packages but do not add any to install
+        self.assertEqual(parser.read_requirements(path), ["flask<3"])
+
+    def test_constraints_apply_to_requirements(self) -> None:
+        path = self._write(
+            "requirements.txt",
+            "-c constraints.txt\n"
+            "flask[async]>=2; python_version >= '3.8'\n"
+            "Jinja2 --hash=sha256:abc\n"
+            "requests\n",
+        )
+        self._write(
+            "constraints.txt",
+            "flask<3\njinja2==3.1.2\nnumpy==1.26.0\n"
+            'requests<3; sys_platform == "win32"\n',
+        )
+
+        self.assertEqual(
+            parser.read_requirements(path),
+            [
+                "flask[async]>=2,<3; python_version >= '3.8'",
+                "Jinja2==3.1.2 --hash=sha256:abc",
+                "requests",
+            ],
+        )
+
+
+class TestMidnaPep508(unittest.TestCase):
+
+    def test_parse_requirement(self) -> None:
+        requirement = pep508.parse_requirement(
+            "Foo_Bar [socks, security] (>= 2.25, <3) ; python_version > '3.8'"
+        )
+        self.assertEqual(requirement.name, "Foo_Bar")
+        self.assertEqual(requirement.key, "foo-bar")
+        self.assertEqual(requirement.extras, ("socks", "security"))
+        self.assertEqual(requirement.specifier, ">=2.25,<3")
+        self.assertEqual(requirement.marker, "python_version > '3.8'")
+        self.assertEqual(requirement.url, "")
+
+    def test_parse_url_requirement(self) -> None:
+        requirement = pep508.parse_requirement(
+            "pip @ https://example.invalid/pip.zip#sha1=abc ; os_name == 'nt'"
+        )
+        self.assertEqual(
+            requirement.url, "https://example.invalid/pip.zip#sha1=abc"
+        )
+        self.assertEqual(requirement.specifier, "")
+        self.assertEqual(requirement.marker, "os_name == 'nt'")
+        self.assertEqual(
+            str(requirement),
+            "pip @ https://example.invalid/pip.zip#sha1=abc ; os_name == 'nt'",
+        )
+
+    def test_invalid_requirements(self) -> None:
+        for spec in ("./local/pkg", "foo bar", "foo>=", "foo[a b]", "-e ."):
+            with self.assertRaises(pep508.InvalidRequirement):
+                pep508.parse_requirement(spec)
+
+    def test_results_are_memoized(self) -> None:
+        pep508.clear_cache()
+        first = pep508.parse_requirement("numpy==1.26.*")
+        self.assertIs(pep508.parse_requirement("numpy==1.26.*"), first)
+        self.assertEqual(pep508.parse_requirement("numpy ==1.26.*"), first)
+
+
+class TestMidnaVersions(unittest.TestCase):
+
+    def test_versions_are_ordered_as_pep_440(self) -> None:
+        ordered = [
+            "1.0.dev0",
+            "1.0a1.dev1",
+            "1.0a1",
+            "1.0b2",
+            "1.0rc1",
+            "1.0",
+            "1.0+local",
+            "1.0.post1",
+            "1!0.1",
+        ]
+        shuffled = sorted(ordered, key=len)
+        self.assertEqual(sorted(shuffled, key=versions.parse_version), ordered)
+        self.assertEqual(
+            versions.parse_version("1.0.0"), versions.parse_version("v1.0")
+        )
+        with self.assertRaises(versions.InvalidVersion):
+            versions.parse_version("not-a-version")
+
+    def test_satisfies(self) -> None:
+        cases = [
+            ("2.20.0", ">=2.31", False),
+            ("2.31.0", ">=2.31,<3", True),
+            ("3.0a1", "<3", False),
+            ("1.7.post1", ">1.7", False),
+            ("1.26.4", "==1.26.*", True),
+            ("1.27.0", "==1.26.*", False),
+            ("1.4.5", "~=1.4.2", True),
+            ("1.5.0", "~=1.4.2", False),
+            ("1.0+cpu", "==1.0", True),
+            ("1.0", "!=1.0.0", False),
+        ]
+        for version, specifier, expected in cases:
+            self.assertEqual(
+                versions.satisfies(version, specifier),
+                expected,
+                f"{version} {specifier}",
+            )
+
+
 class TestMidnaCLI(unittest.TestCase):
 
     def test_midna_version_command(self) -> None:
@@ -111,34 +385,75 @@ class TestMidnaCLI(unittest.TestCase):
         )
         self.assertNotEqual(result.returncode, 0)
 
+    def test_startup_loads_only_needed_modules(self) -> None:
+        """Guard against startup regressions from eager imports."""
+        code = (
+            "import sys\n"
+            "sys.argv = ['midna'] + sys.argv[1:]\n"
+            "import midna.core\n"
+            "try:\n"
+            "    midna.core.main()\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "loaded = [m for m in sys.modules if m.startswith('midna')]\n"
+            "print(','.join(sorted(loaded)), file=sys.stderr)\n"
+        )
+        for argv in (["--version"], ["--help"]):
+            result = subprocess.run(
+                [sys.executable, "-c", code] + argv,
+                capture_output=True,
+                text=True,
+            )
+            loaded = result.stderr.strip().splitlines()[-1].split(",")
+            self.assertEqual(loaded, ["midna", "midna.core"], argv)
+
+    def test_lazy_package_attributes(self) -> None:
+        import midna
+
+        self.assertIs(midna.read_requirements, parser.read_requirements)
+        self.assertIn("auto_discover_requirements", dir(midna))
+        with self.assertRaises(AttributeError):
+            getattr(midna, "not_an_attribute")
+
+
+def _pip_result(
+    cmd: List[str], returncode: int = 0, stdout: str = "", stderr: str = ""
+) -> runner.CommandResult:
+    """Build the result of a pip command that was not actually run"""
+    result = runner.CommandResult(cmd)
+    result.returncode = returncode
+    result.stdout = stdout
+    result.stderr_tail.extend(stderr.splitlines())
+    return result
+
+
+def _patch_pip(**kwargs: Any) -> Any:
+    """Patch the runner so that no pip process is started"""
+    return unittest.mock.patch.object(
+        runner, "run_command", new=unittest.mock.AsyncMock(**kwargs)
+    )
+
 
 class TestMidnaInstaller(unittest.TestCase):
 
-    @unittest.mock.patch("subprocess.run")
-    def test_install_packages_success(self, mock_run: Mock) -> None:
+    def test_install_packages_success(self) -> None:
         """Test successful package installation."""
-        mock_run.return_value = unittest.mock.MagicMock(returncode=0)
-        result = installer.install_packages(["requests", "numpy"])
+        cmd = ["pip", "install", "requests", "numpy"]
+        with _patch_pip(return_value=_pip_result(cmd)) as mock_run:
+            result = installer.install_packages(["requests", "numpy"])
         self.assertEqual(result, 0)
-        mock_run.assert_called_once_with(
-            ["pip", "install", "requests", "numpy"],
-            check=True,
-            capture_output=True,
-            shell=False,
-        )
+        mock_run.assert_called_once()
+        self.assertEqual(mock_run.call_args.args[0], cmd)
+        self.assertEqual(mock_run.call_args.args[1], runner.PIP_TIMEOUT)
 
-    @unittest.mock.patch("subprocess.run")
-    def test_install_packages_failure(self, mock_run: Mock) -> None:
+    def test_install_packages_failure(self) -> None:
         """Test failed package installation."""
-        mock_run.side_effect = subprocess.CalledProcessError(1, "pip")
-        result = installer.install_packages(["fake-package"])
+        cmd = ["pip", "install", "fake-package"]
+        with _patch_pip(return_value=_pip_result(cmd, 1)) as mock_run:
+            result = installer.install_packages(["fake-package"], timeout=5)
         self.assertEqual(result, 1)
-        mock_run.assert_called_once_with(
-            ["pip", "install", "fake-package"],
-            check=True,
-            capture_output=True,
-            shell=False,
-        )
+        mock_run.assert_called_once()
+        self.assertEqual(mock_run.call_args.args[:2], (cmd, 5))
 
     def test_install_packages_empty_list(self) -> None:
         """Test installing empty package list."""
@@ -150,6 +465,96 @@ class TestMidnaInstaller(unittest.TestCase):
         result = installer.install_packages(["requests"], dry_run=True)
         self.assertEqual(result, 0)
 
+    @staticmethod
+    def _fake_pip(cmd: List[str], *args: Any, **kwargs: Any) -> Any:
+        """Resolve, download and install all but bad-pkg and no-wheel"""
+        if "--report" in cmd:
+            report = {
+                "install": [
+                    {"metadata": {"name": "requests", "version": "2.31.0"}},
+                    {"metadata": {"name": "idna", "version": "3.6"}},
+                ]
+            }
+            if "no-wheel" in cmd:
+                report["install"].append(
+                    {"metadata": {"name": "no-wheel", "version": "1.0"}}
+                )
+            return _pip_result(cmd, stdout=json.dumps(report))
+        if cmd[1] == "install" and "bad-pkg" in cmd:
+            return _pip_result(
+                cmd, 1, stderr="ERROR: No matching distribution for bad-pkg"
+            )
+        if cmd[1] == "wheel" and cmd[-1].startswith("no-wheel"):
+            return _pip_result(
+                cmd, 1, stderr="ERROR: Failed building wheel for no-wheel"
+            )
+        return _pip_result(cmd)
+
+    def test_batched_install_isolates_failures(self) -> None:
+        with _patch_pip(side_effect=self._fake_pip) as mock_run:
+            with tempfile.TemporaryDirectory() as wheel_dir:
+                result = installer.install_packages_batched(
+                    ["requests", "bad-pkg"], wheel_dir=wheel_dir
+                )
+        self.assertEqual(result, 1)
+
+        commands = [call.args[0] for call in mock_run.call_args_list]
+        downloads = [c[-1] for c in commands if c[1] == "wheel"]
+        installs = [c[5:] for c in commands if "--no-index" in c]
+        # Resolved pins are downloaded, then the retry fetches bad-pkg
+        self.assertCountEqual(
+            downloads, ["requests==2.31.0", "idna==3.6", "bad-pkg"]
+        )
+        # One batch, then one install per package, then only the failure
+        self.assertEqual(
+            installs,
+            [["requests", "bad-pkg"], ["requests"], ["bad-pkg"], ["bad-pkg"]],
+        )
+
+    def test_batched_install_skips_failed_downloads(self) -> None:
+        with _patch_pip(side_effect=self._fake_pip) as mock_run:
+            with tempfile.TemporaryDirectory() as wheel_dir:
+                result = installer.install_packages_batched(
+                    ["requests", "no-wheel"], wheel_dir=wheel_dir, retries=0
+                )
+        self.assertEqual(result, 1)
+
+        commands = [call.args[0] for call in mock_run.call_args_list]
+        downloads = [c[-1] for c in commands if c[1] == "wheel"]
+        installs = [c[5:] for c in commands if "--no-index" in c]
+        # A failed pin is traced back by fetching each package
+        self.assertCountEqual(
+            downloads,
+            [
+                "requests==2.31.0",
+                "idna==3.6",
+                "no-wheel==1.0",
+                "requests",
+                "no-wheel",
+            ],
+        )
+        self.assertEqual(installs, [["requests"]])
+
+    def test_batched_install_offline(self) -> None:
+        with _patch_pip(side_effect=self._fake_pip) as mock_run:
+            result = installer.install_packages_batched(
+                ["requests", "idna"], find_links="wheels"
+            )
+        self.assertEqual(result, 0)
+        mock_run.assert_called_once()
+        self.assertEqual(
+            mock_run.call_args.args[0],
+            [
+                "pip",
+                "install",
+                "--no-index",
+                "--find-links",
+                "wheels",
+                "requests",
+                "idna",
+            ],
+        )
+
 
 class TestMidnaUninstaller(unittest.TestCase):
 
@@ -204,32 +609,171 @@ class TestMidnaUninstaller(unittest.TestCase):
             except (OSError, PermissionError):
                 pass
 
-    @unittest.mock.patch("subprocess.run")
-    def test_uninstall_package_list_success(self, mock_run: Mock) -> None:
+    def test_uninstall_package_list_success(self) -> None:
         """Test successful package uninstallation."""
-        mock_run.return_value = unittest.mock.MagicMock(returncode=0)
-        result = uninstaller._uninstall_package_list(["requests", "numpy"])
+        cmd = ["pip", "uninstall", "-y", "requests", "numpy"]
+        with _patch_pip(return_value=_pip_result(cmd)) as mock_run:
+            result = uninstaller._uninstall_package_list(
+                ["requests", "numpy"]
+            )
         self.assertEqual(result, 0)
-        mock_run.assert_called_once_with(
-            ["pip", "uninstall", "-y", "requests", "numpy"],
-            check=True,
-            capture_output=True,
-            shell=False,
-        )
+        mock_run.assert_called_once()
+        self.assertEqual(mock_run.call_args.args[0], cmd)
 
-    @unittest.mock.patch("subprocess.run")
-    def test_uninstall_package_list_failure(self, mock_run: Mock) -> None:
+    def test_uninstall_package_list_failure(self) -> None:
         """Test failed package uninstallation."""
-        mock_run.side_effect = subprocess.CalledProcessError(1, "pip")
-        result = uninstaller._uninstall_package_list(["fake-package"])
+        cmd = ["pip", "uninstall", "-y", "fake-package"]
+        with _patch_pip(return_value=_pip_result(cmd, 1)) as mock_run:
+            result = uninstaller._uninstall_package_list(["fake-package"])
         self.assertEqual(result, 1)
-        mock_run.assert_called_once_with(
-            ["pip", "uninstall", "-y", "fake-package"],
-            check=True,
-            capture_output=True,
-            shell=False,
+        mock_run.assert_called_once()
+        self.assertEqual(mock_run.call_args.args[0], cmd)
+
+    def test_uninstall_package_list_timeout(self) -> None:
+        cmd = ["pip", "uninstall", "-y", "slow-package"]
+        timed_out = _pip_result(cmd, runner.TIMEOUT_EXIT_CODE)
+        timed_out.timed_out = True
+        with _patch_pip(return_value=timed_out):
+            result = uninstaller._uninstall_package_list(
+                ["slow-package"], timeout=1
+            )
+        self.assertEqual(result, runner.TIMEOUT_EXIT_CODE)
+
+
+class TestMidnaEnvironments(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = self._tmp.name
+        self.site_a = self._site("svc_a", "requests-2.31.0")
+        self._site("svc_b", "PyYAML-6.0")
+        base_site = self._site("base", "PyYAML-6.0.1")
+        self.site_c = self._site("svc_c")
+        with open(os.path.join(self.root, "svc_c", "pyvenv.cfg"), "w") as f:
+            f.write(
+                f"home = {os.path.join(self.root, 'base', 'bin')}\n"
+                "include-system-site-packages = true\n"
+                "version = 3.11.7\n"
+            )
+        self.base_site = base_site
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _site(self, env: str, *dists: str) -> str:
+        site = os.path.join(
+            self.root, env, "lib", "python3.11", "site-packages"
+        )
+        os.makedirs(site)
+        for dist in dists:
+            os.makedirs(os.path.join(site, f"{dist}.dist-info"))
+        return site
+
+    def test_find_site_packages(self) -> None:
+        env_a = os.path.join(self.root, "svc_a")
+        self.assertEqual(environments.find_site_packages(env_a), [self.site_a])
+        self.assertEqual(
+            environments.find_site_packages(self.site_a), [self.site_a]
+        )
+        # The base installation follows a --system-site-packages venv
+        self.assertEqual(
+            environments.find_site_packages(
+                os.path.join(self.root, "svc_c")
+            ),
+            [self.site_c, self.base_site],
+        )
+        with self.assertRaises(FileNotFoundError):
+            environments.find_site_packages(os.path.join(self.root, "none"))
+
+    def test_check_environments_matrix(self) -> None:
+        envs_file = os.path.join(self.root, "envs.txt")
+        with open(envs_file, "w") as f:
+            f.write("# services\nsvc_[ab]\nsvc_c  # shared\n\nnone\n")
+        envs = environments.read_envs_file(envs_file)
+        self.assertEqual(
+            [os.path.basename(env) for env in envs],
+            ["svc_a", "svc_b", "svc_c", "none"],
+        )
+
+        packages = ["requests", "PyYAML>=6"]
+        results = environments.check_environments(packages, envs, workers=2)
+        self.assertEqual(
+            [(missing, bool(error)) for _, missing, error in results],
+            [
+                (["PyYAML>=6"], False),
+                (["requests"], False),
+                (["requests"], False),
+                ([], True),
+            ],
         )
 
+        matrix = environments.format_matrix(packages, results).splitlines()
+        self.assertEqual(matrix[0].split(), ["Package", "1", "2", "3", "4"])
+        self.assertEqual(matrix[1].split(), ["requests", "+", "-", "-", "?"])
+        self.assertEqual(matrix[2].split(), ["PyYAML>=6", "-", "+", "+", "?"])
+        self.assertIn("(missing 1)", matrix[4])
+
+
+class TestMidnaRunner(unittest.TestCase):
+
+    def _python(self, code: str) -> List[str]:
+        return [sys.executable, "-c", code]
+
+    def test_streams_lines_and_keeps_stderr_tail(self) -> None:
+        seen: List[Tuple[str, str]] = []
+        code = (
+            "import sys\n"
+            "for i in range(50):\n"
+            "    print(f'line {i}', flush=True)\n"
+            "print('ERROR: broken', file=sys.stderr)\n"
+            "sys.exit(3)\n"
+        )
+        result = runner.run(
+            self._python(code),
+            on_line=lambda stream, line: seen.append((stream, line)),
+        )
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual(result.error(), "ERROR: broken")
+        self.assertEqual(result.stdout, "")  # not kept unless asked
+        stdout_lines = [line for stream, line in seen if stream == "stdout"]
+        self.assertEqual(stdout_lines, [f"line {i}" for i in range(50)])
+
+        kept = runner.run(
+            self._python("print('a')\nprint('b')"), keep_stdout=True
+        )
+        self.assertEqual(kept.stdout, "a\nb")
+
+    def test_timeout_kills_the_command(self) -> None:
+        result = runner.run(
+            self._python("import time; time.sleep(30)"), timeout=0.5
+        )
+        self.assertTrue(result.timed_out)
+        self.assertEqual(result.returncode, runner.TIMEOUT_EXIT_CODE)
+        self.assertLess(result.elapsed, 10)
+
+    def test_run_all_runs_commands_concurrently(self) -> None:
+        finished: List[int] = []
+        cmds = [
+            self._python(f"import time; time.sleep(0.5); print({i})")
+            for i in range(4)
+        ]
+        start = time.perf_counter()
+        results = runner.run_all(
+            cmds,
+            concurrency=4,
+            on_done=lambda result: finished.append(result.returncode),
+        )
+        elapsed = time.perf_counter() - start
+        self.assertEqual([r.cmd for r in results], cmds)
+        self.assertEqual(finished, [0, 0, 0, 0])
+        # Run one after another, four half-second sleeps take 2 seconds
+        self.assertLess(elapsed, 1.9)
+
+    def test_missing_command(self) -> None:
+        result = runner.run(["midna-no-such-command"])
+        self.assertEqual(result.returncode, runner.NOT_FOUND_EXIT_CODE)
+        self.assertIn("midna-no-such-command", result.error())
+
 
 class TestMidnaUninstallCLI(unittest.TestCase):
 
@@ -289,5 +833,1349 @@ class TestMidnaUninstallCLI(unittest.TestCase):
         self.assertNotEqual(result.returncode, 0)
 
 
+class TestMidnaDiscovery(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.project = self._tmp.name
+        sources = {
+            "app.py": "import requests\nfrom flask import Flask\n",
+            "pkg/__init__.py": "",
+            "pkg/models.py": "import numpy as np\nimport os.path\n",
+            "pkg/sub/util.py": "from yaml import safe_load\nimport json\n",
+            "broken.py": "import pandas\ndef oops(:\n",
+            "venv/lib.py": "import should_not_be_scanned\n",
+        }
+        for name, content in sources.items():
+            path = os.path.join(self.project, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def test_analyze_project_imports(self) -> None:
+        imports = discovery.analyze_project_imports(self.project)
+        self.assertEqual(imports, {"requests", "flask", "numpy", "yaml"})
+
+    def test_parallel_scan_matches_serial(self) -> None:
+        serial = discovery.analyze_project_imports(self.project, jobs=1)
+        # Small chunks so the tiny test project still uses the pool
+        with unittest.mock.patch.object(discovery, "CHUNK_SIZE", 2):
+            parallel = discovery.analyze_project_imports(self.project, jobs=2)
+        self.assertEqual(serial, parallel)
+
+    def test_iter_file_imports_streams_results(self) -> None:
+        stream = discovery.iter_file_imports(self.project)
+        file_path, imports = next(stream)
+        self.assertTrue(file_path.endswith(".py"))
+        self.assertIsInstance(imports, set)
+        total = len(discovery.find_python_files(self.project))
+        self.assertEqual(len(list(stream)) + 1, total)
+
+    def test_iter_discovered_packages(self) -> None:
+        index = installed.InstalledIndex(
+            {"requests": "2.31.0", "pyyaml": "6.0"},
+            names={"requests": "requests", "pyyaml": "PyYAML"},
+            modules={"requests": ["requests"], "yaml": ["pyyaml"]},
+        )
+        found = []
+        with unittest.mock.patch.object(
+            package_classifier, "get_installed_index", return_value=index
+        ):
+            packages, method = discovery.auto_discover_requirements(
+                self.project,
+                on_package=lambda name, version: found.append(name),
+            )
+        self.assertEqual(method, "import analysis")
+        self.assertEqual(packages, [("PyYAML", "6.0"), ("requests", "2.31.0")])
+        self.assertEqual(sorted(found), ["PyYAML", "requests"])
+
+    def test_import_cache_reuses_unchanged_files(self) -> None:
+        first = discovery.analyze_project_imports(self.project, use_cache=True)
+        cache_name = cache.CACHE_FILE.format(engine="ast")
+        cache_file = os.path.join(self.project, cache.CACHE_DIR, cache_name)
+        self.assertTrue(os.path.exists(cache_file))
+
+        with unittest.mock.patch.object(
+            discovery, "extract_import_lines_from_file"
+        ) as mock_extract:
+            second = discovery.analyze_project_imports(
+                self.project, use_cache=True
+            )
+        mock_extract.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_import_cache_ignores_edits_made_while_parsing(self) -> None:
+        app = os.path.join(self.project, "app.py")
+        extract = discovery.extract_import_lines_from_file
+
+        def extract_then_edit(file_path: str, engine: str) -> Dict[str, int]:
+            imports = extract(file_path, engine)
+            if file_path == app:
+                with open(app, "w", encoding="utf-8") as f:
+                    f.write("import click\n")
+            return imports
+
+        with unittest.mock.patch.object(
+            discovery,
+            "extract_import_lines_from_file",
+            side_effect=extract_then_edit,
+        ):
+            first = discovery.analyze_project_imports(
+                self.project, use_cache=True
+            )
+        self.assertNotIn("click", first)
+
+        second = discovery.analyze_project_imports(
+            self.project, use_cache=True
+        )
+        self.assertIn("click", second)
+
+    def test_import_cache_is_kept_per_engine(self) -> None:
+        with open(os.path.join(self.project, "half.py"), "w") as f:
+            f.write("import click\ndef oops(:\n")
+
+        for engine in ("fast", "ast", "fast"):
+            with self.subTest(engine=engine):
+                imports = discovery.analyze_project_imports(
+                    self.project, use_cache=True, engine=engine
+                )
+                self.assertEqual("click" in imports, engine == "fast")
+
+    def test_import_cache_tracks_changes_and_deletions(self) -> None:
+        discovery.analyze_project_imports(self.project, use_cache=True)
+
+        app = os.path.join(self.project, "app.py")
+        with open(app, "w", encoding="utf-8") as f:
+            f.write("import click\n# grew a little\n")
+        os.unlink(os.path.join(self.project, "pkg", "models.py"))
+
+        imports = discovery.analyze_project_imports(
+            self.project, use_cache=True
+        )
+        self.assertEqual(imports, {"click", "yaml"})
+
+        import_cache = cache.ImportCache(self.project)
+        import_cache.load()
+        self.assertNotIn(
+            os.path.join("pkg", "models.py"), import_cache.entries
+        )
+
+    def test_import_cache_hash_survives_touch(self) -> None:
+        discovery.analyze_project_imports(self.project, cache_hash=True)
+        app = os.path.join(self.project, "app.py")
+        stat = os.stat(app)
+        os.utime(app, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        import_cache = cache.ImportCache(self.project, use_hash=True)
+        import_cache.load()
+        self.assertEqual(import_cache.lookup(app), {"requests", "flask"})
+
+    def test_resolve_jobs(self) -> None:
+        self.assertEqual(discovery.resolve_jobs(3), 3)
+        self.assertGreaterEqual(discovery.resolve_jobs(0), 1)
+
+    def _relative_files(
+        self, path_filter: Optional[ignore.PathFilter] = None
+    ) -> Set[str]:
+        return {
+            os.path.relpath(path, self.project).replace(os.sep, "/")
+            for path in discovery.find_python_files(self.project, path_filter)
+        }
+
+    def test_walker_honors_ignore_files(self) -> None:
+        with open(os.path.join(self.project, ".gitignore"), "w") as f:
+            f.write("# generated\nsub/\nbroken.py\n")
+        with open(os.path.join(self.project, ".midnaignore"), "w") as f:
+            f.write("!broken.py\n")
+        with open(os.path.join(self.project, "pkg", ".gitignore"), "w") as f:
+            f.write("/models.py\n")
+
+        self.assertEqual(
+            self._relative_files(), {"app.py", "broken.py", "pkg/__init__.py"}
+        )
+        self.assertEqual(
+            self._relative_files(ignore.PathFilter(use_ignore_files=False)),
+            {
+                "app.py",
+                "broken.py",
+                "pkg/__init__.py",
+                "pkg/models.py",
+                "pkg/sub/util.py",
+            },
+        )
+
+    def test_walker_include_exclude_globs(self) -> None:
+        path_filter = ignore.PathFilter(include=["pkg/**"], exclude=["sub"])
+        self.assertEqual(
+            self._relative_files(path_filter),
+            {"pkg/__init__.py", "pkg/models.py"},
+        )
+        imports = discovery.analyze_project_imports(
+            self.project, path_filter=ignore.PathFilter(exclude=["*.py"])
+        )
+        self.assertEqual(imports, set())
+
+    def test_include_directory_selects_its_files(self) -> None:
+        package = {"pkg/__init__.py", "pkg/models.py", "pkg/sub/util.py"}
+        cases = [
+            ("pkg", package),
+            ("pkg/", package),
+            ("/pkg", package),
+            ("sub", {"pkg/sub/util.py"}),
+        ]
+        for pattern, expected in cases:
+            with self.subTest(pattern=pattern):
+                path_filter = ignore.PathFilter(include=[pattern])
+                self.assertEqual(self._relative_files(path_filter), expected)
+        # A directory-only pattern does not match files
+        self.assertEqual(
+            self._relative_files(ignore.PathFilter(include=["app.py/"])),
+            set(),
+        )
+
+
+class TestMidnaIgnore(unittest.TestCase):
+
+    def test_gitignore_patterns(self) -> None:
+        matcher = ignore.IgnoreMatcher(
+            ignore.IgnoreMatcher.parse_lines(
+                [
+                    "*.log\n",
+                    "/build-*\n",
+                    "docs/**/_gen\n",
+                    "data/\n",
+                    "!keep.log\n",
+                    "\\#notes\n",
+                ]
+            )
+        )
+        cases = [
+            ("debug.log", False, True),
+            ("a/b/debug.log", False, True),
+            ("keep.log", False, False),
+            ("build-x", True, True),
+            ("src/build-x", True, False),
+            ("docs/_gen", True, True),
+            ("docs/a/b/_gen", True, True),
+            ("data", True, True),
+            ("data", False, False),
+            ("#notes", False, True),
+            ("app.py", False, False),
+        ]
+        for path, is_dir, expected in cases:
+            with self.subTest(path=path, is_dir=is_dir):
+                self.assertEqual(matcher.is_ignored(path, is_dir), expected)
+
+    def test_malformed_patterns(self) -> None:
+        with self.assertLogs("midna", "WARNING") as logs:
+            rules = ignore.IgnoreMatcher.parse_lines(["[z-a].py\n", "*.log\n"])
+        self.assertEqual(len(rules), 1)
+        self.assertIn("[z-a].py", logs.output[0])
+        self.assertTrue(ignore.IgnoreMatcher(rules).is_ignored("x.log", False))
+
+        with self.assertRaises(ignore.PatternError):
+            ignore.PathFilter(exclude=["build", "[z-a]"])
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as directory:
+            result = subprocess.run(
+                [sys.executable, "-m", "midna", "--include", "[z-a]"],
+                capture_output=True,
+                text=True,
+                cwd=directory,
+                env={**os.environ, "PYTHONPATH": root},
+            )
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("ERROR: Invalid glob '[z-a]'", result.stdout)
+        self.assertNotIn("Traceback", result.stderr)
+
+    def test_nested_rules_are_relative(self) -> None:
+        matcher = ignore.IgnoreMatcher(
+            ignore.IgnoreMatcher.parse_lines(["/gen.py"], base="pkg/")
+        )
+        self.assertTrue(matcher.is_ignored("pkg/gen.py", False))
+        self.assertFalse(matcher.is_ignored("gen.py", False))
+        self.assertFalse(matcher.is_ignored("pkg/sub/gen.py", False))
+
+
+class TestMidnaProfiling(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.project = self._tmp.name
+        for i in range(5):
+            with open(os.path.join(self.project, f"m{i}.py"), "w") as f:
+                f.write("import json\n")
+        with open(os.path.join(self.project, "broken.py"), "w") as f:
+            f.write("def oops(:\n")
+        profiling.reset()
+
+    def tearDown(self) -> None:
+        profiling.disable()
+        profiling.reset()
+        self._tmp.cleanup()
+
+    def test_disabled_records_nothing(self) -> None:
+        with profiling.timer("phase"):
+            profiling.count("things")
+        discovery.analyze_project_imports(self.project)
+        self.assertEqual(
+            profiling.snapshot(), {"timings": {}, "counters": {}}
+        )
+
+    def test_scan_counters(self) -> None:
+        profiling.enable()
+        discovery.analyze_project_imports(self.project)
+        data = profiling.snapshot()
+        self.assertEqual(data["counters"]["files scanned"], 6)
+        self.assertEqual(data["counters"]["parse failures"], 1)
+        self.assertEqual(data["counters"]["bytes read"], 5 * 12 + 11)
+        self.assertEqual(data["timings"]["parse"]["calls"], 6)
+        self.assertEqual(data["timings"]["walk"]["calls"], 6)
+        self.assertIn("files scanned", profiling.format_table(data))
+
+    def test_worker_counters_are_merged(self) -> None:
+        profiling.enable()
+        with unittest.mock.patch.object(discovery, "CHUNK_SIZE", 2):
+            discovery.analyze_project_imports(self.project, jobs=2)
+        data = profiling.snapshot()
+        self.assertEqual(data["counters"]["parse failures"], 1)
+        self.assertEqual(data["timings"]["parse"]["calls"], 6)
+
+
+class TestMidnaImportIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.index = import_index.ImportIndex.from_items(
+            [
+                ("app.py", {"requests", "os"}),
+                ("lib.py", {"requests", "yaml"}),
+                ("empty.py", set()),
+            ]
+        )
+
+    def test_forward_and_reverse_lookups(self) -> None:
+        self.assertEqual(
+            sorted(self.index.imports_of("lib.py")), ["requests", "yaml"]
+        )
+        self.assertEqual(
+            self.index.files_importing("requests"), ["app.py", "lib.py"]
+        )
+        self.assertEqual(
+            self.index.import_counts(), {"requests": 2, "os": 1, "yaml": 1}
+        )
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.imports_of("missing.py"), [])
+
+    def test_updates_and_compaction(self) -> None:
+        self.index.add("app.py", {"flask"})
+        self.assertTrue(self.index.remove("lib.py"))
+        self.assertFalse(self.index.remove("lib.py"))
+        self.assertEqual(self.index.modules(), {"flask"})
+        self.assertEqual(self.index.files_importing("requests"), [])
+
+        self.index.compact()
+        self.assertEqual(len(self.index.data), 1)
+        self.assertEqual(
+            dict(self.index.items()), {"app.py": ["flask"], "empty.py": []}
+        )
+
+    def test_save_and_load(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "imports.idx")
+            self.index.save(path)
+            with import_index.ImportIndex.load(path) as loaded:
+                self.assertIsInstance(loaded.data, memoryview)
+                self.assertEqual(
+                    dict(loaded.items()), dict(self.index.items())
+                )
+                self.assertEqual(
+                    loaded.files_importing("yaml"), ["lib.py"]
+                )
+                # Changing a loaded index copies it out of the mapping
+                loaded.add("new.py", {"click"})
+                self.assertEqual(loaded.imports_of("new.py"), ["click"])
+                self.assertEqual(
+                    sorted(loaded.imports_of("app.py")), ["os", "requests"]
+                )
+
+            with open(path, "r+b") as f:
+                f.truncate(40)
+            with self.assertRaises(ValueError):
+                import_index.ImportIndex.load(path)
+
+    def test_locations_keep_import_lines(self) -> None:
+        self.index.add("lib.py", {"requests": 7, "yaml": 2})
+        self.assertEqual(
+            self.index.locations("requests"), [("app.py", 0), ("lib.py", 7)]
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "imports.idx")
+            self.index.save(path)
+            with import_index.ImportIndex.load(path) as loaded:
+                self.assertEqual(loaded.locations("yaml"), [("lib.py", 2)])
+                self.assertEqual(loaded.locations("missing"), [])
+
+
+class TestMidnaExplain(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.project = self._tmp.name
+        files = {
+            "app.py": "import os\nimport yaml\nimport requests\n",
+            "lib.py": '"""Docs"""\n\nfrom yaml import safe_load\n',
+            "tool.py": "import notinstalled\n",
+        }
+        for name, content in files.items():
+            with open(os.path.join(self.project, name), "w") as f:
+                f.write(content)
+
+        index = installed.InstalledIndex(
+            {"pyyaml": "6.0", "requests": "2.31.0"},
+            names={"pyyaml": "PyYAML", "requests": "requests"},
+            modules={"yaml": ["pyyaml"], "requests": ["requests"]},
+        )
+        for module in (package_classifier, explain):
+            patcher = unittest.mock.patch.object(
+                module, "get_installed_index", return_value=index
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.project, name)
+
+    def test_discovery_fills_index_in_the_same_scan(self) -> None:
+        index = import_index.ImportIndex()
+        packages, _ = discovery.auto_discover_requirements(
+            self.project, import_index=index
+        )
+        self.assertEqual(packages, [("PyYAML", "6.0"), ("requests", "2.31.0")])
+        self.assertEqual(
+            sorted(index.locations("yaml")),
+            [(self._path("app.py"), 2), (self._path("lib.py"), 3)],
+        )
+
+        rows = explain.explain_imports(index, self.project)
+        self.assertEqual(
+            [(package, modules) for package, modules, _ in rows],
+            [
+                ("PyYAML==6.0", ["yaml"]),
+                ("notinstalled", ["notinstalled"]),
+                ("requests==2.31.0", ["requests"]),
+            ],
+        )
+        report = explain.format_explanation(rows, limit=1)
+        self.assertIn("2 files  (yaml)", report)
+        self.assertIn("... and 1 more", report)
+        self.assertIn("(notinstalled, not installed)", report)
+
+    def test_why_accepts_distribution_and_import_names(self) -> None:
+        index = explain.scan_imports(self.project, engine="fast")
+        expected = [
+            ("yaml", [(self._path("app.py"), 2), (self._path("lib.py"), 3)])
+        ]
+        self.assertEqual(explain.why(index, "PyYAML"), expected)
+        self.assertEqual(explain.why(index, "yaml"), expected)
+        self.assertEqual(explain.why(index, "click"), [])
+
+
+class TestMidnaWatch(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.project = self._tmp.name
+        self._write("app.py", "import requests\nimport json\n")
+        self._write("lib.py", "import notinstalled\n")
+        self.index = installed.InstalledIndex(
+            {"requests": "2.31.0"},
+            names={"requests": "requests"},
+            modules={"requests": ["requests"]},
+        )
+        patcher = unittest.mock.patch.object(
+            package_classifier, "get_installed_index", return_value=self.index
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.state = watch.ProjectState(self.project)
+
+    def tearDown(self) -> None:
+        installed.invalidate_installed_index()
+        self._tmp.cleanup()
+
+    def _write(self, name: str, content: str) -> None:
+        path = os.path.join(self.project, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        # Make the change visible even on coarse mtime filesystems
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_refresh_reparses_only_changed_files(self) -> None:
+        self.assertEqual(self.state.refresh(), 2)
+        self.assertEqual(self.state.refresh(), 0)
+
+        self._write("lib.py", "import click\n")
+        os.unlink(os.path.join(self.project, "app.py"))
+        with unittest.mock.patch.object(
+            watch, "extract_imports_from_file", return_value={"click"}
+        ) as mock_extract:
+            self.assertEqual(self.state.refresh(), 2)
+        mock_extract.assert_called_once()
+        self.assertEqual(self.state.all_imports(), {"click"})
+
+    def test_queries(self) -> None:
+        self.state.refresh()
+        missing = self.state.query({"query": "missing"})
+        self.assertEqual(missing, {"missing": {"notinstalled": ["lib.py"]}})
+        packages = self.state.query({"query": "packages"})
+        self.assertEqual(packages, {"packages": [("requests", "2.31.0")]})
+        self.assertIn("error", self.state.query({"query": "nope"}))
+
+    def test_socket_round_trip(self) -> None:
+        import threading
+
+        self.state.refresh()
+        socket_path = os.path.join(self.project, watch.SOCKET_PATH)
+        server = threading.Thread(
+            target=watch.serve, args=(self.state, socket_path, 0.05)
+        )
+        server.start()
+        try:
+            for _ in range(100):
+                if os.path.exists(socket_path):
+                    break
+                time.sleep(0.01)
+            response = watch.send_query("missing", socket_path)
+            self.assertEqual(response["missing"], {"notinstalled": ["lib.py"]})
+            self.assertIn("elapsed_ms", response)
+        finally:
+            watch.send_query("stop", socket_path)
+            server.join(timeout=5)
+        self.assertFalse(server.is_alive())
+        self.assertFalse(os.path.exists(socket_path))
+
+
+class TestMidnaExtractors(unittest.TestCase):
+
+    TRICKY_SOURCES = [
+        "import a.b.c as d, e\nfrom f.g import (h,\n    i)\n",
+        "from . import x\nfrom .local import y\nfrom ..up.more import z\n",
+        '"""\nimport not_real\n"""\nx = "import fake"  # import nope\n',
+        "def f():\n    import inner\n    from deep . mod import q\n",
+        "if True: import inline\ntry: import ujson\nexcept ImportError: 0\n",
+        "import os; import sys\nimport a, \\\n    b\n",
+        "from x \\\n    import y\n",
+        "reimport = 1\n_import = 2\nimportlib = 3\n",
+        "s = r'import \\d'\nt = b'''\nimport q\n'''\n",
+        "import \u00e9t\u00e9\nfrom __future__ import annotations\n",
+        "x = 1\n",
+    ]
+
+    def assert_engines_agree(self, source: str) -> None:
+        self.assertEqual(
+            extractors.extract_import_lines(source, "fast"),
+            extractors.extract_import_lines(source, "ast"),
+            source,
+        )
+
+    def test_fast_engine_tricky_sources(self) -> None:
+        for source in self.TRICKY_SOURCES:
+            self.assert_engines_agree(source)
+
+    def test_fast_engine_matches_ast_on_stdlib(self) -> None:
+        stdlib = sysconfig.get_paths()["stdlib"]
+        for package in ("json", "email", "logging", "importlib", "asyncio"):
+            package_dir = os.path.join(stdlib, package)
+            for name in sorted(os.listdir(package_dir)):
+                if not name.endswith(".py"):
+                    continue
+                path = os.path.join(package_dir, name)
+                with open(path, encoding="utf-8") as f:
+                    source = f.read()
+                with self.subTest(path=path):
+                    self.assert_engines_agree(source)
+
+    def test_scan_imports_flags_ambiguous_sources(self) -> None:
+        with self.assertRaises(extractors.AmbiguousSource):
+            extractors.scan_imports("if x: import y\n")
+
+    def test_unknown_engine(self) -> None:
+        with self.assertRaises(ValueError):
+            extractors.extract_imports("import os", "nope")
+
+    def test_extract_imports_from_file_fast_engine(self) -> None:
+        with tempfile.NamedTemporaryFile(
+            mode="wb", suffix=".py", delete=False
+        ) as f:
+            temp_path = f.name
+            f.write(b"import requests\r\nfrom yaml import load\r\n")
+
+        try:
+            self.assertEqual(
+                discovery.extract_imports_from_file(temp_path, "fast"),
+                {"requests", "yaml"},
+            )
+        finally:
+            os.unlink(temp_path)
+
+
+class TestMidnaBytecode(unittest.TestCase):
+    """Test the pyc engine against the AST engine"""
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "module.py")
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _write(self, source: str) -> None:
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(source)
+
+    def assert_matches_ast(self, source: str) -> None:
+        code = compile(source, "<test>", "exec")
+        self.assertEqual(
+            bytecode.import_lines_from_code(code),
+            extractors.extract_import_lines(source, "ast"),
+            source,
+        )
+
+    def test_tricky_sources(self) -> None:
+        for source in TestMidnaExtractors.TRICKY_SOURCES:
+            try:
+                compile(source, "<test>", "exec")
+            except SyntaxError:
+                continue  # Parses, but no .pyc can exist for it
+            self.assert_matches_ast(source)
+        self.assert_matches_ast(
+            "class A:\n    def f(self):\n        from a.b import (\n"
+            "            c,\n        )\n        return [__import__('x')]\n"
+        )
+
+    def test_extended_arg(self) -> None:
+        # Over 256 names, so IMPORT_NAME needs an EXTENDED_ARG prefix
+        names = "".join(f"n{i} = 0\n" for i in range(300))
+        source = names + "import late\nfrom later.sub import x\n"
+        code = compile(source, "<test>", "exec")
+        self.assertGreater(len(code.co_names), 256)
+        self.assert_matches_ast(source)
+
+    def test_matches_ast_on_stdlib(self) -> None:
+        stdlib = sysconfig.get_paths()["stdlib"]
+        for package in ("json", "email", "logging", "importlib", "asyncio"):
+            package_dir = os.path.join(stdlib, package)
+            for name in sorted(os.listdir(package_dir)):
+                if name.endswith(".py"):
+                    path = os.path.join(package_dir, name)
+                    with open(path, encoding="utf-8") as f:
+                        source = f.read()
+                    with self.subTest(path=path):
+                        self.assert_matches_ast(source)
+
+    def test_fresh_pyc_is_used(self) -> None:
+        self._write("import requests\n")
+        py_compile.compile(self.path, doraise=True)
+
+        with unittest.mock.patch.object(
+            extractors, "import_lines_from_tree"
+        ) as parse:
+            imports = discovery.extract_import_lines_from_file(
+                self.path, "pyc"
+            )
+
+        self.assertEqual(imports, {"requests": 1})
+        parse.assert_not_called()
+
+    def test_stale_pyc_falls_back_to_source(self) -> None:
+        for mode in (
+            py_compile.PycInvalidationMode.TIMESTAMP,
+            py_compile.PycInvalidationMode.CHECKED_HASH,
+            py_compile.PycInvalidationMode.UNCHECKED_HASH,
+        ):
+            with self.subTest(mode=mode):
+                self._write("import requests\n")
+                py_compile.compile(
+                    self.path, doraise=True, invalidation_mode=mode
+                )
+                self.assertIsNotNone(bytecode.read_fresh_code(self.path))
+
+                self._write("import requests\nimport yaml\n")
+                self.assertIsNone(bytecode.read_fresh_code(self.path))
+                self.assertEqual(
+                    discovery.extract_import_lines_from_file(
+                        self.path, "pyc"
+                    ),
+                    {"requests": 1, "yaml": 2},
+                )
+
+    def test_missing_or_foreign_pyc(self) -> None:
+        self._write("import requests\n")
+        self.assertIsNone(bytecode.read_fresh_code(self.path))
+
+        pyc_path = importlib.util.cache_from_source(self.path)
+        os.makedirs(os.path.dirname(pyc_path))
+        with open(pyc_path, "wb") as f:
+            f.write(b"\0\0\r\n" + bytes(12) + b"garbage")
+        self.assertIsNone(bytecode.read_fresh_code(self.path))
+
+
+class TestMidnaInstalledIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        installed.invalidate_installed_index()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.site = self._tmp.name
+        for name in ("Foo_Bar-1.2.dist-info", "baz-0.1-py3.11.egg-info"):
+            os.makedirs(os.path.join(self.site, name))
+        legacy = os.path.join(self.site, "legacy.egg-info")
+        os.makedirs(legacy)
+        with open(os.path.join(legacy, "PKG-INFO"), "w") as f:
+            f.write("Metadata-Version: 1.0\nName: Legacy\nVersion: 3.0\n")
+
+    def tearDown(self) -> None:
+        installed.invalidate_installed_index()
+        self._tmp.cleanup()
+
+    def test_normalize_name(self) -> None:
+        self.assertEqual(
+            installed.normalize_name("Foo_Bar.baz"), "foo-bar-baz"
+        )
+
+    def test_build_from_site_packages(self) -> None:
+        index = installed.InstalledIndex.build([self.site])
+        self.assertEqual(
+            index.versions, {"foo-bar": "1.2", "baz": "0.1", "legacy": "3.0"}
+        )
+        self.assertIn("foo.bar", index)
+        self.assertEqual(index.version("FOO-BAR"), "1.2")
+        self.assertIsNone(index.version("missing"))
+
+    def test_index_is_built_once_per_run(self) -> None:
+        with unittest.mock.patch.object(
+            installed.InstalledIndex,
+            "build",
+            return_value=installed.InstalledIndex({}),
+        ) as mock_build:
+            checker.check_installed_packages(["requests"])
+            uninstaller._check_package_list_to_uninstall(["requests"])
+        mock_build.assert_called_once()
+
+    def test_persisted_index_is_reused(self) -> None:
+        first = installed.get_installed_index(cache_dir=self.site)
+        installed.invalidate_installed_index()
+        with unittest.mock.patch.object(
+            installed.InstalledIndex, "build"
+        ) as mock_build:
+            second = installed.get_installed_index(cache_dir=self.site)
+        mock_build.assert_not_called()
+        self.assertEqual(first.versions, second.versions)
+
+    def _add_distribution(self, dirname: str, files: dict) -> None:
+        location = os.path.join(self.site, dirname)
+        os.makedirs(location)
+        for name, content in files.items():
+            with open(os.path.join(location, name), "w") as f:
+                f.write(content)
+
+    def test_module_to_distribution_mapping(self) -> None:
+        self._add_distribution(
+            "PyFakeYAML-6.0.dist-info", {"top_level.txt": "_fy\nfakeyaml\n"}
+        )
+        self._add_distribution(
+            "opencv_python-4.8.0.dist-info",
+            {
+                "RECORD": (
+                    "cv2/__init__.py,sha256=x,10\n"
+                    "cv2/data/haar.xml,,\n"
+                    "opencv_python-4.8.0.dist-info/RECORD,,\n"
+                    "_cv2_helper.cpython-311-x86_64-linux-gnu.so,,\n"
+                    "../../bin/opencv_tool,,\n"
+                )
+            },
+        )
+        index = installed.InstalledIndex.build([self.site])
+        self.assertEqual(
+            index.distributions_for("fakeyaml"), [("PyFakeYAML", "6.0")]
+        )
+        self.assertEqual(
+            index.distributions_for("cv2"), [("opencv_python", "4.8.0")]
+        )
+        self.assertIn("_cv2_helper", index.modules)
+        self.assertEqual(index.distributions_for("missing"), [])
+
+        with unittest.mock.patch.object(
+            package_classifier, "get_installed_index", return_value=index
+        ):
+            _, _, third_party = package_classifier.classify_packages(
+                {"fakeyaml", "cv2", "os", "not_installed"}, self.site
+            )
+        self.assertEqual(
+            third_party, [("PyFakeYAML", "6.0"), ("opencv_python", "4.8.0")]
+        )
+
+    def test_check_installed_packages_normalizes_names(self) -> None:
+        index = installed.InstalledIndex.build([self.site])
+        with unittest.mock.patch.object(
+            checker, "get_installed_index", return_value=index
+        ):
+            missing, found = checker.check_installed_packages(
+                ["foo-bar>=1.0", "Baz", "absent"]
+            )
+        self.assertEqual(found, ["foo-bar>=1.0", "Baz"])
+        self.assertEqual(missing, ["absent"])
+
+    def test_check_requirements_compares_versions(self) -> None:
+        index = installed.InstalledIndex.build([self.site])
+        packages = [
+            "foo-bar>=1.10",
+            "baz~=0.1",
+            "absent==1.0",
+            "legacy<3",
+            "Foo_Bar>=1,!=1.3.*",
+        ]
+        missing, wrong_version, satisfied = checker.check_requirements(
+            packages, index
+        )
+        self.assertEqual(missing, ["absent==1.0"])
+        self.assertEqual(
+            wrong_version,
+            [("foo-bar>=1.10", "1.2"), ("legacy<3", "3.0")],
+        )
+        self.assertEqual(satisfied, ["baz~=0.1", "Foo_Bar>=1,!=1.3.*"])
+        # Wrong versions are installed with the missing ones, in order
+        self.assertEqual(
+            checker.check_installed_packages(packages, index)[0],
+            ["foo-bar>=1.10", "absent==1.0", "legacy<3"],
+        )
+
+
+class TestMidnaClassifier(unittest.TestCase):
+
+    def test_is_stdlib_package(self) -> None:
+        for name in ("os", "json", "asyncio", "sys", "__future__"):
+            self.assertTrue(package_classifier.is_stdlib_package(name), name)
+        # Imported third-party modules must not leak into the table
+        for name in ("pytest", "midna", "requests", "setuptools", "pip"):
+            self.assertFalse(package_classifier.is_stdlib_package(name), name)
+
+    def test_is_stdlib_package_does_not_probe_sys_path(self) -> None:
+        with unittest.mock.patch("importlib.util.find_spec") as mock_find_spec:
+            package_classifier.is_stdlib_package("not_a_real_module")
+        mock_find_spec.assert_not_called()
+
+    def test_frozen_table_covers_older_pythons(self) -> None:
+        from midna._stdlib_table import STDLIB_MODULE_NAMES
+
+        self.assertIn("distutils", STDLIB_MODULE_NAMES)
+        self.assertIn("asyncio", STDLIB_MODULE_NAMES)
+        self.assertNotIn("test", STDLIB_MODULE_NAMES)
+
+
+class TestMidnaProjectModules(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self._tmp.name, "proj")
+        for path in (
+            "app.py",
+            "tool.py",
+            "typed.pyi",
+            "src/mypkg/__init__.py",
+            "src/mypkg/sub/mod.py",
+            "src/nspkg/mod.py",
+            "scripts/run.py",
+            "build/lib/generated.py",
+            "my-dir/x.py",
+        ):
+            full = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, "w") as f:
+                f.write("import requests\n")
+        package_classifier.invalidate_project_modules()
+
+    def tearDown(self) -> None:
+        package_classifier.invalidate_project_modules()
+        self._tmp.cleanup()
+
+    def test_walk_collects_top_level_modules(self) -> None:
+        modules = package_classifier.ProjectModules()
+        files = discovery.find_python_files(self.root, None, modules)
+
+        self.assertEqual(
+            modules.names,
+            {"app", "tool", "typed", "mypkg", "nspkg", "scripts"},
+        )
+        # src/ is listed early for the index, and walked only once
+        self.assertEqual(len(files), 7)
+        self.assertEqual(len(set(files)), 7)
+        self.assertEqual(
+            discovery.scan_project_modules(self.root).names, modules.names
+        )
+
+    def test_directories_without_python_files_are_not_modules(self) -> None:
+        for path in ("docker/Dockerfile", "docs/api/index.rst"):
+            full = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, "w") as f:
+                f.write("FROM python\n")
+        # A namespace package whose modules are further down
+        full = os.path.join(self.root, "deep", "er", "mod.py")
+        os.makedirs(os.path.dirname(full))
+        open(full, "w").close()
+
+        modules = discovery.scan_project_modules(self.root)
+
+        self.assertNotIn("docker", modules)
+        self.assertNotIn("docs", modules)
+        self.assertNotIn("src", modules)
+        self.assertIn("deep", modules)
+
+    def test_walk_lists_each_directory_once(self) -> None:
+        for path in ("docs/a/b/index.rst", "docs/c/conf.txt", "ns/x/m.py"):
+            full = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            open(full, "w").close()
+        listed: List[str] = []
+
+        def scandir(path: str) -> Any:
+            listed.append(os.path.relpath(path, self.root))
+            return real_scandir(path)
+
+        real_scandir = os.scandir
+        modules = package_classifier.ProjectModules()
+        with unittest.mock.patch("os.scandir", side_effect=scandir):
+            discovery.find_python_files(self.root, None, modules)
+
+        self.assertEqual(len(listed), len(set(listed)))
+        self.assertIn(os.path.join("docs", "a", "b"), listed)
+        self.assertNotIn("docs", modules)
+        self.assertIn("ns", modules)
+
+    def test_root_package_is_a_project_module(self) -> None:
+        package = os.path.join(self.root, "src", "mypkg")
+        self.assertIn("mypkg", discovery.scan_project_modules(package))
+
+    def test_classification_does_not_touch_the_filesystem(self) -> None:
+        modules = discovery.scan_project_modules(self.root)
+        index = installed.InstalledIndex({})
+        with unittest.mock.patch.object(
+            package_classifier, "get_installed_index", return_value=index
+        ), unittest.mock.patch("os.scandir") as scandir, unittest.mock.patch(
+            "os.stat"
+        ) as stat:
+            for name in ("mypkg.sub.mod", "nspkg", "typed", "tool"):
+                kind, _ = package_classifier.classify_package(
+                    name, self.root, modules
+                )
+                self.assertEqual(kind, package_classifier.PROJECT, name)
+            kind, _ = package_classifier.classify_package(
+                "generated", self.root, modules
+            )
+            self.assertEqual(kind, package_classifier.THIRD_PARTY)
+        scandir.assert_not_called()
+        stat.assert_not_called()
+
+
+@unittest.skipUnless(shutil.which("git"), "git is not installed")
+class TestMidnaIncremental(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.repo = self._tmp.name
+        self._write("app/__init__.py", "")
+        self._write("app/main.py", "import shared\nimport app\n")
+        self._write("app/old.py", "import olddep\nimport shared\n")
+        self._write("app/util.py", "import os\n")
+        self._git("init", "-q")
+        self._git("add", ".")
+        self._git("commit", "-q", "-m", "base")
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _write(self, path: str, content: str) -> None:
+        full = os.path.join(self.repo, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "w") as f:
+            f.write(content)
+
+    def _git(self, *args: str) -> None:
+        subprocess.run(
+            [
+                "git",
+                "-C",
+                self.repo,
+                "-c",
+                "user.name=test",
+                "-c",
+                "user.email=test@example.invalid",
+                *args,
+            ],
+            check=True,
+            capture_output=True,
+        )
+
+    def test_since_reports_added_and_dropped_imports(self) -> None:
+        self._write("app/util.py", "import os\n\nimport newdep\n")
+        self._write("app/extra.py", "import shared\nimport otherdep\n")
+        os.remove(os.path.join(self.repo, "app", "old.py"))
+
+        changes = incremental.diff_dependencies(self.repo, "HEAD")
+
+        self.assertEqual(
+            changes.files, ["app/extra.py", "app/old.py", "app/util.py"]
+        )
+        self.assertEqual(
+            changes.added,
+            {
+                "newdep": [("app/util.py", 3)],
+                "otherdep": [("app/extra.py", 2)],
+            },
+        )
+        # shared is still imported by an untouched file
+        self.assertEqual(changes.dropped, {"olddep": [("app/old.py", 1)]})
+
+    def test_staged_ignores_unstaged_edits(self) -> None:
+        self._write("app/util.py", "import stageddep\n")
+        self._git("add", "app/util.py")
+        self._write("app/util.py", "import stageddep\nimport laterdep\n")
+
+        changes = incremental.diff_dependencies(self.repo, staged=True)
+
+        self.assertEqual(list(changes.added), ["stageddep"])
+        self.assertEqual(changes.dropped, {})
+
+    def test_untouched_files_come_from_the_blob_store(self) -> None:
+        incremental.diff_dependencies(self.repo)
+        self._write("app/util.py", "import newdep\n")
+
+        with unittest.mock.patch.object(
+            incremental, "_extract", wraps=incremental._extract
+        ) as extract:
+            changes = incremental.diff_dependencies(self.repo)
+
+        # Only the committed version of the changed file is parsed
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual(list(changes.added), ["newdep"])
+
+    def test_notebooks_are_compared_too(self) -> None:
+        cell = {"cell_type": "code", "source": ["import nbdep\n"]}
+        self._write("app/analysis.ipynb", json.dumps({"cells": [cell]}))
+
+        changes = incremental.diff_dependencies(self.repo)
+
+        self.assertEqual(
+            changes.added, {"nbdep": [("app/analysis.ipynb", 1)]}
+        )
+
+    def test_outside_a_repository(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(incremental.GitError):
+                incremental.diff_dependencies(directory)
+
+
+def _notebook(*cells: Any, **metadata: Any) -> bytes:
+    """Build notebook JSON from (cell_type, source) pairs"""
+    return json.dumps(
+        {
+            "cells": [
+                {
+                    "cell_type": cell_type,
+                    "metadata": {},
+                    "outputs": [],
+                    "source": source,
+                }
+                for cell_type, source in cells
+            ],
+            "metadata": metadata,
+            "nbformat": 4,
+            "nbformat_minor": 5,
+        },
+        indent=1,
+    ).encode()
+
+
+class TestMidnaNotebooks(unittest.TestCase):
+    """Test reading imports from Jupyter notebooks"""
+
+    def test_only_code_cells_are_read(self) -> None:
+        data = _notebook(
+            ("markdown", ["import not_code\n"]),
+            ("code", ["import numpy\n", "x = 1"]),
+            ("raw", "import raw"),
+            ("code", "import pandas\n"),
+        )
+        self.assertEqual(
+            notebooks.read_code_cells(io.BytesIO(data)),
+            ["import numpy\nx = 1", "import pandas\n"],
+        )
+
+    def test_chunk_boundaries(self) -> None:
+        data = _notebook(
+            ("code", ['s = "\\"quoted\\" \\\\"\n', "import été\n"]),
+            ("code", ["import requests  # 1.0, null, [x]\n"]),
+        )
+        expected = notebooks.read_code_cells(io.BytesIO(data))
+        self.assertEqual(
+            expected[0], 's = "\\"quoted\\" \\\\"\nimport été\n'
+        )
+        for chunk_size in (1, 2, 3, 7, 64):
+            self.assertEqual(
+                notebooks.read_code_cells(io.BytesIO(data), chunk_size),
+                expected,
+            )
+
+    def test_outputs_are_not_kept(self) -> None:
+        import tracemalloc
+
+        image = "A" * (8 << 20)
+        data = json.dumps(
+            {
+                "cells": [
+                    {
+                        "cell_type": "code",
+                        "outputs": [{"data": {"image/png": image}}],
+                        "source": "import numpy",
+                    }
+                ]
+            }
+        ).encode()
+        del image
+
+        tracemalloc.start()
+        try:
+            sources = notebooks.read_code_cells(io.BytesIO(data))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(sources, ["import numpy"])
+        self.assertLess(peak, 1 << 20)
+
+    def test_nbformat_3_and_other_kernels(self) -> None:
+        v3 = json.dumps(
+            {
+                "worksheets": [
+                    {"cells": [{"cell_type": "code", "input": ["import a"]}]}
+                ],
+                "nbformat": 3,
+            }
+        ).encode()
+        self.assertEqual(
+            notebooks.read_code_cells(io.BytesIO(v3)), ["import a"]
+        )
+
+        r_notebook = _notebook(
+            ("code", "library(ggplot2)"), language_info={"name": "R"}
+        )
+        self.assertEqual(notebooks.read_code_cells(io.BytesIO(r_notebook)), [])
+
+    def test_invalid_notebook(self) -> None:
+        for data in (b"[]", b'{"cells": [', b"{nope}", b"\xff"):
+            with self.assertRaises(notebooks.NotebookError):
+                notebooks.read_code_cells(io.BytesIO(data))
+
+    def test_strip_magics(self) -> None:
+        source = (
+            "%matplotlib inline\n"
+            "!pip install pandas\n"
+            "files = !ls\n"
+            "for name in files:\n"
+            "    !echo $name\n"
+            "text = ('%s'\n"
+            "        % name)\n"
+            'doc = """\n'
+            "%not a magic\n"
+            '"""\n'
+            "np.array?\n"
+        )
+        self.assertEqual(
+            notebooks.strip_magics(source),
+            "pass\n"
+            "pass\n"
+            "pass\n"
+            "for name in files:\n"
+            "    pass\n"
+            "text = ('%s'\n"
+            "        % name)\n"
+            'doc = """\n'
+            "%not a magic\n"
+            '"""\n'
+            "pass\n",
+        )
+        self.assertEqual(notebooks.strip_magics("%%bash\nimport x\n"), "")
+        self.assertEqual(
+            notebooks.strip_magics("%%time\nimport x\n"), "\nimport x\n"
+        )
+
+    def test_import_lines_count_through_code_cells(self) -> None:
+        data = _notebook(
+            ("code", ["!pip install numpy\n", "import numpy\n"]),
+            ("markdown", "import ignored"),
+            ("code", "def broken(:\n    import broken"),
+            ("code", ["%%time\n", "import pandas as pd"]),
+        )
+        for engine in extractors.ENGINES:
+            with self.subTest(engine=engine):
+                imports = notebooks.extract_notebook_import_lines(
+                    io.BytesIO(data), engine
+                )
+                self.assertEqual(imports.get("numpy"), 2)
+                self.assertEqual(imports.get("pandas"), 6)
+
+    def test_discovery_scans_notebooks(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            data = _notebook(("code", "import numpy\nimport requests"))
+            checkpoints = os.path.join(directory, ".ipynb_checkpoints")
+            os.mkdir(checkpoints)
+            for folder in (directory, checkpoints):
+                path = os.path.join(folder, "analysis.ipynb")
+                with open(path, "wb") as notebook:
+                    notebook.write(data)
+            with open(os.path.join(directory, "app.py"), "w") as module:
+                module.write("import flask\n")
+
+            files = discovery.find_python_files(directory)
+            self.assertEqual(
+                sorted(os.path.basename(f) for f in files),
+                ["analysis.ipynb", "app.py"],
+            )
+            for jobs in (1, 2):
+                self.assertEqual(
+                    discovery.analyze_project_imports(
+                        directory, jobs=jobs, use_cache=True
+                    ),
+                    {"numpy", "requests", "flask"},
+                )
+
+
+class TestMidnaArchives(unittest.TestCase):
+    """Test scanning wheels and tarballs without unpacking them"""
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def _wheel(self) -> str:
+        import zipfile
+
+        path = os.path.join(self.directory, "pkg-1.0-py3-none-any.whl")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as wheel:
+            wheel.writestr("pkg/__init__.py", "import requests\n")
+            wheel.writestr("pkg/core.py", "import pkg.util\nimport numpy\n")
+            wheel.writestr("pkg/__pycache__/core.py", "import cached\n")
+            wheel.writestr(
+                "pkg/demo.ipynb",
+                _notebook(("code", ["!pip install yaml\n", "import yaml"])),
+            )
+            wheel.writestr("pkg-1.0.dist-info/METADATA", "Name: pkg\n")
+        return path
+
+    def _sdist(self, files: Dict[str, str]) -> str:
+        path = os.path.join(self.directory, "pkg-1.0.tar.gz")
+        with tarfile.open(path, "w:gz") as sdist:
+            for name, content in files.items():
+                data = content.encode()
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                sdist.addfile(info, io.BytesIO(data))
+        return path
+
+    def test_is_archive(self) -> None:
+        wheel = self._wheel()
+        self.assertTrue(archives.is_archive(wheel))
+        self.assertFalse(archives.is_archive(self.directory))
+        self.assertFalse(archives.is_archive("missing.tar.gz"))
+
+    def test_wheel_members_are_scanned(self) -> None:
+        wheel = self._wheel()
+        modules = package_classifier.ProjectModules()
+
+        results = dict(
+            discovery.iter_file_import_lines(
+                wheel, project_modules=modules
+            )
+        )
+
+        self.assertEqual(
+            results,
+            {
+                f"{wheel}/pkg/__init__.py": {"requests": 1},
+                f"{wheel}/pkg/core.py": {"pkg": 1, "numpy": 2},
+                f"{wheel}/pkg/demo.ipynb": {"yaml": 2},
+            },
+        )
+        self.assertEqual(modules.names, {"pkg"})
+        self.assertEqual(
+            discovery.analyze_project_imports(wheel),
+            {"pkg", "requests", "numpy", "yaml"},
+        )
+
+    def test_sdist_root_and_src_layout(self) -> None:
+        sdist = self._sdist(
+            {
+                "./pkg-1.0/setup.py": "from setuptools import setup\n",
+                "./pkg-1.0/src/pkg/__init__.py": "import pkg.x\nimport six\n",
+                "./pkg-1.0/tests/test_pkg.py": "import pytest\n",
+                "./pkg-1.0/README": "import nothing\n",
+            }
+        )
+        modules = package_classifier.ProjectModules()
+
+        results = list(
+            discovery.iter_file_import_lines(
+                sdist,
+                path_filter=ignore.PathFilter(exclude=["tests"]),
+                project_modules=modules,
+            )
+        )
+
+        self.assertEqual(
+            [label for label, _ in results],
+            [
+                f"{sdist}/pkg-1.0/setup.py",
+                f"{sdist}/pkg-1.0/src/pkg/__init__.py",
+            ],
+        )
+        self.assertEqual(modules.names, {"pkg", "setup"})
+        self.assertEqual(
+            archives.archive_project_modules(sdist).names,
+            {"pkg", "setup", "tests"},
+        )
+
+    def test_damaged_archive(self) -> None:
+        path = os.path.join(self.directory, "broken.whl")
+        with open(path, "wb") as f:
+            f.write(b"PK\x03\x04 not really a zip")
+
+        with self.assertLogs("midna", "WARNING") as logs:
+            results = list(discovery.iter_file_import_lines(path))
+
+        self.assertEqual(results, [])
+        self.assertIn("Error reading", logs.output[0])
+
+    def test_explain_an_archive(self) -> None:
+        wheel = self._wheel()
+        index = explain.scan_imports(wheel)
+
+        modules = {
+            module
+            for _, found, _ in explain.explain_imports(index, wheel)
+            for module in found
+        }
+        # pkg is the wheel's own package
+        self.assertEqual(modules, {"requests", "numpy", "yaml"})
+
+
 if __name__ == "__main__":
     unittest.main()
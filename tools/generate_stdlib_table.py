@@ -0,0 +1,97 @@
+"""Generate midna/_stdlib_table.py for Pythons without stdlib_module_names
+
+sys.stdlib_module_names only exists on Python 3.10+. For older versions
+Midna ships a frozen table produced by running this script with each of
+those interpreters and merging the results:
+
+    python3.8 tools/generate_stdlib_table.py > /tmp/py38.txt
+    python3.9 tools/generate_stdlib_table.py > /tmp/py39.txt
+    python3 tools/generate_stdlib_table.py --write /tmp/py38.txt /tmp/py39.txt
+"""
+
+import os
+import pkgutil
+import sys
+import sysconfig
+
+TARGET = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "midna",
+    "_stdlib_table.py",
+)
+
+# Test suites and helpers that ship with CPython but are not public
+# modules (the same exclusions sys.stdlib_module_names makes)
+EXCLUDED = {"test", "__phello__", "__hello__", "xxlimited", "xxsubtype"}
+
+# Modules that only exist on other platforms or builds, so a scan on
+# one machine cannot find them
+PLATFORM_MODULES = {
+    "_dbm",
+    "_frozen_importlib",
+    "_frozen_importlib_external",
+    "_gdbm",
+    "_msi",
+    "_overlapped",
+    "_scproxy",
+    "_winapi",
+    "msilib",
+    "msvcrt",
+    "nt",
+    "winreg",
+    "winsound",
+}
+
+HEADER = '''"""Frozen standard library module table for Python 3.8 and 3.9
+
+Generated by tools/generate_stdlib_table.py - do not edit by hand.
+Python 3.10+ uses sys.stdlib_module_names instead.
+"""
+
+STDLIB_MODULE_NAMES = frozenset(
+    {
+'''
+
+
+def scan_stdlib() -> set:
+    """Return the top-level stdlib module names of this interpreter"""
+    paths = sysconfig.get_paths()
+    directories = [paths["stdlib"], paths["platstdlib"]]
+    directories += [
+        os.path.join(directory, "lib-dynload") for directory in directories
+    ]
+    names = set(sys.builtin_module_names)
+    for module in pkgutil.iter_modules(
+        [d for d in directories if os.path.isdir(d)]
+    ):
+        names.add(module.name)
+    return {
+        name
+        for name in names
+        if name not in EXCLUDED
+        and not name.startswith(("_test", "_xx"))
+        and not name.endswith("_test")
+        and name.isidentifier()
+    }
+
+
+def main() -> int:
+    if sys.argv[1:2] != ["--write"]:
+        print("\n".join(sorted(scan_stdlib())))
+        return 0
+
+    names = set(PLATFORM_MODULES)
+    for listing in sys.argv[2:]:
+        with open(listing) as f:
+            names.update(line.strip() for line in f if line.strip())
+
+    with open(TARGET, "w") as f:
+        f.write(HEADER)
+        for name in sorted(names):
+            f.write(f'        "{name}",\n')
+        f.write("    }\n)\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())